@@ -1,22 +1,55 @@
-from fastapi import APIRouter, HTTPException
-from app.schemas import FailureInput, TriageOutput, TriageResultList
-from app.services.triage_service import process_failure
-from app.services import storage_service
+import asyncio
+import json
+from datetime import datetime
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.schemas import (
+    FailureInput,
+    TriageOutput,
+    TriageJob,
+    TriageResultList,
+    PartialTriageResultList,
+    ClusterList,
+    CoalescingStats,
+    OllamaBackendState,
+    CircuitBreakerState,
+    BatchFailureInput,
+    BatchItemResult,
+    BatchTriageOutput,
+)
+from app.services.triage_service import process_failure_async, process_failures_batch, stream_failure
+from app.services import storage_service, job_queue, resilience, warmup
+from app.services.ollama_service import get_backend_stats, get_coalescing_stats
 
 router = APIRouter()
 
 
-@router.post("/triage", response_model=TriageOutput)
-def triage_failure(payload: FailureInput):
+@router.post("/triage", response_model=TriageOutput, responses={202: {"model": TriageJob}})
+async def triage_failure(
+    payload: FailureInput,
+    queued: bool = Query(False, description="Return 202 with a job id immediately and triage in the background"),
+):
     """
     Process a test failure and return triage results.
     The result is automatically stored and can be retrieved later via GET endpoints.
+
+    With ?queued=true the failure is handed to the background workers instead;
+    poll GET /api/triage/{job_id} until the result is available.
     """
+    if queued:
+        try:
+            job = await job_queue.submit_job(payload)
+        except job_queue.QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return JSONResponse(status_code=202, content=TriageJob(**job).model_dump())
+
     try:
-        result = process_failure(payload)
+        result = await process_failure_async(payload)
         
         # Store the result and add the ID to the response
-        result_id = storage_service.store_result(result)
+        result_id = await asyncio.to_thread(storage_service.store_result, result)
         result["id"] = result_id
         
         return result
@@ -30,51 +63,250 @@ def triage_failure(payload: FailureInput):
         )
 
 
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/triage/stream")
+async def triage_failure_stream(payload: FailureInput):
+    """
+    Process a test failure and stream the result as Server-Sent Events.
+
+    Events:
+    - meta: title, triage_label, error_line, playwright_script, ... (available immediately)
+    - description: {"text": line} for each cleaned description line as the LLM writes it
+    - done: the complete stored TriageOutput (including its id and created_at)
+    - error: {"detail": ...} if the triage failed
+    The result is stored when the stream finishes, like POST /api/triage.
+    """
+    async def event_stream():
+        try:
+            async for event, data in stream_failure(payload):
+                if event == "result":
+                    data["id"] = await asyncio.to_thread(storage_service.store_result, data)
+                    yield _sse_event("done", TriageOutput(**data).model_dump())
+                else:
+                    yield _sse_event(event, data)
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Error while processing triage request: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/triage/batch", response_model=BatchTriageOutput)
+async def triage_failures_batch(payload: BatchFailureInput):
+    """
+    Process a list of test failures concurrently and return per-item results.
+    Successful results are stored in one pass; failures that could not be
+    triaged are reported with their error instead of failing the whole batch.
+    """
+    outcomes = await process_failures_batch(payload.failures, payload.max_concurrency)
+
+    succeeded = [outcome["result"] for outcome in outcomes if outcome["error"] is None]
+    result_ids = iter(await asyncio.to_thread(storage_service.store_results, succeeded))
+
+    items = []
+    for index, outcome in enumerate(outcomes):
+        if outcome["error"] is None:
+            outcome["result"]["id"] = next(result_ids)
+        items.append(BatchItemResult(index=index, result=outcome["result"], error=outcome["error"]))
+
+    return BatchTriageOutput(
+        total=len(items),
+        succeeded=len(succeeded),
+        failed=len(items) - len(succeeded),
+        results=items,
+    )
+
+
 @router.get("/triage/latest", response_model=TriageOutput)
-def get_latest_triage_result():
+async def get_latest_triage_result():
     """
     Retrieve the most recently executed test result.
     This returns the latest triage result based on creation time.
     """
-    result = storage_service.get_latest_result()
+    result = await asyncio.to_thread(storage_service.get_latest_result)
     if result is None:
         raise HTTPException(status_code=404, detail="No triage results found. Run a test first.")
     return result
 
 
-@router.get("/triage/{result_id}", response_model=TriageOutput)
-def get_triage_result(result_id: str):
+def _list_clusters() -> dict:
+    clusters = []
+    for cluster in storage_service.list_clusters():
+        representative = storage_service.get_result(cluster["representative_id"], ["title", "triage_label"]) or {}
+        clusters.append({
+            **cluster,
+            "representative_title": representative.get("title"),
+            "representative_label": representative.get("triage_label"),
+        })
+    return {"total": len(clusters), "clusters": clusters}
+
+
+@router.get("/clusters", response_model=ClusterList)
+async def list_clusters():
     """
-    Retrieve a specific triage result by its ID.
+    List near-duplicate failure clusters with their size and representative.
+    Returns clusters sorted by size (largest first).
     """
-    result = storage_service.get_result(result_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail=f"Triage result with ID '{result_id}' not found")
-    return result
+    return ClusterList(**await asyncio.to_thread(_list_clusters))
 
 
-@router.get("/triage", response_model=TriageResultList)
-def list_triage_results():
+@router.get("/llm/coalescing", response_model=CoalescingStats)
+async def get_llm_coalescing_stats():
     """
-    List all stored triage results.
-    Returns results sorted by creation time (newest first).
+    How many Ollama generations were started and how many identical concurrent
+    requests were served by one of them instead.
     """
-    results = storage_service.get_all_results()
-    return TriageResultList(
-        total=len(results),
-        results=results
-    )
+    return get_coalescing_stats()
+
+
+@router.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 503 until the Ollama models are warmed up, so load
+    balancers do not send traffic to an instance that would load them first.
+    """
+    status = warmup.get_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
 
 
+@router.get("/llm/backends", response_model=List[OllamaBackendState])
+async def list_llm_backends():
+    """
+    Per-backend concurrency, queue depth, latency and health of the Ollama pool.
+    """
+    return get_backend_stats()
+
+
+@router.get("/circuit-breakers", response_model=List[CircuitBreakerState])
+async def list_circuit_breakers():
+    """
+    State of the Ollama and BERT circuit breakers. While a breaker is open,
+    triage falls back to the templated description / rule label.
+    """
+    return resilience.list_breakers()
+
+
+@router.get("/triage/jobs/{job_id}", response_model=TriageJob)
+async def get_triage_job(job_id: str):
+    """
+    Retrieve the status of a job submitted with ?queued=true.
+    """
+    job = await asyncio.to_thread(job_queue.get_job, job_id)
+    if job is not None:
+        return job
+    if await asyncio.to_thread(storage_service.get_result, job_id, ["id"]) is not None:
+        return TriageJob(job_id=job_id, status=job_queue.COMPLETED)
+    raise HTTPException(status_code=404, detail=f"Triage job with ID '{job_id}' not found")
+
+
+@router.get("/triage/{result_id}", response_model=TriageOutput, responses={202: {"model": TriageJob}})
+async def get_triage_result(
+    result_id: str,
+    wait: Optional[float] = Query(None, ge=0, le=600, description="Seconds to wait for a queued job to finish"),
+):
+    """
+    Retrieve a specific triage result by its ID.
+    For a queued job that has not finished yet, returns 202 with the job status.
+    """
+    result = await asyncio.to_thread(storage_service.get_result, result_id)
+    if result is not None:
+        return result
+
+    job = await asyncio.to_thread(job_queue.get_job, result_id)
+    if job is not None and wait:
+        job = await job_queue.wait_for_job(result_id, wait)
+    if job is None or wait:
+        # The job may have completed (and its record been dropped) since the first read
+        result = await asyncio.to_thread(storage_service.get_result, result_id)
+        if result is not None:
+            return result
+
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Triage result with ID '{result_id}' not found")
+    status_code = 500 if job["status"] == job_queue.FAILED else 202
+    return JSONResponse(status_code=status_code, content=TriageJob(**job).model_dump())
+
+
+def _local_iso(moment: Optional[datetime]) -> Optional[str]:
+    # created_at is naive local time; convert timezone-aware bounds to it
+    if moment is None:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    selected = ["id"]
+    for field in fields.split(","):
+        field = field.strip()
+        if field not in TriageOutput.model_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{field}'")
+        if field not in selected:
+            selected.append(field)
+    return selected
+
+
+def _list_page(
+    limit: Optional[int],
+    cursor: Optional[str],
+    since: Optional[str],
+    until: Optional[str],
+    fields: Optional[List[str]],
+) -> dict:
+    results, next_cursor = storage_service.get_results_page(limit, cursor, since=since, until=until, fields=fields)
+    return {
+        "total": storage_service.get_result_count(since, until),
+        "count": len(results),
+        "results": results,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/triage", response_model=Union[TriageResultList, PartialTriageResultList])
+async def list_triage_results(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of results on the page (default: all)"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,triage_label,created_at"),
+    since: Optional[datetime] = Query(None, description="Only results created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only results created before this time"),
+):
+    """
+    List stored triage results, optionally one page at a time, only those
+    created in [since, until) and only some of their fields.
+    Returns results sorted by creation time (newest first); with a limit,
+    follow next_cursor for older ones. `total` counts all matching stored
+    results, `count` the ones in this response. With fields=, results are
+    PartialTriageOutput. Fetch heavy fields (description, raw_failure_text,
+    stack_trace) by ID with GET /api/triage/{result_id}.
+    """
+    field_list = _parse_fields(fields)
+    try:
+        page = await asyncio.to_thread(
+            _list_page, limit, cursor, _local_iso(since), _local_iso(until), field_list,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    if field_list is not None:
+        return PartialTriageResultList(**page, fields=field_list)
+    return TriageResultList(**page)
 
 
 @router.delete("/triage/{result_id}")
-def delete_triage_result(result_id: str):
+async def delete_triage_result(result_id: str):
     """
     Delete a specific triage result by its ID.
     """
-    deleted = storage_service.delete_result(result_id)
+    deleted = await asyncio.to_thread(storage_service.delete_result, result_id)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Triage result with ID '{result_id}' not found")
     return {"message": f"Triage result '{result_id}' deleted successfully"}
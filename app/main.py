@@ -1,7 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import Response
 from app.api.routes import router as api_router
+from app.services import http_client, job_queue, storage_service, warmup
+from app.utils import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the Ollama models in the background; /api/ready answers 503 until done
+    warmup_task = asyncio.create_task(warmup.run_warmup()) if warmup.WARMUP_ENABLED else None
+    # Evict expired results and results over the retention limits periodically
+    sweeper_task = (
+        asyncio.create_task(storage_service.run_sweeper())
+        if storage_service.RETENTION_ENABLED and storage_service.RETENTION_SWEEP_SECONDS > 0 else None
+    )
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if sweeper_task is not None:
+        sweeper_task.cancel()
+    # Stop the queued-mode workers so shutdown does not hang on them
+    await job_queue.stop_workers()
+    await http_client.close_async_clients()
+    http_client.close_sessions()
+    storage_service.close()
 
-app = FastAPI(title="Bug Triage Engine")
+
+app = FastAPI(title="Bug Triage Engine", lifespan=lifespan)
 
 # All API routes will be under /api/...
 app.include_router(api_router, prefix="/api")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Stage latency histograms, fallback / storage counters and in-flight requests
+    in the Prometheus text format.
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, model_serializer
+from typing import Dict, List, Optional
 
 
 class FailureInput(BaseModel):
@@ -29,12 +29,140 @@ class TriageOutput(BaseModel):
     test_url: Optional[str] = None  # Clickable URL of the page being tested (e.g., https://example.com/login)
     playwright_script_endpoint: Optional[str] = None  # Endpoint URL for external Playwright script service
     triage_label: Optional[str] = None  # Intelligent label for error categorization (e.g., "Assertion: Title Mismatch", "Timeout Error")
+    label_tier: Optional[str] = None  # Which tier decided triage_label: "rule", "bert" or "fallback"
+    label_confidence: Optional[float] = None  # Confidence of that tier in triage_label (0..1), if known
+    stage_timings: Optional[Dict[str, float]] = None  # Per-stage latency in ms (llm, label, extraction, total)
+    fingerprint: Optional[str] = None  # Normalized failure signature (error message, top stack frames, file path)
+    duplicate_of: Optional[str] = None  # ID of the original result this repeat failure reused its triage from
+    cluster_id: Optional[str] = None  # Near-duplicate cluster (similar error messages share one LLM description)
+    prompt_tokens_saved: Optional[int] = None  # Estimated tokens removed from the LLM prompt by compaction (None if no prompt was sent)
+    degraded: bool = False  # True if a stage fell back to heuristics; such results are worth re-triaging
+    fallbacks: List[str] = []  # Stages that fell back: "llm" (templated description), "label" (rule label without BERT)
     # Metadata fields (added when stored)
     id: Optional[str] = None
     created_at: Optional[str] = None
 
 
+class TriageJob(BaseModel):
+    """Status of a triage request submitted in queued mode"""
+    job_id: str                          # also the ID the result is stored under
+    status: str                          # "queued", "running", "completed" or "failed"
+    submitted_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PartialTriageOutput(BaseModel):
+    """Some fields of a stored triage result, as selected with ?fields="""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    raw_failure_text: Optional[str] = None
+    stack_trace: Optional[str] = None
+    status: Optional[str] = None
+    error_line: Optional[int] = None
+    playwright_script: Optional[str] = None
+    test_url: Optional[str] = None
+    playwright_script_endpoint: Optional[str] = None
+    triage_label: Optional[str] = None
+    label_tier: Optional[str] = None
+    label_confidence: Optional[float] = None
+    stage_timings: Optional[Dict[str, float]] = None
+    fingerprint: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    cluster_id: Optional[str] = None
+    prompt_tokens_saved: Optional[int] = None
+    degraded: Optional[bool] = None
+    fallbacks: Optional[List[str]] = None
+    id: Optional[str] = None
+    created_at: Optional[str] = None
+
+    @model_serializer(mode="wrap")
+    def _selected_fields_only(self, handler):
+        # Fields that were not selected are left out, not sent as null
+        data = handler(self)
+        return {field: value for field, value in data.items() if field in self.model_fields_set}
+
+
 class TriageResultList(BaseModel):
     """Response model for listing multiple triage results"""
-    total: int
+    model_config = ConfigDict(extra="forbid")
+
+    total: int                           # number of stored results (created in [since, until), if given)
+    count: int                           # number of results on this page
     results: List[TriageOutput]
+    next_cursor: Optional[str] = None    # pass as ?cursor= to get the next page; None on the last page
+
+
+class PartialTriageResultList(BaseModel):
+    """Response model for listing triage results with ?fields="""
+    total: int
+    count: int
+    fields: List[str]                    # the fields returned for each result
+    results: List[PartialTriageOutput]
+    next_cursor: Optional[str] = None
+
+
+class ClusterSummary(BaseModel):
+    """A group of near-duplicate failures"""
+    cluster_id: str
+    size: int                              # number of stored results in the cluster
+    representative_id: str                 # first stored result; its description is reused by the others
+    representative_title: Optional[str] = None
+    representative_label: Optional[str] = None
+    member_ids: List[str]
+    created_at: Optional[str] = None
+
+
+class ClusterList(BaseModel):
+    """Response model for listing near-duplicate clusters"""
+    total: int
+    clusters: List[ClusterSummary]
+
+
+class CoalescingStats(BaseModel):
+    """Counters of identical concurrent Ollama generations sharing one call"""
+    executions: int  # Ollama generations actually started
+    coalesced: int   # calls that waited on an identical generation already in flight
+    in_flight: int
+
+
+class OllamaBackendState(BaseModel):
+    """Load and health of one Ollama backend of the pool"""
+    url: str
+    state: str                           # circuit breaker: "closed", "open" (ejected) or "half_open"
+    max_concurrency: int
+    in_flight: int                       # generations running now
+    queued: int                          # callers waiting for a free slot
+    requests: int
+    failures: int
+    latency_ms: Optional[float] = None   # moving average of successful generations
+    models: Optional[List[str]] = None   # configured models; None = any model
+
+
+class CircuitBreakerState(BaseModel):
+    """State of the circuit breaker of one downstream service"""
+    name: str                  # "ollama <backend>" or "bert <endpoint>"
+    state: str                 # "closed", "open" or "half_open"
+    consecutive_failures: int
+
+
+class BatchFailureInput(BaseModel):
+    """Request model for triaging a whole list of failures in one call"""
+    failures: List[FailureInput]
+    max_concurrency: Optional[int] = None  # optional, can only lower the server-side concurrency limit
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of a single failure inside a batch request"""
+    index: int                               # position of the failure in the submitted list
+    result: Optional[TriageOutput] = None
+    error: Optional[str] = None              # set when this failure could not be triaged
+
+
+class BatchTriageOutput(BaseModel):
+    """Response model for the batch triage endpoint"""
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
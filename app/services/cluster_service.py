@@ -0,0 +1,171 @@
+"""
+Near-duplicate failure clustering.
+Exact fingerprints only catch identical failures; failures that differ in a
+selector, an expected string or a URL are grouped here instead. Each error
+message is reduced to a MinHash signature over word shingles of its clean_text,
+and an LSH table (signature bands -> clusters) finds candidate clusters without
+comparing against every stored failure. The first stored member of a cluster is
+its representative.
+Failures are only clustered with failures of the same Playwright assertion
+(keyword_rules assertion label): short messages of different matchers share most
+of their words, but a toBeEnabled failure must not reuse a toBeVisible description.
+Only signatures live here; which results belong to a cluster is answered by the
+store (storage_service), which also persists new clusters so that other workers
+and restarted processes know them.
+"""
+import hashlib
+import os
+import random
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.utils import keyword_rules
+from app.utils.text_utils import clean_text
+
+
+# Estimated Jaccard similarity of shingle sets needed to join a cluster
+CLUSTER_THRESHOLD = float(os.getenv("TRIAGE_CLUSTER_THRESHOLD", "0.5"))
+SHINGLE_WORDS = 3
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32
+_ROWS_PER_BAND = MINHASH_PERMUTATIONS // LSH_BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # fixed seed: signatures must be stable across restarts
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+# Clusters: {cluster_id: {"cluster_id", "label", "signature", "created_at"}}
+_clusters: Dict[str, dict] = {}
+# LSH table: {(assertion label, band, band values): [cluster_id, ...]}
+_buckets: Dict[Tuple[Optional[str], int, Tuple[int, ...]], List[str]] = {}
+_lock = threading.Lock()
+
+
+def _shingles(text: str) -> set:
+    words = clean_text(text).split()
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def compute_signature(text: str) -> Tuple[int, ...]:
+    """
+    MinHash signature of the word shingles of `text` (MINHASH_PERMUTATIONS values).
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in _shingles(text)
+    ]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def _similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(left, right) if x == y) / MINHASH_PERMUTATIONS
+
+
+def _assertion_label(text: str) -> Optional[str]:
+    """
+    The Playwright assertion label of an error message, None if it names no assertion.
+    """
+    return keyword_rules.classify(error_message=text).assertion_label
+
+
+def _band_keys(label: Optional[str], signature: Tuple[int, ...]) -> List[Tuple[Optional[str], int, Tuple[int, ...]]]:
+    # Prefixed with the assertion label, so only clusters of the same assertion are candidates
+    return [
+        (label, band, signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND])
+        for band in range(LSH_BANDS)
+    ]
+
+
+def _best_cluster(label: Optional[str], signature: Tuple[int, ...]) -> Optional[dict]:
+    best, best_similarity = None, CLUSTER_THRESHOLD
+    seen = set()
+    for key in _band_keys(label, signature):
+        for cluster_id in _buckets.get(key, ()):
+            if cluster_id in seen:
+                continue
+            seen.add(cluster_id)
+            cluster = _clusters[cluster_id]
+            similarity = _similarity(signature, cluster["signature"])
+            if similarity >= best_similarity:
+                best, best_similarity = cluster, similarity
+    return best
+
+
+def _add(cluster: dict) -> None:
+    _clusters[cluster["cluster_id"]] = cluster
+    for key in _band_keys(cluster["label"], cluster["signature"]):
+        _buckets.setdefault(key, []).append(cluster["cluster_id"])
+
+
+def assign_cluster(text: str, on_create: Optional[Callable[[dict], None]] = None) -> Optional[str]:
+    """
+    Return the ID of the cluster `text` belongs to, creating a new cluster
+    (with this text's assertion label and signature) when no existing cluster
+    of the same assertion is similar enough;
+    `on_create` is called with a new cluster before it is used.
+    Returns None for text without any words, which is not clustered.
+    """
+    if not clean_text(text):
+        return None
+    label = _assertion_label(text)
+    signature = compute_signature(text)
+    with _lock:
+        cluster = _best_cluster(label, signature)
+        if cluster is not None:
+            return cluster["cluster_id"]
+
+        cluster = {
+            "cluster_id": str(uuid.uuid4()),
+            "label": label,
+            "signature": signature,
+            "created_at": datetime.now().isoformat(),
+        }
+        if on_create is not None:
+            on_create(cluster)
+        _add(cluster)
+        return cluster["cluster_id"]
+
+
+def load_clusters(clusters: List[dict]) -> None:
+    """
+    Register clusters created by another worker or an earlier run.
+    """
+    with _lock:
+        for cluster in clusters:
+            if cluster["cluster_id"] not in _clusters:
+                _add({**cluster, "label": cluster.get("label"), "signature": tuple(cluster["signature"])})
+
+
+def remove_cluster(cluster_id: str) -> None:
+    """
+    Forget a cluster whose last member was deleted.
+    """
+    with _lock:
+        cluster = _clusters.pop(cluster_id, None)
+        if cluster is None:
+            return
+        for key in _band_keys(cluster["label"], cluster["signature"]):
+            bucket = _buckets.get(key)
+            if bucket and cluster_id in bucket:
+                bucket.remove(cluster_id)
+                if not bucket:
+                    del _buckets[key]
+
+
+def get_created_at(cluster_id: str) -> Optional[str]:
+    """
+    When the cluster was created, None if it is not known here.
+    """
+    with _lock:
+        cluster = _clusters.get(cluster_id)
+        return cluster["created_at"] if cluster else None
@@ -0,0 +1,53 @@
+"""
+Failure fingerprinting used to detect repeat failures.
+Two failures share a fingerprint when their error message, top stack frames and
+file path are identical once digits, directories and punctuation are normalized
+away, so timestamps, line numbers and machine-specific paths do not matter.
+Failures without an error message and stack frames also need the same test name,
+since the file path alone would lump every such test of a spec file together.
+"""
+import hashlib
+import os
+import re
+from typing import List
+
+from app.schemas import FailureInput
+from app.utils.text_utils import clean_text
+
+
+# Number of stack frames (from the top) that take part in the fingerprint
+FINGERPRINT_STACK_FRAMES = int(os.getenv("TRIAGE_FINGERPRINT_FRAMES", "5"))
+
+_FRAME_LINE = re.compile(r'^\s*(?:at\s|File\s+")')
+_DIRECTORY_PREFIX = re.compile(r'[^\s()"]*[\\/]')
+
+
+def _top_stack_frames(stack_trace: str, count: int) -> List[str]:
+    """
+    Return the first `count` frame lines ("at ..." / 'File "..."') with directories removed.
+    """
+    frames = []
+    for line in (stack_trace or "").splitlines():
+        if _FRAME_LINE.match(line):
+            frames.append(_DIRECTORY_PREFIX.sub("", line.strip()))
+            if len(frames) >= count:
+                break
+    return frames
+
+
+def compute_fingerprint(payload: FailureInput) -> str:
+    """
+    Compute a stable signature for a failure from its error message, top stack
+    frames and file path (plus the test name when message and frames are empty).
+    """
+    message = clean_text(payload.error_message)
+    frames = [clean_text(frame) for frame in _top_stack_frames(payload.stack_trace, FINGERPRINT_STACK_FRAMES)]
+    parts = [
+        message,
+        *frames,
+        clean_text(os.path.basename((payload.file_path or "").replace("\\", "/"))),
+    ]
+    if not message and not any(frames):
+        # Not normalized: "test_step_1" and "test_step_2" are different tests
+        parts.append((payload.test_name or "").strip())
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
@@ -0,0 +1,177 @@
+"""
+Shared downstream HTTP clients of the triage engine (Ollama, BERT).
+Connections are pooled and kept alive per host instead of opening a new TCP
+connection for every call; failed connects are retried with exponential
+backoff, and so are 502/503/504 answers to idempotent requests. A POST is only
+retried on 503, which means it was not processed: after a 502/504 the server
+may still be running it (a second LLM generation, a second stored result).
+"""
+import asyncio
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Keep-alive connections per host; override per host with
+# HTTP_POOL_SIZES="localhost:11434=64,192.168.1.13:8001=16"
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_POOL_SIZES = os.getenv("HTTP_POOL_SIZES", "")
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))
+
+RETRY_STATUSES = (502, 503, 504)
+# Statuses retried for non-idempotent methods (POST, PATCH)
+NON_IDEMPOTENT_RETRY_STATUSES = (503,)
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _retries_status(method: str, status_code: int) -> bool:
+    if status_code not in RETRY_STATUSES:
+        return False
+    return method.upper() in Retry.DEFAULT_ALLOWED_METHODS or status_code in NON_IDEMPOTENT_RETRY_STATUSES
+
+
+class _Retry(Retry):
+    """
+    Retry whose status retries depend on the method (see _retries_status).
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        return _retries_status(method, status_code) and super().is_retry(method, status_code, has_retry_after)
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _pool_size(host_key: str) -> int:
+    netloc = urlsplit(host_key).netloc
+    for entry in HTTP_POOL_SIZES.split(","):
+        host, _, size = entry.strip().partition("=")
+        if host and host == netloc:
+            return int(size)
+    return HTTP_POOL_MAXSIZE
+
+
+# --- sync (requests) ----------------------------------------------------------
+
+def get_session(url: str) -> requests.Session:
+    """
+    Return the pooled keep-alive session for the host of `url`.
+    """
+    key = _host_key(url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retry = _Retry(
+                total=HTTP_RETRIES,
+                connect=HTTP_RETRIES,
+                read=0,  # never re-run a request the server may still be working on
+                status=HTTP_RETRIES,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=None,  # narrowed per status by _Retry.is_retry
+                backoff_factor=HTTP_RETRY_BACKOFF,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size(key), max_retries=retry)
+            session = requests.Session()
+            session.mount(key, adapter)
+            _sessions[key] = session
+    return session
+
+
+def request(method: str, url: str, timeout: float, **kwargs) -> requests.Response:
+    """
+    Send a request through the pooled session; `timeout` is the read timeout.
+    """
+    return get_session(url).request(method, url, timeout=(HTTP_CONNECT_TIMEOUT, timeout), **kwargs)
+
+
+def get(url: str, timeout: float, **kwargs) -> requests.Response:
+    return request("GET", url, timeout, **kwargs)
+
+
+def post(url: str, timeout: float, **kwargs) -> requests.Response:
+    return request("POST", url, timeout, **kwargs)
+
+
+def close_sessions() -> None:
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# --- async (httpx) ------------------------------------------------------------
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """
+    Return the pooled keep-alive async client for the host of `url`.
+    Clients are bound to the running event loop and recreated if it changes.
+    """
+    global _async_loop
+    loop = asyncio.get_running_loop()
+    if loop is not _async_loop:
+        _async_clients.clear()
+        _async_loop = loop
+
+    key = _host_key(url)
+    client = _async_clients.get(key)
+    if client is None:
+        size = _pool_size(key)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=size,
+                max_keepalive_connections=size,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            # Transport-level retries cover failed connects only
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES),
+        )
+        _async_clients[key] = client
+    return client
+
+
+def async_timeout(timeout: float) -> httpx.Timeout:
+    return httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT)
+
+
+async def request_async(method: str, url: str, timeout: float, **kwargs) -> httpx.Response:
+    """
+    Send a request through the pooled async client; `timeout` is the read timeout.
+    502/503/504 answers are retried with exponential backoff (only 503 for POST).
+    """
+    client = get_async_client(url)
+    for attempt in range(HTTP_RETRIES + 1):
+        response = await client.request(method, url, timeout=async_timeout(timeout), **kwargs)
+        if not _retries_status(method, response.status_code) or attempt == HTTP_RETRIES:
+            return response
+        await response.aclose()
+        await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** attempt))
+
+
+async def post_async(url: str, timeout: float, **kwargs) -> httpx.Response:
+    return await request_async("POST", url, timeout, **kwargs)
+
+
+async def close_async_clients() -> None:
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
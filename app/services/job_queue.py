@@ -0,0 +1,191 @@
+"""
+Background job queue for triage requests submitted in queued mode.
+A pool of asyncio workers runs the triage pipeline; each finished result is
+stored under its job id, so clients poll GET /api/triage/{job_id} for it.
+Job status records are kept by storage_service, so with the SQLite backend a
+job can be polled on any worker, not only the one that queued it. Storage calls
+run in worker threads, off the event loop.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.schemas import FailureInput
+from app.services import storage_service
+from app.services.triage_service import process_failure_async
+
+
+QUEUE_WORKERS = int(os.getenv("TRIAGE_QUEUE_WORKERS", "4"))
+QUEUE_MAX_SIZE = int(os.getenv("TRIAGE_QUEUE_MAX_SIZE", "1000"))
+# Failed jobs are kept for polling this long (seconds), and at most this many
+FAILED_JOB_TTL = float(os.getenv("TRIAGE_FAILED_JOB_TTL", "3600"))
+FAILED_JOB_MAX = int(os.getenv("TRIAGE_FAILED_JOB_MAX", "1000"))
+# How often wait_for_job checks the store for a job queued on another worker
+JOB_POLL_SECONDS = 0.5
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Jobs queued on this worker that have not finished yet
+_jobs: Dict[str, dict] = {}
+_done_events: Dict[str, asyncio.Event] = {}
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work."""
+
+
+def _failed_job_cutoff() -> str:
+    return (datetime.now() - timedelta(seconds=FAILED_JOB_TTL)).isoformat()
+
+
+def _ensure_workers() -> None:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=QUEUE_MAX_SIZE)
+    if not _workers:
+        for n in range(max(1, QUEUE_WORKERS)):
+            _workers.append(asyncio.create_task(_worker(), name=f"triage-worker-{n}"))
+
+
+def _finish_job(job: dict) -> None:
+    if job["status"] == COMPLETED:
+        # The stored result is now the source of truth for this id
+        storage_service.delete_job(job["job_id"])
+    else:
+        storage_service.save_job(job)
+        # Drop failed jobs past FAILED_JOB_TTL, then the oldest ones over FAILED_JOB_MAX
+        storage_service.evict_jobs(FAILED, _failed_job_cutoff(), FAILED_JOB_MAX)
+
+
+async def _worker() -> None:
+    while True:
+        job_id, payload = await _queue.get()
+        job = _jobs[job_id]
+        job["status"] = RUNNING
+        job["started_at"] = datetime.now().isoformat()
+        try:
+            await asyncio.to_thread(storage_service.save_job, dict(job))
+            result = await process_failure_async(payload)
+            await asyncio.to_thread(storage_service.store_result, result, job_id)
+            job["status"] = COMPLETED
+        except Exception as e:
+            job["status"] = FAILED
+            job["error"] = str(e)
+        # Cancelled at shutdown: the job stays in _jobs and stop_workers records it as failed
+        job["finished_at"] = datetime.now().isoformat()
+        try:
+            await asyncio.to_thread(_finish_job, job)
+        except Exception as e:
+            print(f"Could not record the status of job {job_id}: {e}")
+        del _jobs[job_id]
+        _done_events.pop(job_id).set()
+        _queue.task_done()
+
+
+async def submit_job(payload: FailureInput) -> dict:
+    """
+    Queue a failure for background triage and return its job record.
+
+    Raises:
+        QueueFullError: if QUEUE_MAX_SIZE jobs are already waiting
+    """
+    _ensure_workers()
+    if _queue.full():
+        raise QueueFullError(f"Triage queue is full ({QUEUE_MAX_SIZE} jobs waiting)")
+
+    job_id = str(uuid.uuid4())
+    job = {
+        "job_id": job_id,
+        "status": QUEUED,
+        "submitted_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+    }
+    # Saved before it is queued, so a worker's "running" is never overwritten by "queued"
+    await asyncio.to_thread(storage_service.save_job, dict(job))
+    try:
+        _queue.put_nowait((job_id, payload))
+    except asyncio.QueueFull:
+        await asyncio.to_thread(storage_service.delete_job, job_id)
+        raise QueueFullError(f"Triage queue is full ({QUEUE_MAX_SIZE} jobs waiting)")
+
+    _jobs[job_id] = job
+    _done_events[job_id] = asyncio.Event()
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Retrieve a pending or failed job by ID. Completed jobs are served from storage;
+    failed jobs are forgotten after FAILED_JOB_TTL seconds.
+    """
+    job = storage_service.get_job(job_id)
+    if job is not None and job["status"] == FAILED and job["finished_at"] < _failed_job_cutoff():
+        return None
+    return job
+
+
+async def wait_for_job(job_id: str, timeout: float) -> Optional[dict]:
+    """
+    Wait up to `timeout` seconds for a job to finish. A job queued on another
+    worker is polled in the store every JOB_POLL_SECONDS.
+
+    Returns:
+        The job record if it is still pending or has failed, None if it completed
+        (or is unknown) - in which case the result can be read from storage.
+    """
+    event = _done_events.get(job_id)
+    if event is not None:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await asyncio.to_thread(get_job, job_id)
+
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + timeout
+    job = await asyncio.to_thread(get_job, job_id)
+    while job is not None and job["status"] in (QUEUED, RUNNING) and loop.time() < expires:
+        await asyncio.sleep(min(JOB_POLL_SECONDS, max(0.0, expires - loop.time())))
+        job = await asyncio.to_thread(get_job, job_id)
+    return job
+
+
+def get_queue_depth() -> int:
+    """
+    Number of jobs waiting for a worker.
+    """
+    return _queue.qsize() if _queue is not None else 0
+
+
+async def stop_workers() -> None:
+    """
+    Cancel the background workers (called on application shutdown). Jobs this
+    worker had not finished are recorded as failed, so they do not stay
+    "queued" in a persistent store forever.
+    """
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    for job in list(_jobs.values()):
+        job["status"] = FAILED
+        job["error"] = "Server shut down before the job finished"
+        job["finished_at"] = datetime.now().isoformat()
+        try:
+            await asyncio.to_thread(_finish_job, job)
+        except Exception as e:
+            print(f"Could not record the status of job {job['job_id']}: {e}")
+    _jobs.clear()
+    _done_events.clear()
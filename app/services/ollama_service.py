@@ -1,29 +1,107 @@
-import requests
+import json
+import os
 import re
+from typing import AsyncIterator, List, Optional
 
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+from app.services import resilience
+from app.services.ollama_pool import POOL
+from app.services.resilience import Deadline
+from app.services.single_flight import SingleFlight
+from app.services.warmup import OLLAMA_KEEP_ALIVE
+from app.utils import keyword_rules, metrics
+from app.utils.prompt_compactor import CompactedText, compact_failure_text
 
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "600"))
 
-def _call_ollama(model_name: str, prompt: str, num_predict: int = 800) -> str:
-    """
-    Low-level helper to call Ollama and return the raw `response` text.
-    """
-    payload = {
+# Identical generations requested at the same time (e.g. many failures caused by
+# one broken fixture) share a single Ollama call
+COALESCE_ENABLED = os.getenv("OLLAMA_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+_generations = SingleFlight()
+
+
+def _build_ollama_payload(model_name: str, prompt: str, num_predict: int, stream: bool = False) -> dict:
+    return {
         "model": model_name,
         "prompt": prompt,
-        "stream": False,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
         "num_predict": num_predict,
         "temperature": 0.7,
         "top_p": 0.9,
         "top_k": 40,
     }
 
-    resp = requests.post(OLLAMA_API_URL, json=payload, timeout=600)
-    resp.raise_for_status()
+
+def _generation_key(model_name: str, prompt: str, num_predict: int) -> tuple:
+    # Whitespace differences do not change what the model is asked
+    return model_name, num_predict, " ".join(prompt.split())
+
+
+def get_backend_stats() -> list:
+    """
+    Load, latency and health of each Ollama backend; see OllamaBackend.snapshot.
+    """
+    return POOL.snapshot()
+
+
+def get_coalescing_stats() -> dict:
+    """
+    Counters of the Ollama generation coalescing; see SingleFlight.stats.
+    """
+    return _generations.stats()
+
+
+async def _call_ollama_async(
+    model_name: str, prompt: str, num_predict: int = 800, timeout: float = OLLAMA_TIMEOUT
+) -> str:
+    """
+    Call Ollama and return the raw `response` text; concurrent identical calls
+    share one generation.
+    """
+    if not COALESCE_ENABLED:
+        return await _generate_async(model_name, prompt, num_predict, timeout)
+    return await _generations.do_async(
+        _generation_key(model_name, prompt, num_predict),
+        lambda: _generate_async(model_name, prompt, num_predict, timeout),
+        timeout=timeout,
+    )
+
+
+async def _generate_async(model_name: str, prompt: str, num_predict: int, timeout: float) -> str:
+    """
+    Low-level helper to call Ollama and return the raw `response` text.
+    Raises CircuitOpenError when no backend of the pool can take the call.
+    """
+    payload = _build_ollama_payload(model_name, prompt, num_predict)
+
+    resp = await POOL.generate_async(payload, timeout)
     data = resp.json()
     return data.get("response", "").strip()
 
 
+async def _stream_ollama_async(
+    model_name: str, prompt: str, num_predict: int = 800, deadline: Optional[Deadline] = None
+) -> AsyncIterator[str]:
+    """
+    Call Ollama with streaming enabled and yield `response` fragments as they are generated.
+    Raises DeadlineExceeded once `deadline` runs out mid-stream.
+    """
+    payload = _build_ollama_payload(model_name, prompt, num_predict, stream=True)
+
+    timeout = resilience.stage_timeout(deadline, OLLAMA_TIMEOUT)
+    async with POOL.stream(payload, timeout) as resp:
+        async for line in resp.aiter_lines():
+            if deadline is not None and deadline.expired:
+                raise resilience.DeadlineExceeded("triage deadline exceeded while streaming")
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                break
+
+
 def _extract_error_message(failure_text: str) -> str:
     """
     Pull the 'Error Message:' line out of the combined failure_text.
@@ -41,17 +119,6 @@ def _extract_test_name(failure_text: str) -> str:
     return ""
 
 
-def _css_id_to_words(selector: str) -> str:
-    """
-    '#edit-profile-btn' -> 'Edit profile btn'
-    """
-    selector = selector.lstrip("#.")
-    selector = selector.replace("-", " ").replace("_", " ").strip()
-    if not selector:
-        return "UI element"
-    return selector.capitalize()
-
-
 def _heuristic_bug_title(failure_text: str) -> str:
     """
     Generate a human-friendly bug title using simple rules,
@@ -59,87 +126,15 @@ def _heuristic_bug_title(failure_text: str) -> str:
     """
     error_msg = _extract_error_message(failure_text)
     test_name = _extract_test_name(failure_text)
-    em_low = error_msg.lower()
-
-    # 🔹 Playwright-specific assertion failures - detect BEFORE generic cleaning
-    # toHaveTitle
-    if "tohavetitle" in em_low or "to have title" in em_low:
-        return "Page title does not match expected value"
-    
-    # toBeVisible
-    if "tobevisible" in em_low or "to be visible" in em_low:
-        if "button" in em_low:
-            return "Expected button element is not visible"
-        elif "input" in em_low:
-            return "Expected input field is not visible"
-        return "Expected UI element is not visible"
-    
-    # toHaveURL
-    if "tohaveurl" in em_low or "to have url" in em_low:
-        return "Page URL does not match expected value"
-    
-    # toHaveText
-    if "tohavetext" in em_low or "to have text" in em_low:
-        if "heading" in em_low or "h1" in em_low:
-            return "Heading text does not match expected value"
-        return "Element text content does not match expected value"
-    
-    # toHaveCount
-    if "tohavecount" in em_low or "to have count" in em_low:
-        if "paragraph" in em_low:
-            return "Paragraph count does not match expected value"
-        return "Element count does not match expected value"
-    
-    # toContainText
-    if "tocontaintext" in em_low or "to contain text" in em_low:
-        return "Element does not contain expected text"
-    
-    # toBeEnabled / toBeDisabled
-    if "tobeenabled" in em_low or "to be enabled" in em_low:
-        return "Element is not enabled as expected"
-    if "tobedisabled" in em_low or "to be disabled" in em_low:
-        return "Element is not disabled as expected"
-    
-    # toBeChecked
-    if "tobechecked" in em_low or "to be checked" in em_low:
-        return "Checkbox is not checked as expected"
+
+    # 🔹 Title rules (Playwright assertions, UI, database, server errors, ...) from the keyword rule table
+    title = keyword_rules.classify(message=error_msg, test_name=test_name).title
+    if title:
+        return title
 
     # Strip anything after 'Traceback' or long technical noise
-    if "traceback" in em_low:
+    if "traceback" in error_msg.lower():
         error_msg = error_msg.split("Traceback", 1)[0].strip()
-        em_low = error_msg.lower()
-
-    # UI / NoSuchElement-style errors
-    if "noselementexception" in em_low or "unable to locate element" in em_low:
-        m = re.search(r"#([\w\-]+)", error_msg)
-        if m:
-            elem_name = _css_id_to_words("#" + m.group(1))
-            return f"{elem_name} not found in UI"
-        return "Required UI element not found on page"
-
-    # React / JS / frontend TypeError
-    if "cannot read properties of undefined" in em_low or "cannot read property" in em_low:
-        return "Frontend component fails due to undefined value"
-
-    # Database / timeout / psycopg2 errors
-    if "psycopg2" in em_low or "database" in em_low or "connection timed out" in em_low:
-        return "Database timeout while retrieving data"
-
-    # 500 / internal server error-style failures
-    if "internal server error" in em_low or "status code 500" in em_low or " 500" in em_low:
-        if test_name:
-            return f"Internal server error during {test_name}"
-        return "Internal server error while processing request"
-
-    # TypeError / attribute errors etc.
-    if "typeerror" in em_low:
-        return "Type error due to invalid input or state"
-    if "attributeerror" in em_low:
-        return "Attribute error accessing invalid or None object"
-
-    # Generic assertion mismatch
-    if "assertionerror" in em_low:
-        return "Assertion failure in automated test"
 
     # Fallback: shorten the error message into a title-ish phrase
     if error_msg:
@@ -171,76 +166,132 @@ def _heuristic_bug_title(failure_text: str) -> str:
     return "Automated test failure"
 
 
-def _sanitize_description(bug_description: str, failure_text: str) -> str:
+class DescriptionSanitizer:
     """
-    Remove raw lines that just repeat the failure text (Test Name, Stack Trace, Logs, etc),
-    so the description looks like a clean explanation, not a dump.
+    Incremental version of the description cleanup: feed LLM output as it is
+    generated and get back the cleaned lines that are complete so far.
+    Raw lines that just repeat the failure text (Test Name, Stack Trace, Logs, etc)
+    are dropped, blank lines are collapsed and leading/trailing blanks removed.
     """
-    failure_lines = {
-        line.strip() for line in failure_text.splitlines() if line.strip()
-    }
 
-    cleaned_lines = []
-    for line in bug_description.splitlines():
-        stripped = line.strip()
-        lower = stripped.lower()
+    # Line boundaries recognised by str.splitlines
+    _LINE_BREAKS = tuple("\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
 
-        if not stripped:
-            cleaned_lines.append("")
-            continue
+    def __init__(self, failure_text: str):
+        self._failure_lines = {
+            line.strip() for line in failure_text.splitlines() if line.strip()
+        }
+        self._pending = ""
+        self._started = False
+        self._blank_pending = False
+
+    def _is_dump_line(self, stripped: str) -> bool:
+        lower = stripped.lower()
 
         # Remove exact failure lines
-        if stripped in failure_lines:
-            continue
+        if stripped in self._failure_lines:
+            return True
 
         # Remove obvious technical dump patterns
         if stripped.startswith("Test Name:"):
-            continue
+            return True
         if stripped.startswith("File Path:"):
-            continue
+            return True
         if stripped.startswith("Error Message:"):
-            continue
+            return True
         if stripped.startswith("Stack Trace:"):
-            continue
+            return True
         if stripped.startswith("Logs:"):
-            continue
+            return True
         if "traceback (most recent call last):" in lower:
-            continue
+            return True
         if stripped.startswith("Traceback (most recent call last):"):
-            continue
+            return True
         if "file \"" in lower and " line " in lower and " in " in lower:
-            continue
+            return True
         if stripped.startswith("[") and "]" in stripped and ("error" in lower or "debug" in lower):
-            continue
-
-        cleaned_lines.append(stripped)
-
-    # Collapse multiple blank lines
-    final_lines = []
-    prev_blank = False
-    for line in cleaned_lines:
-        if line == "":
-            if not prev_blank:
-                final_lines.append("")
-            prev_blank = True
-        else:
-            final_lines.append(line)
-            prev_blank = False
+            return True
+        return False
 
-    return "\n".join(final_lines).strip()
+    def _clean_line(self, line: str) -> List[str]:
+        stripped = line.strip()
+
+        if not stripped:
+            # Collapse multiple blank lines; only emit one once text follows
+            if self._started:
+                self._blank_pending = True
+            return []
+
+        if self._is_dump_line(stripped):
+            return []
+
+        cleaned = [""] if self._blank_pending else []
+        cleaned.append(stripped)
+        self._started = True
+        self._blank_pending = False
+        return cleaned
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Add generated text and return the cleaned lines completed by it.
+        """
+        lines = (self._pending + chunk).splitlines(keepends=True)
+        self._pending = ""
+        # Keep the unterminated last line; a trailing "\r" may still become "\r\n"
+        if lines and (lines[-1].endswith("\r") or not lines[-1].endswith(self._LINE_BREAKS)):
+            self._pending = lines.pop()
+
+        cleaned = []
+        for line in lines:
+            cleaned.extend(self._clean_line(line))
+        return cleaned
+
+    def finish(self) -> List[str]:
+        """
+        Flush the last (unterminated) line once generation is complete.
+        """
+        line, self._pending = self._pending, ""
+        return self._clean_line(line) if line else []
+
+
+@metrics.timed(metrics.SANITIZE_SECONDS)
+def _sanitize_description(bug_description: str, failure_text: str) -> str:
+    """
+    Remove raw lines that just repeat the failure text (Test Name, Stack Trace, Logs, etc),
+    so the description looks like a clean explanation, not a dump.
+    """
+    sanitizer = DescriptionSanitizer(failure_text)
+    lines = sanitizer.feed(bug_description) + sanitizer.finish()
+    return "\n".join(lines).strip()
 
 
-def generate_bug_report(model_name: str, failure_text: str) -> dict:
+def _fallback_description(failure_text: str, title: str, error: Exception) -> str:
     """
-    - Title: generated heuristically from the error message.
-    - Description: generated by LLM, then cleaned to avoid raw dumps.
+    Templated description used when Ollama is unavailable, failing or out of time.
     """
+    test_name = _extract_test_name(failure_text) or "an automated test"
+    error_lines = _extract_error_message(failure_text).splitlines()
+    error_msg = error_lines[0][:300] if error_lines else "no error message was reported"
+    return (
+        f"{title}.\n\n"
+        f"The failure was reported by {test_name} with the error: {error_msg}\n\n"
+        f"This description was generated from a template because the language model "
+        f"could not be used ({error}). Re-triage the failure for a full description."
+    )
+
+
+def _fallback_bug_report(failure_text: str, title: str, error: Exception) -> dict:
+    metrics.FALLBACKS.inc(stage="llm", reason=type(error).__name__)
+    return {
+        "title": title,
+        "description": _fallback_description(failure_text, title, error),
+        "prompt_tokens_saved": None,
+        "degraded": True,
+    }
 
-    # 1) TITLE (heuristic)
-    bug_title = _heuristic_bug_title(failure_text)
 
-    # 2) DESCRIPTION (LLM)
-    desc_prompt = f"""
+def _build_description_prompt(failure_details: str) -> str:
+    return f"""
 You are an expert QA engineer.
 
 Read the FAILED TEST DETAILS below and write a long, detailed, professional bug description
@@ -266,17 +317,85 @@ Content requirements:
 - End with a short suggestion of what the development team should investigate or fix.
 
 FAILED TEST DETAILS:
-{failure_text}
+{failure_details}
 """
 
+
+async def generate_bug_report_async(model_name: str, failure_text: str, deadline: Optional[Deadline] = None) -> dict:
+    """
+    - Title: generated heuristically from the error message.
+    - Description: generated by LLM, then cleaned to avoid raw dumps; a templated
+      description (and "degraded": True) when Ollama fails, its circuit breaker is
+      open or `deadline` runs out.
+    """
+
+    # 1) TITLE (heuristic)
+    bug_title = _heuristic_bug_title(failure_text)
+
+    # 2) DESCRIPTION (LLM), from the compacted failure text; the sanitizer still
+    # checks against the full text
+    compacted = compact_failure_text(failure_text)
+    desc_prompt = _build_description_prompt(compacted.text)
+
     try:
-        bug_description = _call_ollama(model_name, desc_prompt, num_predict=1200)
+        timeout = resilience.stage_timeout(deadline, OLLAMA_TIMEOUT)
+        bug_description = await _call_ollama_async(model_name, desc_prompt, num_predict=1200, timeout=timeout)
     except Exception as e:
-        bug_description = f"Bug description generation failed: {str(e)}"
+        return _fallback_bug_report(failure_text, bug_title, e)
 
     bug_description = _sanitize_description(bug_description, failure_text)
 
     return {
         "title": bug_title,
         "description": bug_description.strip(),
+        "prompt_tokens_saved": compacted.tokens_saved,
+        "degraded": False,
     }
+
+
+def generate_bug_title(failure_text: str) -> str:
+    """
+    Heuristic bug title; cheap enough to return before the description is generated.
+    """
+    return _heuristic_bug_title(failure_text)
+
+
+async def stream_bug_description(
+    model_name: str,
+    failure_text: str,
+    compacted: Optional[CompactedText] = None,
+    deadline: Optional[Deadline] = None,
+    outcome: Optional[dict] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream the LLM bug description as cleaned lines, sanitizing each line as soon as
+    Ollama completes it. Joining the yielded lines with "\n" gives the same text
+    as generate_bug_report_async's description.
+    `compacted` is compact_failure_text(failure_text), if the caller already has it.
+    If Ollama fails, the templated description follows whatever was streamed so
+    far and `outcome["degraded"]` is set to True.
+    """
+    sanitizer = DescriptionSanitizer(failure_text)
+    if compacted is None:
+        compacted = compact_failure_text(failure_text)
+    desc_prompt = _build_description_prompt(compacted.text)
+
+    error: Optional[Exception] = None
+    try:
+        async for fragment in _stream_ollama_async(model_name, desc_prompt, num_predict=1200, deadline=deadline):
+            for line in sanitizer.feed(fragment):
+                yield line
+    except Exception as e:
+        error = e
+
+    for line in sanitizer.finish():
+        yield line
+
+    if error is not None:
+        # Same template as the non-streaming path, after whatever was streamed so far
+        metrics.FALLBACKS.inc(stage="llm", reason=type(error).__name__)
+        title = _heuristic_bug_title(failure_text)
+        for line in _fallback_description(failure_text, title, error).split("\n"):
+            yield line
+    if outcome is not None:
+        outcome["degraded"] = error is not None
@@ -1,14 +1,51 @@
 """
 Intelligent Playwright error label detection service.
-Uses BERT model for classification with pattern-based fallback.
+Tiered: confident keyword rules decide on their own, ambiguous cases go to the
+BERT model, and the first rule candidate is the fallback when BERT is unavailable.
 """
 
+import os
 import re
-import requests
-from typing import Optional
+import time
+from typing import Any, Dict, Optional
 
+from app.services import http_client, resilience
+from app.services.resilience import Deadline
+from app.utils import keyword_rules, metrics
 
-def _call_bert_classifier(text: str, bert_url: str, candidate_labels: list) -> str:
+BERT_TIMEOUT = float(os.getenv("BERT_TIMEOUT", "30"))
+# Share of the triage deadline the BERT call may use
+BERT_DEADLINE_SHARE = float(os.getenv("BERT_DEADLINE_SHARE", "0.25"))
+# BERT calls slower than this count as failures for the circuit breaker
+BERT_SLOW_CALL_SECONDS = float(os.getenv("BERT_SLOW_CALL_SECONDS", "10"))
+
+# Rule labels at least this confident are returned without a BERT round-trip
+# (assertion rules default to 0.95, see keyword_rules.DEFAULT_CONFIDENCE)
+LABEL_RULE_CONFIDENCE = float(os.getenv("TRIAGE_LABEL_RULE_CONFIDENCE", "0.9"))
+
+# Which tier decided the label
+TIER_RULE = "rule"
+TIER_BERT = "bert"
+TIER_FALLBACK = "fallback"
+
+
+def _bert_breaker(endpoint: str) -> resilience.CircuitBreaker:
+    # One breaker per BERT server, since the URL comes with each request
+    return resilience.get_breaker(f"bert {endpoint}", BERT_SLOW_CALL_SECONDS)
+
+
+def _record_bert_failure(started: float, error: Exception) -> None:
+    print(f"BERT classification failed: {error}")
+    metrics.BERT_SECONDS.observe(time.perf_counter() - started, outcome="error")
+    metrics.FALLBACKS.inc(stage="label", reason=type(error).__name__)
+
+
+def _call_bert_classifier(
+    text: str,
+    bert_url: str,
+    candidate_labels: list,
+    deadline: Optional[Deadline] = None
+) -> Optional[dict]:
     """
     Call BERT server to classify error text into one of the candidate labels.
     
@@ -16,10 +53,13 @@ def _call_bert_classifier(text: str, bert_url: str, candidate_labels: list) -> s
         text: Error text to classify
         bert_url: BERT server endpoint URL
         candidate_labels: List of possible labels
+        deadline: Optional request deadline; the call gets BERT_DEADLINE_SHARE of it
         
     Returns:
-        Best matching label from BERT classification
+        {"label": ..., "confidence": ...} from BERT, None if the call failed, its
+        circuit breaker is open or the deadline ran out
     """
+    started = time.perf_counter()
     try:
         # Use the /predict endpoint
         endpoint = bert_url.replace("/triage", "/predict")
@@ -29,16 +69,51 @@ def _call_bert_classifier(text: str, bert_url: str, candidate_labels: list) -> s
             "labels": candidate_labels
         }
         
-        response = requests.post(endpoint, json=payload, timeout=30)
-        response.raise_for_status()
+        timeout = resilience.stage_timeout(deadline, BERT_TIMEOUT, BERT_DEADLINE_SHARE)
+        with _bert_breaker(endpoint).guard():
+            response = http_client.post(endpoint, timeout=timeout, json=payload)
+            response.raise_for_status()
+        
+        result = response.json()
+        metrics.BERT_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+        return {"label": result.get("label", candidate_labels[0]), "confidence": result.get("confidence")}
+        
+    except Exception as e:
+        # Caller falls back to the first candidate label
+        _record_bert_failure(started, e)
+        return None
+
+
+async def _call_bert_classifier_async(
+    text: str,
+    bert_url: str,
+    candidate_labels: list,
+    deadline: Optional[Deadline] = None
+) -> Optional[dict]:
+    """
+    Async variant of _call_bert_classifier with the same fallback behaviour.
+    """
+    started = time.perf_counter()
+    try:
+        endpoint = bert_url.replace("/triage", "/predict")
+        
+        payload = {
+            "text": text,
+            "labels": candidate_labels
+        }
+        
+        timeout = resilience.stage_timeout(deadline, BERT_TIMEOUT, BERT_DEADLINE_SHARE)
+        with _bert_breaker(endpoint).guard():
+            response = await http_client.post_async(endpoint, timeout=timeout, json=payload)
+            response.raise_for_status()
         
         result = response.json()
-        return result.get("label", candidate_labels[0])
+        metrics.BERT_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+        return {"label": result.get("label", candidate_labels[0]), "confidence": result.get("confidence")}
         
     except Exception as e:
-        # Fallback to first label if BERT fails
-        print(f"BERT classification failed: {e}")
-        return candidate_labels[0] if candidate_labels else "Test Failure"
+        _record_bert_failure(started, e)
+        return None
 
 
 def _detect_playwright_assertion_type(error_message: str) -> Optional[str]:
@@ -46,46 +121,11 @@ def _detect_playwright_assertion_type(error_message: str) -> Optional[str]:
     Detect specific Playwright assertion type from error message.
     Returns specific label if assertion is detected, None otherwise.
     """
-    em_low = error_message.lower()
-    
-    # Playwright assertion patterns
-    if "tohavetitle" in em_low or "to have title" in em_low:
-        return "Assertion: Title Mismatch"
-    
-    if "tobevisible" in em_low or "to be visible" in em_low:
-        return "Assertion: Element Not Visible"
-    
-    if "tohaveurl" in em_low or "to have url" in em_low:
-        return "Assertion: URL Mismatch"
-    
-    if "tohavetext" in em_low or "to have text" in em_low:
-        return "Assertion: Text Mismatch"
-    
-    if "tohavecount" in em_low or "to have count" in em_low:
-        return "Assertion: Count Mismatch"
-    
-    if "tocontaintext" in em_low or "to contain text" in em_low:
-        return "Assertion: Missing Text"
-    
-    if "tobeenabled" in em_low or "to be enabled" in em_low:
-        return "Assertion: Element Not Enabled"
-    
-    if "tobedisabled" in em_low or "to be disabled" in em_low:
-        return "Assertion: Element Not Disabled"
-    
-    if "tobechecked" in em_low or "to be checked" in em_low:
-        return "Assertion: Checkbox Not Checked"
-    
-    if "tohavevalue" in em_low or "to have value" in em_low:
-        return "Assertion: Value Mismatch"
-    
-    if "tohaveattribute" in em_low or "to have attribute" in em_low:
-        return "Assertion: Attribute Mismatch"
-    
-    if "tobeattached" in em_low or "to be attached" in em_low:
-        return "Assertion: Element Not Attached"
-    
-    return None
+    return keyword_rules.classify(error_message=error_message).assertion_label
+
+
+# Used when no candidate rule matches
+GENERIC_CANDIDATE_LABELS = ["Test Failure", "UI Test Error", "Playwright Error"]
 
 
 def _get_candidate_labels_from_patterns(error_message: str, stack_trace: str) -> list:
@@ -93,115 +133,132 @@ def _get_candidate_labels_from_patterns(error_message: str, stack_trace: str) ->
     Generate candidate labels based on error patterns.
     These will be used for BERT classification.
     """
-    combined_text = f"{error_message} {stack_trace}".lower()
+    candidates = keyword_rules.classify(error_message=error_message, stack_trace=stack_trace).candidate_labels
+    return candidates or list(GENERIC_CANDIDATE_LABELS)
+
+
+def _candidates_from_match(match: keyword_rules.RuleMatch) -> list:
     candidates = []
     
-    # Timeout patterns
-    if "timeout" in combined_text or "timed out" in combined_text:
-        candidates.append("Timeout Error")
-    
-    # Element locator issues
-    if "locator" in combined_text or "selector" in combined_text:
-        candidates.append("Element Locator Issue")
-    
-    # Element not found
-    if "not found" in combined_text or "unable to locate" in combined_text:
-        candidates.append("Element Not Found")
-    
-    # Navigation issues
-    if "navigation" in combined_text or "goto" in combined_text:
-        candidates.append("Navigation Error")
-    
-    # Network/API issues
-    if "network" in combined_text or "request failed" in combined_text or "api" in combined_text:
-        candidates.append("Network Error")
+    # Add assertion-specific labels if detected
+    if match.assertion_label:
+        candidates.append(match.assertion_label)
     
-    # Screenshot/video issues
-    if "screenshot" in combined_text or "video" in combined_text:
-        candidates.append("Media Capture Error")
+    # Add pattern-based candidates
+    candidates.extend(match.candidate_labels or GENERIC_CANDIDATE_LABELS)
     
-    # Action failures (click, type, etc.)
-    if "click" in combined_text:
-        candidates.append("Click Action Failed")
-    if "type" in combined_text or "fill" in combined_text:
-        candidates.append("Input Action Failed")
-    if "hover" in combined_text:
-        candidates.append("Hover Action Failed")
+    # Remove duplicates while preserving order
+    seen = set()
+    unique_candidates = []
+    for c in candidates:
+        if c not in seen:
+            seen.add(c)
+            unique_candidates.append(c)
     
-    # Assertion failures (generic)
-    if "expect" in combined_text or "assertion" in combined_text:
-        candidates.append("Assertion Failure")
+    return unique_candidates if unique_candidates else ["Test Failure"]
+
+
+def _label_result(label: str, tier: str, confidence: Optional[float]) -> Dict[str, Any]:
+    return {"label": label, "tier": tier, "confidence": confidence}
+
+
+def _rule_tier(error_message: str, stack_trace: str):
+    """
+    Tier 1: keyword rules. Returns (candidates, rule confidence per label, result);
+    result is None when the rules are not conclusive and BERT should choose.
+    """
+    # Assertion and pattern rules come out of a single classification pass
+    match = keyword_rules.classify(error_message=error_message, stack_trace=stack_trace)
+    candidates = _candidates_from_match(match)
+    confidence = match.label_confidence
     
-    # Page/frame issues
-    if "frame" in combined_text:
-        candidates.append("Frame Error")
-    if "page closed" in combined_text or "page crashed" in combined_text:
-        candidates.append("Page Crash")
+    # A specific assertion (toHaveTitle, toBeVisible, ...) already names the failure
+    if match.assertion_label and confidence[match.assertion_label] >= LABEL_RULE_CONFIDENCE:
+        return candidates, confidence, _label_result(match.assertion_label, TIER_RULE, confidence[match.assertion_label])
     
-    # If no specific patterns found, add generic labels
-    if not candidates:
-        candidates = [
-            "Test Failure",
-            "UI Test Error",
-            "Playwright Error"
-        ]
+    # A single rule candidate leaves BERT nothing to choose from
+    if not match.assertion_label and len(candidates) == 1 and candidates[0] in confidence:
+        return candidates, confidence, _label_result(candidates[0], TIER_RULE, confidence[candidates[0]])
     
-    return candidates
+    return candidates, confidence, None
 
 
-def detect_playwright_label(
+def classify_playwright_label(
     error_message: str,
     stack_trace: str,
     failure_text: str,
-    bert_url: Optional[str] = None
-) -> str:
+    bert_url: Optional[str] = None,
+    deadline: Optional[Deadline] = None
+) -> Dict[str, Any]:
     """
-    Intelligently detect triage label for Playwright errors using BERT prominently.
-    
-    NEW APPROACH - BERT-First Classification:
-    1. Generate ALL possible candidate labels (assertions + patterns)
-    2. Use BERT to classify among ALL candidates (uses 30K trained model)
-    3. Falls back to pattern-based detection only if BERT unavailable
+    Tiered triage label detection for Playwright errors.
     
-    This ensures BERT is used for ALL errors, not just non-assertion ones.
+    1. Keyword rules: a confident assertion rule (or a single rule candidate)
+       decides right away, without calling BERT
+    2. BERT: classifies the remaining, ambiguous cases among all candidates
+    3. Fallback: the first (most specific) candidate if BERT is unavailable, fails,
+       has its circuit breaker open or runs out of time
     
     Args:
         error_message: The error message from test failure
         stack_trace: The stack trace from test failure
         failure_text: Complete failure text
         bert_url: Optional BERT server URL for classification
+        deadline: Optional request deadline bounding the BERT call
         
     Returns:
-        Intelligent triage label string
+        {"label": ..., "tier": "rule" | "bert" | "fallback", "confidence": float or None}
     """
-    # Step 1: Build comprehensive candidate list
-    candidates = []
-    
-    # Add assertion-specific labels if detected
-    assertion_label = _detect_playwright_assertion_type(error_message)
-    if assertion_label:
-        candidates.append(assertion_label)
+    candidates, confidence, result = _rule_tier(error_message, stack_trace)
+    if result is not None:
+        return result
     
-    # Add pattern-based candidates
-    pattern_candidates = _get_candidate_labels_from_patterns(error_message, stack_trace)
-    candidates.extend(pattern_candidates)
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_candidates = []
-    for c in candidates:
-        if c not in seen:
-            seen.add(c)
-            unique_candidates.append(c)
+    if bert_url:
+        # Combine error info for BERT analysis
+        text_for_classification = f"{error_message}\n{stack_trace[:500]}"
+        bert = _call_bert_classifier(text_for_classification, bert_url, candidates, deadline)
+        if bert is not None:
+            return _label_result(bert["label"], TIER_BERT, bert["confidence"])
     
-    candidates = unique_candidates if unique_candidates else ["Test Failure"]
+    # The first (most specific) candidate; generic labels have no rule confidence
+    return _label_result(candidates[0], TIER_FALLBACK, confidence.get(candidates[0]))
+
+
+async def classify_playwright_label_async(
+    error_message: str,
+    stack_trace: str,
+    failure_text: str,
+    bert_url: Optional[str] = None,
+    deadline: Optional[Deadline] = None
+) -> Dict[str, Any]:
+    """
+    Async variant of classify_playwright_label, used by the async triage pipeline.
+    """
+    candidates, confidence, result = _rule_tier(error_message, stack_trace)
+    if result is not None:
+        return result
     
-    # Step 2: Use BERT for classification (PRIMARY METHOD)
     if bert_url:
-        # Combine error info for BERT analysis
         text_for_classification = f"{error_message}\n{stack_trace[:500]}"
-        bert_label = _call_bert_classifier(text_for_classification, bert_url, candidates)
-        return bert_label
+        bert = await _call_bert_classifier_async(text_for_classification, bert_url, candidates, deadline)
+        if bert is not None:
+            return _label_result(bert["label"], TIER_BERT, bert["confidence"])
     
-    # Step 3: Fallback - return the first (most specific) candidate only if BERT unavailable
-    return candidates[0]
+    # The first (most specific) candidate; generic labels have no rule confidence
+    return _label_result(candidates[0], TIER_FALLBACK, confidence.get(candidates[0]))
+
+
+def detect_playwright_label(
+    error_message: str,
+    stack_trace: str,
+    failure_text: str,
+    bert_url: Optional[str] = None
+) -> str:
+    """
+    Detect the triage label for a Playwright error (see classify_playwright_label).
+    
+    Returns:
+        Intelligent triage label string
+    """
+    return classify_playwright_label(error_message, stack_trace, failure_text, bert_url)["label"]
+
@@ -0,0 +1,192 @@
+"""
+Deadlines and circuit breakers for the downstream calls (Ollama, BERT).
+A Deadline is the time budget of one triage request; every stage gets at most
+what is left of it. A CircuitBreaker stops calling a downstream after repeated
+failures or slow calls, so requests go straight to their fallback until a
+single half-open probe call succeeds again.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+# Overall time budget of a triage request (seconds)
+TRIAGE_DEADLINE = float(os.getenv("TRIAGE_DEADLINE", "180"))
+
+# Consecutive failed (or slow) calls that open a breaker
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+# Seconds an open breaker waits before letting a probe call through
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage has no time left in the request's deadline."""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a downstream whose circuit breaker is open."""
+
+
+class Deadline:
+    """
+    Time budget of one request, measured from its creation.
+    """
+
+    def __init__(self, seconds: float = TRIAGE_DEADLINE):
+        self.seconds = seconds
+        self._expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float, share: float = 1.0) -> float:
+        """
+        Timeout for a stage: at most `cap`, `share` of the whole budget and
+        what is left of it. Raises DeadlineExceeded when nothing is left.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"triage deadline of {self.seconds:g}s exceeded")
+        return min(cap, self.seconds * share, remaining)
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through; `failure_threshold` consecutive failures or calls
+    slower than `slow_call_seconds` open it. Open: calls are refused until
+    `reset_seconds` have passed, then one probe call is let through (half open);
+    its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+    ):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def available(self) -> bool:
+        """
+        Whether allow() would let a call through now, without claiming the probe slot.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                return time.monotonic() - self._opened_at >= self.reset_seconds
+            return not self._probing
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go through now; in half-open state only the first caller may.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self, duration: float) -> None:
+        if duration >= self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Wrap one downstream call: raises CircuitOpenError if the breaker refuses
+        it, otherwise records its duration or failure.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled: says nothing about the downstream, but frees the probe slot
+            with self._lock:
+                self._probing = False
+            raise
+        self.record_success(time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._failures,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, slow_call_seconds: float) -> CircuitBreaker:
+    """
+    Return the breaker registered under `name`, creating it on first use.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, slow_call_seconds)
+        return breaker
+
+
+def list_breakers() -> List[dict]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.snapshot() for breaker in breakers]
+
+
+def stage_timeout(deadline: Optional[Deadline], cap: float, share: float = 1.0) -> float:
+    """
+    Timeout for a stage of a request that may not have a deadline.
+    """
+    return deadline.timeout(cap, share) if deadline is not None else cap
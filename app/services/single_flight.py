@@ -0,0 +1,55 @@
+"""
+Request coalescing ("single flight").
+Concurrent calls with the same key share one execution: the first caller runs
+it, the others wait for it and get the same result (or the same exception).
+Nothing is cached; the key is forgotten as soon as the execution finishes.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls by key among the tasks of the running event loop.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._executions = 0
+        self._coalesced = 0
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Await `fn()` unless a call with `key` is already in flight, in which case
+        wait for that call instead (at most `timeout` seconds, then TimeoutError).
+        The shared execution runs as its own task, so a cancelled caller does not
+        cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        if task is not None and task.get_loop() is loop:
+            self._coalesced += 1
+        else:
+            task = loop.create_task(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+            self._executions += 1
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller was cancelled
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        {"executions": calls actually run, "coalesced": calls that waited on one,
+         "in_flight": executions running now}
+        """
+        return {
+            "executions": self._executions,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._tasks),
+        }
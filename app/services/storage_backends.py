@@ -0,0 +1,721 @@
+"""
+Storage backends for triage results.
+MemoryBackend keeps results in a dict of the worker process; SqliteBackend
+keeps them in an embedded SQLite database in WAL mode, so results survive
+restarts and several uvicorn workers can share one store (readers never
+block the writer, and writers of different processes queue on the lock).
+Both also hold cluster membership (the cluster_id of stored results), the
+near-duplicate cluster signatures and the status of queued-mode jobs.
+storage_service picks one with TRIAGE_STORAGE_BACKEND.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+TRIAGE_STORAGE_BACKEND = os.getenv("TRIAGE_STORAGE_BACKEND", "memory").lower()
+TRIAGE_STORAGE_PATH = os.getenv("TRIAGE_STORAGE_PATH", "triage_results.db")
+# Seconds a writer waits for another process's write transaction
+SQLITE_BUSY_TIMEOUT = float(os.getenv("TRIAGE_SQLITE_BUSY_TIMEOUT", "30"))
+
+
+def _is_original(record: dict) -> bool:
+    return bool(record.get("fingerprint")) and not record.get("duplicate_of")
+
+
+def _is_degraded(record: dict) -> bool:
+    # Its description is the templated fallback; a later healthy original replaces it
+    return "llm" in (record.get("fallbacks") or [])
+
+
+def _split_blobs(record: dict, blob_fields: Tuple[str, ...]) -> Tuple[dict, Optional[bytes]]:
+    """
+    The record without its bytes values of `blob_fields`, and those values
+    concatenated into one BLOB; the record lists them as _blobs = [[field, length], ...].
+    """
+    blobs = [(field, record[field]) for field in blob_fields if isinstance(record.get(field), bytes)]
+    if not blobs:
+        return record, None
+    document = {field: value for field, value in record.items() if field not in dict(blobs)}
+    document["_blobs"] = [[field, len(value)] for field, value in blobs]
+    return document, b"".join(value for _, value in blobs)
+
+
+def _join_blobs(record: dict, layout: Optional[list], blobs: Optional[bytes], fields=None) -> dict:
+    """
+    Put the values of a BLOB made by _split_blobs back into the record (only `fields`, if given).
+    """
+    if layout and blobs is not None:
+        offset = 0
+        for field, length in layout:
+            if fields is None or field in fields:
+                record[field] = bytes(blobs[offset:offset + length])
+            offset += length
+    return record
+
+
+def _project(record: dict, fields: Optional[List[str]]) -> dict:
+    return record if fields is None else {field: record.get(field) for field in fields}
+
+
+class TimeIndex:
+    """
+    Result ids in creation order. Ids are appended (creation times almost
+    always arrive in order; a late one is inserted at its place) and deleted
+    ids leave a tombstone (None) behind, so deletes are O(1); the list is
+    compacted once tombstones make up half of it. Newest-first and time-range
+    scans walk the list from a bisected position and never copy the store.
+    A Fenwick tree over the live (not tombstoned) positions counts the ids of
+    a time range in O(log n).
+    """
+
+    def __init__(self):
+        self._ids: List[Optional[str]] = []
+        self._times: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._tombstones = 0
+        # Fenwick tree (1-based) of live flags of _ids
+        self._live: List[int] = [0]
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, result_id: str, created_at: str) -> None:
+        if result_id in self._positions:
+            self.remove(result_id)
+        if not self._times or created_at >= self._times[-1]:
+            self._positions[result_id] = len(self._ids)
+            self._ids.append(result_id)
+            self._times.append(created_at)
+            self._append_live()
+            return
+        index = bisect_right(self._times, created_at)
+        self._ids.insert(index, result_id)
+        self._times.insert(index, created_at)
+        self._reindex(index)
+        self._rebuild_live()
+
+    def remove(self, result_id: str) -> None:
+        index = self._positions.pop(result_id, None)
+        if index is None:
+            return
+        self._ids[index] = None
+        self._tombstones += 1
+        position = index + 1
+        while position < len(self._live):
+            self._live[position] -= 1
+            position += position & -position
+        if self._tombstones * 2 > len(self._ids):
+            self._compact()
+
+    def _reindex(self, start: int = 0) -> None:
+        for index in range(start, len(self._ids)):
+            if self._ids[index] is not None:
+                self._positions[self._ids[index]] = index
+
+    def _compact(self) -> None:
+        live = [(result_id, created_at) for result_id, created_at in zip(self._ids, self._times) if result_id is not None]
+        self._ids = [result_id for result_id, _ in live]
+        self._times = [created_at for _, created_at in live]
+        self._tombstones = 0
+        self._reindex()
+        self._rebuild_live()
+
+    def _append_live(self) -> None:
+        # The node of the new last position covers positions (i - lowbit(i), i]
+        position = len(self._ids)
+        self._live.append(1 + self._live_count(position - 1) - self._live_count(position - (position & -position)))
+
+    def _rebuild_live(self) -> None:
+        tree = [0] * (len(self._ids) + 1)
+        for position in range(1, len(tree)):
+            if self._ids[position - 1] is not None:
+                tree[position] += 1
+            parent = position + (position & -position)
+            if parent < len(tree):
+                tree[parent] += tree[position]
+        self._live = tree
+
+    def _live_count(self, end: int) -> int:
+        # Live ids among the first `end` positions
+        total = 0
+        while end > 0:
+            total += self._live[end]
+            end -= end & -end
+        return total
+
+    def count(self, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        """
+        Number of ids created in [since, until), in O(log n).
+        """
+        if since is None and until is None:
+            return len(self._positions)
+        start = bisect_left(self._times, since) if since is not None else 0
+        end = bisect_left(self._times, until) if until is not None else len(self._ids)
+        if end <= start:
+            return 0
+        return self._live_count(end) - self._live_count(start)
+
+    def older_than(self, cutoff: str) -> List[str]:
+        """
+        Ids created before `cutoff`, oldest first.
+        """
+        return [result_id for result_id in self._ids[:bisect_left(self._times, cutoff)] if result_id is not None]
+
+    def newest(
+        self,
+        limit: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        before: Optional[Tuple[str, str]] = None,
+    ) -> Iterator[str]:
+        """
+        Ids newest first, created in [since, until), at most `limit`; with
+        `before` = (created_at, id) of a listed result, only the ones after it.
+        """
+        end = bisect_left(self._times, until) if until is not None else len(self._ids)
+        if before is not None:
+            created_at, result_id = before
+            position = self._positions.get(result_id)
+            if position is None or self._times[position] != created_at:
+                # Deleted (or re-stored) since it was listed: resume at its time
+                position = bisect_left(self._times, created_at)
+            end = min(end, position)
+        start = bisect_left(self._times, since) if since is not None else 0
+        remaining = limit
+        for index in range(end - 1, start - 1, -1):
+            if remaining is not None and remaining <= 0:
+                return
+            result_id = self._ids[index]
+            if result_id is not None:
+                if remaining is not None:
+                    remaining -= 1
+                yield result_id
+
+
+def estimate_size(record: dict) -> int:
+    """
+    Approximate bytes a stored record takes in memory (the dict and its values).
+    """
+    return sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+
+
+class MemoryBackend:
+    """
+    Results in a dict of this process, plus a fingerprint index, a time index
+    and a cluster index. The dict is kept in least-recently-used order (reads
+    move a result to the end), so evict() drops the coldest results first in
+    O(1) each. Cluster signatures are kept by cluster_service itself.
+    """
+
+    # Eviction is cheap enough to run after every write
+    evict_on_write = True
+
+    def __init__(self):
+        # {result_id: result_data}, least recently used first
+        self._storage: "OrderedDict[str, dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        # {fingerprint: result_id of the first original result with it,
+        #  replaced by a later one if the first is degraded and the later one is not}
+        self._fingerprints: Dict[str, str] = {}
+        self._by_time = TimeIndex()
+        # {cluster_id: {result_id: None}} in insertion order, so the first key is the representative
+        self._cluster_members: Dict[str, Dict[str, None]] = {}
+        # {job_id: job}
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def insert(self, records: List[dict]) -> None:
+        with self._lock:
+            for record in records:
+                if record["id"] in self._storage:
+                    self._remove(record["id"])
+                self._storage[record["id"]] = record
+                self._sizes[record["id"]] = size = estimate_size(record)
+                self._bytes += size
+                self._by_time.add(record["id"], record["created_at"])
+                if _is_original(record):
+                    current = self._storage.get(self._fingerprints.get(record["fingerprint"]))
+                    if current is None or (_is_degraded(current) and not _is_degraded(record)):
+                        self._fingerprints[record["fingerprint"]] = record["id"]
+                if record.get("cluster_id"):
+                    self._cluster_members.setdefault(record["cluster_id"], {})[record["id"]] = None
+
+    def get(self, result_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._storage.get(result_id)
+            if record is not None:
+                self._storage.move_to_end(result_id)
+            return record
+
+    def find_original(self, fingerprint: str) -> Optional[dict]:
+        result_id = self._fingerprints.get(fingerprint)
+        return self.get(result_id) if result_id else None
+
+    def newest(self, limit: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            return [self._storage[result_id] for result_id in self._by_time.newest(limit, since, until)]
+
+    def page(
+        self,
+        limit: Optional[int],
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        after: Optional[list] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[list]]:
+        """
+        Up to `limit` results (None = all) newest first, following the position
+        `after` of the previous page; returns them (only `fields`, if given) and
+        the position after the last one, None when there are no more.
+        """
+        with self._lock:
+            fetch = None if limit is None else limit + 1
+            ids = list(self._by_time.newest(fetch, since, until, tuple(after) if after else None))
+            records = [self._storage[result_id] for result_id in ids[:limit]]
+        more = limit is not None and len(ids) > limit
+        next_position = [records[-1]["created_at"], records[-1]["id"]] if more else None
+        return [_project(record, fields) for record in records], next_position
+
+    def _remove(self, result_id: str) -> dict:
+        record = self._storage.pop(result_id)
+        self._bytes -= self._sizes.pop(result_id)
+        self._by_time.remove(result_id)
+        if self._fingerprints.get(record.get("fingerprint")) == result_id:
+            del self._fingerprints[record["fingerprint"]]
+        members = self._cluster_members.get(record.get("cluster_id"))
+        if members is not None:
+            members.pop(result_id, None)
+            if not members:
+                del self._cluster_members[record["cluster_id"]]
+        return record
+
+    def delete(self, result_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._remove(result_id) if result_id in self._storage else None
+
+    def evict(self, max_count: int, max_bytes: int, expire_before: Optional[str]) -> List[Tuple[str, dict]]:
+        """
+        Remove results created before `expire_before`, then least recently used
+        results until at most `max_count` results and `max_bytes` remain
+        (0 = no limit). Returns (reason, record) per evicted result.
+        """
+        evicted = []
+        with self._lock:
+            if expire_before is not None:
+                for result_id in self._by_time.older_than(expire_before):
+                    evicted.append(("ttl", self._remove(result_id)))
+            while max_count and len(self._storage) > max_count:
+                evicted.append(("count", self._remove(next(iter(self._storage)))))
+            while max_bytes and self._bytes > max_bytes and self._storage:
+                evicted.append(("bytes", self._remove(next(iter(self._storage)))))
+        return evicted
+
+    def usage(self) -> Tuple[int, int]:
+        """
+        (stored results, their estimated bytes)
+        """
+        return len(self._storage), self._bytes
+
+    def count(self, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        with self._lock:
+            return self._by_time.count(since, until)
+
+    def save_cluster(self, cluster: dict) -> None:
+        pass
+
+    def load_clusters(self, after: int) -> Tuple[List[dict], int]:
+        """
+        Clusters saved after position `after` (by other workers or earlier runs)
+        and the position of the last one. Clusters of this process are already
+        known to cluster_service, so there are none here.
+        """
+        return [], after
+
+    def delete_cluster(self, cluster_id: str) -> None:
+        pass
+
+    def cluster_representative(self, cluster_id: str) -> Optional[str]:
+        """
+        Id of the first stored member of the cluster, None if it has none.
+        """
+        with self._lock:
+            return next(iter(self._cluster_members.get(cluster_id, ())), None)
+
+    def cluster_members(self) -> Dict[str, List[str]]:
+        """
+        {cluster_id: member ids, first stored first} of clusters with stored members.
+        """
+        with self._lock:
+            return {cluster_id: list(members) for cluster_id, members in self._cluster_members.items()}
+
+    def save_job(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def delete_job(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def evict_jobs(self, status: str, finished_before: str, max_count: int) -> int:
+        """
+        Remove jobs with `status` that finished before `finished_before`, then
+        the oldest ones over `max_count`. Returns the number removed.
+        """
+        with self._lock:
+            jobs = sorted(
+                (job for job in self._jobs.values() if job["status"] == status),
+                key=lambda job: job["finished_at"] or "",
+            )
+            excess = max(0, len(jobs) - max_count)
+            removed = [
+                job["job_id"] for index, job in enumerate(jobs)
+                if index < excess or (job["finished_at"] or "") < finished_before
+            ]
+            for job_id in removed:
+                del self._jobs[job_id]
+        return len(removed)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBackend:
+    """
+    Results as JSON documents in a SQLite table, with their id, creation time,
+    fingerprint and cluster in indexed columns; cluster signatures and jobs in
+    tables of their own. Each thread gets its own connection; statements are
+    fixed SQL with parameters, so sqlite3 reuses the prepared statements from
+    its per-connection cache.
+    """
+
+    _TABLES = (
+        """CREATE TABLE IF NOT EXISTS results (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            created_at TEXT NOT NULL,
+            fingerprint TEXT,
+            original INTEGER NOT NULL DEFAULT 0,  -- 0 = not an original, 1 = degraded original, 2 = healthy original
+            cluster_id TEXT,
+            data TEXT NOT NULL,
+            blobs BLOB  -- bytes values (compressed fields) of data, see _split_blobs
+        )""",
+        """CREATE TABLE IF NOT EXISTS clusters (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            cluster_id TEXT NOT NULL UNIQUE,
+            created_at TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            label TEXT  -- assertion label the cluster is limited to, see cluster_service
+        )""",
+        """CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            finished_at TEXT,
+            data TEXT NOT NULL
+        )""",
+    )
+    _INDEXES = (
+        "CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at, seq)",
+        # Replaced by results_original, which also finds healthy originals first
+        "DROP INDEX IF EXISTS results_fingerprint",
+        "CREATE INDEX IF NOT EXISTS results_original ON results (fingerprint, original DESC, seq) WHERE original > 0",
+        "CREATE INDEX IF NOT EXISTS results_cluster ON results (cluster_id, seq) WHERE cluster_id IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, finished_at)",
+    )
+    _INSERT = (
+        "INSERT OR REPLACE INTO results (id, created_at, fingerprint, original, cluster_id, data, blobs) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)"
+    )
+    _GET = "SELECT data, blobs FROM results WHERE id = ?"
+    # The first healthy original, else the first degraded one
+    _FIND_ORIGINAL = (
+        "SELECT data, blobs FROM results WHERE fingerprint = ? AND original > 0 ORDER BY original DESC, seq LIMIT 1"
+    )
+    # Results in [since, until) after the (created_at, seq) position of the previous page
+    _NEWEST = (
+        "SELECT seq, created_at, {columns} FROM results WHERE created_at >= ? AND created_at < ? "
+        "AND (created_at < ? OR (created_at = ? AND seq < ?)) "
+        "ORDER BY created_at DESC, seq DESC LIMIT ?"
+    )
+    _DELETE = "DELETE FROM results WHERE id = ?"
+    _COUNT = "SELECT COUNT(*) FROM results"
+    _COUNT_RANGE = "SELECT COUNT(*) FROM results WHERE created_at >= ? AND created_at < ?"
+    _EXPIRED = "SELECT seq, id, cluster_id FROM results WHERE created_at < ?"
+    _OLDEST = "SELECT seq, id, cluster_id FROM results ORDER BY created_at, seq LIMIT ?"
+    _DELETE_SEQ = "DELETE FROM results WHERE seq = ?"
+    _REPRESENTATIVE = "SELECT id FROM results WHERE cluster_id = ? ORDER BY seq LIMIT 1"
+    _CLUSTER_MEMBERS = "SELECT cluster_id, id FROM results WHERE cluster_id IS NOT NULL ORDER BY seq"
+    _INSERT_CLUSTER = "INSERT OR IGNORE INTO clusters (cluster_id, created_at, signature, label) VALUES (?, ?, ?, ?)"
+    _NEW_CLUSTERS = "SELECT seq, cluster_id, created_at, signature, label FROM clusters WHERE seq > ? ORDER BY seq"
+    # Unless another worker has stored a member in the meantime
+    _DELETE_CLUSTER = (
+        "DELETE FROM clusters WHERE cluster_id = ? AND NOT EXISTS (SELECT 1 FROM results WHERE cluster_id = ?)"
+    )
+    _SAVE_JOB = "INSERT OR REPLACE INTO jobs (job_id, status, finished_at, data) VALUES (?, ?, ?, ?)"
+    _GET_JOB = "SELECT data FROM jobs WHERE job_id = ?"
+    _DELETE_JOB = "DELETE FROM jobs WHERE job_id = ?"
+    _EXPIRED_JOBS = "DELETE FROM jobs WHERE status = ? AND finished_at < ?"
+    _EXCESS_JOBS = (
+        "DELETE FROM jobs WHERE job_id IN "
+        "(SELECT job_id FROM jobs WHERE status = ? ORDER BY finished_at DESC LIMIT -1 OFFSET ?)"
+    )
+    # Results deleted per step while the database is over its size limit
+    _EVICT_BATCH = 100
+
+    # Eviction counts rows and pages, so it is left to the background sweeper
+    evict_on_write = False
+
+    def __init__(self, path: str, blob_fields: Tuple[str, ...] = ()):
+        self.path = path
+        # Fields whose bytes values go to the blobs column instead of the JSON document
+        self.blob_fields = tuple(blob_fields)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        connection = self._connection()
+        with connection:
+            # One worker at a time creates and migrates the schema
+            connection.execute("BEGIN IMMEDIATE")
+            for statement in self._TABLES:
+                connection.execute(statement)
+            self._migrate(connection)
+            for statement in self._INDEXES:
+                connection.execute(statement)
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection) -> None:
+        # Databases written before cluster_id had a column of its own
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(results)")}
+        if "cluster_id" not in columns:
+            connection.execute("ALTER TABLE results ADD COLUMN cluster_id TEXT")
+            connection.execute("UPDATE results SET cluster_id = json_extract(data, '$.cluster_id')")
+        # ... and before compressed fields were stored as a BLOB (older rows keep them as base64 text)
+        if "blobs" not in columns:
+            connection.execute("ALTER TABLE results ADD COLUMN blobs BLOB")
+        # ... and before clusters were split by assertion label (older clusters keep label NULL)
+        if "label" not in {row[1] for row in connection.execute("PRAGMA table_info(clusters)")}:
+            connection.execute("ALTER TABLE clusters ADD COLUMN label TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False, cached_statements=64,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps the database consistent after a crash with NORMAL; only the last commits may be lost
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    @staticmethod
+    def _original(record: dict) -> int:
+        if not _is_original(record):
+            return 0
+        return 1 if _is_degraded(record) else 2
+
+    def insert(self, records: List[dict]) -> None:
+        rows = []
+        for record in records:
+            document, blobs = _split_blobs(record, self.blob_fields)
+            rows.append((
+                record["id"], record["created_at"], record.get("fingerprint"), self._original(record),
+                record.get("cluster_id"), json.dumps(document), blobs,
+            ))
+        # One transaction for the whole batch
+        with self._connection() as connection:
+            connection.executemany(self._INSERT, rows)
+
+    @staticmethod
+    def _load(data: str, blobs: Optional[bytes] = None) -> dict:
+        record = json.loads(data)
+        return _join_blobs(record, record.pop("_blobs", None), blobs)
+
+    def _one(self, sql: str, parameters: tuple) -> Optional[dict]:
+        row = self._connection().execute(sql, parameters).fetchone()
+        return self._load(*row) if row else None
+
+    def get(self, result_id: str) -> Optional[dict]:
+        return self._one(self._GET, (result_id,))
+
+    def find_original(self, fingerprint: str) -> Optional[dict]:
+        return self._one(self._FIND_ORIGINAL, (fingerprint,))
+
+    def _select(self, columns: str, parameters: tuple, limit: Optional[int], since, until, after) -> list:
+        # "~" sorts after every ISO timestamp
+        created_at, seq = after or ("~", 0)
+        bounds = (since or "", until or "~", created_at, created_at, seq, -1 if limit is None else limit)
+        return self._connection().execute(self._NEWEST.format(columns=columns), parameters + bounds).fetchall()
+
+    def newest(self, limit: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None) -> List[dict]:
+        rows = self._select("data, blobs", (), limit, since, until, None)
+        return [self._load(row[2], row[3]) for row in rows]
+
+    def page(
+        self,
+        limit: Optional[int],
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        after: Optional[list] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[list]]:
+        """
+        See MemoryBackend.page. With `fields`, only those are extracted from
+        the stored JSON, inside SQLite, and the blobs column is only read when
+        one of them may be stored there.
+        """
+        fetch = None if limit is None else limit + 1
+        if fields is None:
+            rows = self._select("data, blobs", (), fetch, since, until, after)
+            records = [self._load(row[2], row[3]) for row in rows[:limit]]
+        else:
+            # With two or more paths json_extract returns a JSON array of the values
+            paths = tuple(f"$.{field}" for field in fields) + ("$.id",)
+            columns = "json_extract(data, " + ", ".join(["?"] * len(paths)) + ")"
+            with_blobs = any(field in self.blob_fields for field in fields)
+            if with_blobs:
+                columns += ", json_extract(data, '$._blobs'), blobs"
+            rows = self._select(columns, paths, fetch, since, until, after)
+            records = [dict(zip(fields, json.loads(row[2]))) for row in rows[:limit]]
+            if with_blobs:
+                for record, row in zip(records, rows):
+                    _join_blobs(record, json.loads(row[3]) if row[3] else None, row[4], fields)
+        more = limit is not None and len(rows) > limit
+        next_position = [rows[limit - 1][1], rows[limit - 1][0]] if more else None
+        return records, next_position
+
+    def delete(self, result_id: str) -> Optional[dict]:
+        with self._connection() as connection:
+            row = connection.execute(self._GET, (result_id,)).fetchone()
+            if row:
+                connection.execute(self._DELETE, (result_id,))
+        return self._load(*row) if row else None
+
+    def _delete_rows(self, connection: sqlite3.Connection, sql: str, parameters: tuple) -> List[dict]:
+        rows = connection.execute(sql, parameters).fetchall()
+        connection.executemany(self._DELETE_SEQ, [(row[0],) for row in rows])
+        return [{"id": row[1], "cluster_id": row[2]} for row in rows]
+
+    @staticmethod
+    def _used_bytes(connection: sqlite3.Connection) -> int:
+        # Pages in use; deleted rows go to the freelist and are reused before the file grows
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def evict(self, max_count: int, max_bytes: int, expire_before: Optional[str]) -> List[Tuple[str, dict]]:
+        """
+        See MemoryBackend.evict. Other workers' reads are not visible here, so
+        the count and size limits drop the oldest results rather than the least
+        recently used; evicted records only carry their id and cluster_id.
+        """
+        evicted = []
+        with self._connection() as connection:
+            if expire_before is not None:
+                evicted += [("ttl", record) for record in self._delete_rows(connection, self._EXPIRED, (expire_before,))]
+            excess = connection.execute(self._COUNT).fetchone()[0] - max_count if max_count else 0
+            if excess > 0:
+                evicted += [("count", record) for record in self._delete_rows(connection, self._OLDEST, (excess,))]
+            while max_bytes and self._used_bytes(connection) > max_bytes:
+                records = self._delete_rows(connection, self._OLDEST, (self._EVICT_BATCH,))
+                if not records:
+                    break
+                evicted += [("bytes", record) for record in records]
+        return evicted
+
+    def usage(self) -> Tuple[int, int]:
+        """
+        (stored results, bytes of the database pages in use)
+        """
+        connection = self._connection()
+        return connection.execute(self._COUNT).fetchone()[0], self._used_bytes(connection)
+
+    def count(self, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        if since is None and until is None:
+            return self._connection().execute(self._COUNT).fetchone()[0]
+        return self._connection().execute(self._COUNT_RANGE, (since or "", until or "~")).fetchone()[0]
+
+    def save_cluster(self, cluster: dict) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                self._INSERT_CLUSTER,
+                (
+                    cluster["cluster_id"], cluster["created_at"],
+                    json.dumps(list(cluster["signature"])), cluster.get("label"),
+                ),
+            )
+
+    def load_clusters(self, after: int) -> Tuple[List[dict], int]:
+        """
+        See MemoryBackend.load_clusters; positions are rows of the clusters table.
+        """
+        rows = self._connection().execute(self._NEW_CLUSTERS, (after,)).fetchall()
+        clusters = [
+            {"cluster_id": row[1], "created_at": row[2], "signature": json.loads(row[3]), "label": row[4]}
+            for row in rows
+        ]
+        return clusters, rows[-1][0] if rows else after
+
+    def delete_cluster(self, cluster_id: str) -> None:
+        with self._connection() as connection:
+            connection.execute(self._DELETE_CLUSTER, (cluster_id, cluster_id))
+
+    def cluster_representative(self, cluster_id: str) -> Optional[str]:
+        row = self._connection().execute(self._REPRESENTATIVE, (cluster_id,)).fetchone()
+        return row[0] if row else None
+
+    def cluster_members(self) -> Dict[str, List[str]]:
+        members: Dict[str, List[str]] = {}
+        for cluster_id, result_id in self._connection().execute(self._CLUSTER_MEMBERS):
+            members.setdefault(cluster_id, []).append(result_id)
+        return members
+
+    def save_job(self, job: dict) -> None:
+        with self._connection() as connection:
+            connection.execute(self._SAVE_JOB, (job["job_id"], job["status"], job["finished_at"], json.dumps(job)))
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        return self._one(self._GET_JOB, (job_id,))
+
+    def delete_job(self, job_id: str) -> None:
+        with self._connection() as connection:
+            connection.execute(self._DELETE_JOB, (job_id,))
+
+    def evict_jobs(self, status: str, finished_before: str, max_count: int) -> int:
+        with self._connection() as connection:
+            removed = connection.execute(self._EXPIRED_JOBS, (status, finished_before)).rowcount
+            removed += connection.execute(self._EXCESS_JOBS, (status, max_count)).rowcount
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+def create_backend(
+    kind: str = TRIAGE_STORAGE_BACKEND,
+    path: str = TRIAGE_STORAGE_PATH,
+    blob_fields: Tuple[str, ...] = (),
+):
+    if kind == "sqlite":
+        return SqliteBackend(path, blob_fields)
+    if kind == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown TRIAGE_STORAGE_BACKEND {kind!r} (expected 'memory' or 'sqlite')")
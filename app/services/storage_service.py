@@ -1,27 +1,188 @@
 """
-In-memory storage service for triage results.
+Storage service for triage results.
 Results are stored with unique IDs and can be retrieved via GET endpoints.
+They are kept in memory or, with TRIAGE_STORAGE_BACKEND=sqlite, in a SQLite
+database shared by all workers (see storage_backends). Retention limits
+(count, size, age) evict results after writes and from a background sweeper.
+The backend also answers cluster membership, persists new near-duplicate
+clusters and holds the status of queued-mode jobs, so with SQLite every worker
+sees the same clusters and jobs, also after a restart.
 """
+import asyncio
+import base64
+import binascii
+import json
+import os
+import threading
 import uuid
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import List, Optional, Tuple
+from datetime import datetime, timedelta
 
+from app.services import cluster_service
+from app.services.storage_backends import create_backend
+from app.utils import compression, metrics
 
-# In-memory storage: {result_id: result_data}
-_storage: Dict[str, dict] = {}
 
+# Retention limits, 0 = unlimited
+MAX_RESULTS = int(os.getenv("TRIAGE_MAX_RESULTS", "0"))
+MAX_STORAGE_BYTES = int(float(os.getenv("TRIAGE_MAX_STORAGE_MB", "0")) * 1024 * 1024)
+RESULT_TTL = float(os.getenv("TRIAGE_RESULT_TTL", "0"))  # seconds
+RETENTION_SWEEP_SECONDS = float(os.getenv("TRIAGE_RETENTION_SWEEP_SECONDS", "60"))
+RETENTION_ENABLED = bool(MAX_RESULTS or MAX_STORAGE_BYTES or RESULT_TTL)
 
-def store_result(result: dict) -> str:
+# Fields making up nearly all of a record's size, stored compressed
+COMPRESSED_FIELDS = ("raw_failure_text", "stack_trace", "description")
+
+_backend = create_backend(blob_fields=COMPRESSED_FIELDS)
+_codec = compression.load_codec()
+
+metrics.STORAGE_USAGE.set_function(lambda: _backend.usage()[0], resource="results")
+metrics.STORAGE_USAGE.set_function(lambda: _backend.usage()[1], resource="bytes")
+metrics.STORAGE_LIMIT.set(MAX_RESULTS, resource="results")
+metrics.STORAGE_LIMIT.set(MAX_STORAGE_BYTES, resource="bytes")
+metrics.STORAGE_LIMIT.set(RESULT_TTL, resource="ttl_seconds")
+metrics.COMPRESSION_RATIO.set_function(
+    lambda: metrics.STORED_TEXT_BYTES.get(state="raw") / (metrics.STORED_TEXT_BYTES.get(state="stored") or 1)
+)
+
+
+# Position of the last cluster loaded from the backend
+_cluster_position = 0
+_cluster_lock = threading.Lock()
+
+
+def _sync_clusters() -> None:
+    """
+    Load the clusters other workers (or earlier runs) have created since the last call.
+    """
+    global _cluster_position
+    with _cluster_lock:
+        clusters, _cluster_position = _backend.load_clusters(_cluster_position)
+    if clusters:
+        cluster_service.load_clusters(clusters)
+
+
+def _drop_empty_clusters(cluster_ids) -> None:
+    # Clusters whose last stored member was just deleted
+    for cluster_id in set(cluster_ids):
+        if cluster_id and _backend.cluster_representative(cluster_id) is None:
+            cluster_service.remove_cluster(cluster_id)
+            _backend.delete_cluster(cluster_id)
+
+
+def _pack(record: dict) -> dict:
+    """
+    The record as stored: stack_trace as a span of raw_failure_text, and the
+    large text fields compressed, listed in `_compressed`.
+    """
+    packed = dict(record)
+    # stack_trace is a slice of raw_failure_text: store its position instead of a second copy
+    stack_trace, raw_failure_text = record.get("stack_trace"), record.get("raw_failure_text")
+    start = raw_failure_text.find(stack_trace) if stack_trace and raw_failure_text else -1
+    if start >= 0:
+        packed.update(stack_trace=None, _stack_trace_span=[start, start + len(stack_trace)])
+
+    raw_bytes = stored_bytes = 0
+    compressed = []
+    for field in COMPRESSED_FIELDS:
+        value = packed.get(field)
+        if not isinstance(value, str):
+            continue
+        size = len(value.encode("utf-8"))
+        raw_bytes += size
+        if _codec is not None and size >= compression.COMPRESSION_MIN_BYTES:
+            data = _codec.compress(value)
+            if len(data) < size:
+                packed[field] = data
+                compressed.append(field)
+                size = len(data)
+        stored_bytes += size
+    if compressed:
+        packed["_compressed"] = {"codec": _codec.name, "dict": _codec.dict_id, "fields": compressed}
+    metrics.STORED_TEXT_BYTES.inc(raw_bytes, state="raw")
+    metrics.STORED_TEXT_BYTES.inc(stored_bytes, state="stored")
+    return packed
+
+
+def _unpack(record: Optional[dict]) -> Optional[dict]:
+    """
+    Undo _pack for the fields present in `record` (which may be projected).
+    """
+    if record is None or ("_compressed" not in record and "_stack_trace_span" not in record):
+        return record
+    unpacked = dict(record)
+    marker = unpacked.pop("_compressed", None)
+    if marker:
+        codec = compression.get_codec(marker["codec"], marker["dict"])
+        for field in marker["fields"]:
+            value = unpacked.get(field)
+            if value is not None:
+                # Base64 text in SQLite rows written before the blobs column
+                unpacked[field] = codec.decompress(base64.b64decode(value) if isinstance(value, str) else value)
+    span = unpacked.pop("_stack_trace_span", None)
+    if span and unpacked.get("raw_failure_text") is not None:
+        unpacked["stack_trace"] = unpacked["raw_failure_text"][span[0]:span[1]]
+    return unpacked
+
+
+def _stored_fields(fields: List[str]) -> List[str]:
+    # The stored fields needed to unpack `fields`
+    extra = []
+    if "stack_trace" in fields:
+        extra += ["raw_failure_text", "_stack_trace_span"]
+    if any(field in COMPRESSED_FIELDS for field in fields + extra):
+        extra.append("_compressed")
+    return fields + [field for field in dict.fromkeys(extra) if field not in fields]
+
+
+def _project(record: Optional[dict], fields: Optional[List[str]]) -> Optional[dict]:
     """
-    Store a triage result and return its unique ID.
+    Only `fields` of a stored record, unpacked; the other fields are never decompressed.
+    """
+    if record is None or fields is None:
+        return _unpack(record)
+    stored = _unpack({field: record.get(field) for field in _stored_fields(fields) if field in record})
+    return {field: stored.get(field) for field in fields}
+
+
+def _expire_before() -> Optional[str]:
+    if not RESULT_TTL:
+        return None
+    return (datetime.now() - timedelta(seconds=RESULT_TTL)).isoformat()
+
+
+def _live_since(since: Optional[str]) -> Optional[str]:
+    # Lower time bound for listing reads, so expired results are skipped before they are swept
+    cutoff = _expire_before()
+    if cutoff is None or (since is not None and since > cutoff):
+        return since
+    return cutoff
+
+
+def _expired(record: Optional[dict]) -> bool:
+    cutoff = _expire_before()
+    return record is not None and cutoff is not None and record["created_at"] < cutoff
+
+
+def _after_write() -> None:
+    if RETENTION_ENABLED and _backend.evict_on_write:
+        sweep()
+
+
+@metrics.timed(metrics.STORAGE_SECONDS, operation="store")
+def store_result(result: dict, result_id: Optional[str] = None) -> str:
+    """
+    Store a triage result and return its unique ID. The result's created_at is
+    set to the stored creation time.
     
     Args:
         result: The triage result dictionary to store
+        result_id: Optional ID to store the result under (e.g. a queued job's ID)
         
     Returns:
         The unique ID (UUID) assigned to this result
     """
-    result_id = str(uuid.uuid4())
+    result_id = result_id or str(uuid.uuid4())
     
     # Add metadata
     result_with_metadata = {
@@ -30,36 +191,139 @@ def store_result(result: dict) -> str:
         "created_at": datetime.now().isoformat()
     }
     
-    _storage[result_id] = result_with_metadata
+    _backend.insert([_pack(result_with_metadata)])
+    metrics.RESULTS_STORED.inc()
+    _after_write()
+    result["created_at"] = result_with_metadata["created_at"]
     return result_id
 
 
-def get_result(result_id: str) -> Optional[dict]:
+@metrics.timed(metrics.STORAGE_SECONDS, operation="store_many")
+def store_results(results: List[dict]) -> List[str]:
+    """
+    Store several triage results in one pass; like store_result, each result's
+    created_at is set to its stored creation time.
+    
+    Args:
+        results: The triage result dictionaries to store
+        
+    Returns:
+        The unique IDs assigned to the results, in the same order
+    """
+    records = [
+        {
+            **result,
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now().isoformat()
+        }
+        for result in results
+    ]
+    
+    _backend.insert([_pack(record) for record in records])
+    metrics.RESULTS_STORED.inc(len(records))
+    _after_write()
+    for result, record in zip(results, records):
+        result["created_at"] = record["created_at"]
+    return [record["id"] for record in records]
+
+
+@metrics.timed(metrics.STORAGE_SECONDS, operation="get")
+def get_result(result_id: str, fields: Optional[List[str]] = None) -> Optional[dict]:
     """
     Retrieve a specific triage result by ID.
     
     Args:
         result_id: The unique ID of the result to retrieve
+        fields: Only return (and decompress) these fields (None for all)
         
     Returns:
-        The result dictionary if found, None otherwise
+        The result dictionary if found (and not expired), None otherwise
     """
-    return _storage.get(result_id)
+    record = _backend.get(result_id)
+    return None if _expired(record) else _project(record, fields)
 
 
-def get_all_results() -> List[dict]:
+@metrics.timed(metrics.STORAGE_SECONDS, operation="find_by_fingerprint")
+def find_by_fingerprint(fingerprint: str, fields: Optional[List[str]] = None) -> Optional[dict]:
     """
-    Retrieve all stored triage results.
+    Retrieve the original stored result with the given failure fingerprint.
     
+    Args:
+        fingerprint: Signature computed by fingerprint_service.compute_fingerprint
+        fields: Only return (and decompress) these fields (None for all)
+        
+    Returns:
+        The original result dictionary if found, None otherwise
+    """
+    record = _backend.find_original(fingerprint)
+    return None if _expired(record) else _project(record, fields)
+
+
+@metrics.timed(metrics.STORAGE_SECONDS, operation="list")
+def get_all_results(
+    limit: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> List[dict]:
+    """
+    Retrieve stored triage results from the time index, without scanning the whole store.
+    
+    Args:
+        limit: Return at most this many (the newest ones)
+        since: Only results created at or after this ISO timestamp
+        until: Only results created before this ISO timestamp
+        
     Returns:
-        List of all stored results, sorted by creation time (newest first)
+        List of the stored results, sorted by creation time (newest first)
     """
-    results = list(_storage.values())
-    # Sort by created_at timestamp, newest first
-    results.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return results
+    return [_unpack(record) for record in _backend.newest(limit, _live_since(since), until)]
+
+
+def _encode_cursor(position: Optional[list]) -> Optional[str]:
+    if position is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
 
 
+def _decode_cursor(cursor: str) -> list:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if not isinstance(position, list) or len(position) != 2:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return position
+
+
+@metrics.timed(metrics.STORAGE_SECONDS, operation="page")
+def get_results_page(
+    limit: Optional[int],
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Retrieve one page of stored triage results, newest first.
+    
+    Args:
+        limit: Maximum number of results on the page (None for all)
+        cursor: next_cursor of the previous page (None for the first page)
+        since: Only results created at or after this ISO timestamp
+        until: Only results created before this ISO timestamp
+        fields: Only return these fields of each result (None for all)
+        
+    Returns:
+        The results and the cursor of the next page (None on the last page).
+        Raises ValueError for a malformed cursor.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    stored_fields = _stored_fields(fields) if fields is not None else None
+    results, next_position = _backend.page(limit, _live_since(since), until, after, stored_fields)
+    return [_project(record, fields) for record in results], _encode_cursor(next_position)
+
+
+@metrics.timed(metrics.STORAGE_SECONDS, operation="latest")
 def get_latest_result() -> Optional[dict]:
     """
     Retrieve the most recently created triage result.
@@ -67,11 +331,11 @@ def get_latest_result() -> Optional[dict]:
     Returns:
         The latest result dictionary if any exist, None otherwise
     """
-    results = get_all_results()
-    return results[0] if results else None
-
+    results = _backend.newest(1, _live_since(None))
+    return _unpack(results[0]) if results else None
 
 
+@metrics.timed(metrics.STORAGE_SECONDS, operation="delete")
 def delete_result(result_id: str) -> bool:
     """
     Delete a specific triage result by ID.
@@ -82,17 +346,134 @@ def delete_result(result_id: str) -> bool:
     Returns:
         True if deleted, False if not found
     """
-    if result_id in _storage:
-        del _storage[result_id]
-        return True
-    return False
+    record = _backend.delete(result_id)
+    if record is None:
+        return False
+    _drop_empty_clusters([record.get("cluster_id")])
+    return True
+
+
+def sweep() -> int:
+    """
+    Evict expired results, then results over the count and size limits.
+    
+    Returns:
+        Number of evicted results
+    """
+    evicted = _backend.evict(MAX_RESULTS, MAX_STORAGE_BYTES, _expire_before())
+    for reason, record in evicted:
+        metrics.EVICTIONS.inc(reason=reason)
+    _drop_empty_clusters(record.get("cluster_id") for _, record in evicted)
+    return len(evicted)
+
+
+async def run_sweeper() -> None:
+    """
+    Run sweep() every RETENTION_SWEEP_SECONDS until cancelled.
+    """
+    while True:
+        await asyncio.sleep(RETENTION_SWEEP_SECONDS)
+        try:
+            evicted = await asyncio.to_thread(sweep)
+        except Exception as e:
+            # Keep sweeping; a locked database or similar is retried next round
+            print(f"Retention sweep failed: {e}")
+            continue
+        if evicted:
+            print(f"Retention sweep evicted {evicted} results")
+
+
+def assign_cluster(text: str) -> Optional[str]:
+    """
+    Assign a failure's error message to its near-duplicate cluster.
+    Clusters created by other workers are loaded first, and a new cluster is
+    saved to the backend. Two workers creating a cluster for similar messages
+    at the same moment may still end up with two clusters.
+    
+    Returns:
+        The cluster ID, None for an error message without words
+    """
+    _sync_clusters()
+    return cluster_service.assign_cluster(text, on_create=_backend.save_cluster)
+
+
+def get_cluster_representative_id(cluster_id: str) -> Optional[str]:
+    """
+    ID of the first stored member of a cluster, None if it has no stored members yet.
+    """
+    return _backend.cluster_representative(cluster_id)
+
+
+def list_clusters() -> List[dict]:
+    """
+    Clusters with at least one stored member, largest first.
+    
+    Returns:
+        List of {"cluster_id", "size", "representative_id", "member_ids", "created_at"}
+    """
+    _sync_clusters()
+    clusters = [
+        {
+            "cluster_id": cluster_id,
+            "size": len(member_ids),
+            "representative_id": member_ids[0],
+            "member_ids": member_ids,
+            "created_at": cluster_service.get_created_at(cluster_id),
+        }
+        for cluster_id, member_ids in _backend.cluster_members().items()
+    ]
+    clusters.sort(key=lambda c: c["size"], reverse=True)
+    return clusters
 
 
-def get_result_count() -> int:
+def save_job(job: dict) -> None:
+    """
+    Store (or update) the status record of a queued-mode job.
     """
-    Get the total number of stored results.
+    _backend.save_job(job)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Retrieve the status record of a queued-mode job, None if unknown.
+    """
+    return _backend.get_job(job_id)
+
+
+def delete_job(job_id: str) -> None:
+    """
+    Forget a job (its stored result is the source of truth once it completed).
+    """
+    _backend.delete_job(job_id)
+
+
+def evict_jobs(status: str, finished_before: str, max_count: int) -> int:
+    """
+    Remove jobs with `status` that finished before `finished_before`, then the
+    oldest ones over `max_count`.
+    
+    Returns:
+        Number of removed jobs
+    """
+    return _backend.evict_jobs(status, finished_before, max_count)
+
+
+def get_result_count(since: Optional[str] = None, until: Optional[str] = None) -> int:
+    """
+    Get the total number of stored (unexpired) results, optionally only those created in [since, until).
     
+    Args:
+        since: Only count results created at or after this ISO timestamp
+        until: Only count results created before this ISO timestamp
+        
     Returns:
         Count of stored results
     """
-    return len(_storage)
+    return _backend.count(_live_since(since), until)
+
+
+def close() -> None:
+    """
+    Release the backend's resources (database connections) at shutdown.
+    """
+    _backend.close()
@@ -1,12 +1,43 @@
-from typing import Any, Dict, Optional, List, Tuple
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
+import asyncio
 import os
+import time
 
-from app.services.ollama_service import generate_bug_report
-from app.services.playwright_label_detector import detect_playwright_label
+from app.services.ollama_service import (
+    generate_bug_report_async,
+    generate_bug_title,
+    stream_bug_description,
+)
+from app.services.playwright_label_detector import (
+    TIER_FALLBACK,
+    classify_playwright_label_async,
+)
+from app.services.fingerprint_service import compute_fingerprint
+from app.services import storage_service
+from app.services.resilience import Deadline
 from app.schemas import FailureInput
+from app.utils import keyword_rules, metrics
+from app.utils.prompt_compactor import compact_failure_text
+from app.utils.text_utils import clean_text
+from app.utils.failure_extractor import extract_error_line, extract_error_file_path
 from app.utils.url_utils import format_file_url_with_line, extract_test_url_from_logs
 
 
+# Upper bound on failures processed at the same time by a single batch request
+BATCH_MAX_CONCURRENCY = int(os.getenv("TRIAGE_BATCH_CONCURRENCY", "8"))
+
+# Reuse title/description/label of an already stored failure with the same fingerprint
+DEDUP_ENABLED = os.getenv("TRIAGE_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Reuse the LLM description of the representative of a near-duplicate cluster
+CLUSTER_REUSE_ENABLED = os.getenv("TRIAGE_CLUSTER_REUSE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Fields of a stored original / cluster representative that are reused; the
+# large raw_failure_text and stack_trace are never decompressed for them
+REUSED_FIELDS = [
+    "id", "title", "description", "triage_label", "label_tier", "label_confidence", "fallbacks", "cluster_id",
+]
+
 
 
 
@@ -23,76 +54,8 @@ def _rule_based_category(failure_text: str) -> str:
     Returns one of: 'frontend_ui', 'backend_api', 'database',
     'performance', 'infrastructure', 'authentication', 'unknown'
     """
-    em = _extract_error_message(failure_text).lower()
-    full = failure_text.lower()
-
-    # Frontend / UI (Selenium, Playwright, React UI)
-    if (
-        "noselementexception" in em
-        or "unable to locate element" in em
-        or "selenium" in full
-        or "playwright" in full
-        or ("button" in full and "click" in full)
-        or "#edit-" in full
-        or "component" in full and ("render" in full or "props" in full)
-        or "cannot read properties of undefined" in em
-        or "cannot read property" in em
-    ):
-        return "frontend_ui"
-
-    # Database
-    if (
-        "psycopg2" in em
-        or "sql" in em
-        or "database" in em
-        or "connection timed out" in em
-        or ("timeout" in em and "query" in full)
-        or "deadlock" in full
-    ):
-        return "database"
-
-    # Authentication / auth
-    if (
-        "unauthorized" in em
-        or "forbidden" in em
-        or "authentication" in full
-        or "jwt" in full
-        or "token expired" in full
-    ):
-        return "authentication"
-
-    # Performance / timeout
-    if (
-        "timeout" in em
-        or "took too long" in full
-        or "slow response" in full
-        or "latency" in full
-    ):
-        return "performance"
-
-    # Backend / API
-    if (
-        "internal server error" in em
-        or "status code 500" in em
-        or "status code 5" in em
-        or "500" in em
-        or "api" in full
-        or "endpoint" in full
-        or "response code" in full
-    ):
-        return "backend_api"
-
-    # Infrastructure / network
-    if (
-        "connection refused" in em
-        or "host unreachable" in em
-        or "dns" in full
-        or "gateway" in full
-        or "service unavailable" in em
-    ):
-        return "infrastructure"
-
-    return "unknown"
+    em = _extract_error_message(failure_text)
+    return keyword_rules.classify(message=em, failure_text=failure_text).category or "unknown"
 
 
 def _map_category_to_labels(category: str, labels: Optional[List[str]]) -> str:
@@ -129,21 +92,9 @@ def _map_category_to_labels(category: str, labels: Optional[List[str]]) -> str:
     # fallback: just return the first candidate
     return labels[0]
 
-import re
-
-def clean_text(text: str) -> str:
-    if not text:
-        return ""
-    text = text.lower()
-    text = re.sub(r"\d+", "<NUM>", text)
-    text = re.sub(r"[^a-z0-9 <>\n]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
 
-
-def process_failure(payload: FailureInput) -> Dict[str, Any]:
-    failure_text = f"""
+def _build_failure_text(payload: FailureInput) -> str:
+    return f"""
 Test Name: {payload.test_name}
 File Path: {payload.file_path}
 Error Message: {payload.error_message}
@@ -151,144 +102,30 @@ Stack Trace: {payload.stack_trace}
 Logs: {payload.logs}
 """.strip()
 
-    # 1) Bug report via Ollama
-    try:
-        bug = generate_bug_report(payload.llm_model, failure_text)
-    except Exception as e:
-        bug = {
-            "title": "Bug Generation Error",
-            "description": f"Bug generator crashed: {str(e)}",
-        }
-
-    # 2) Extract extra structured fields INLINE
-    import os
-    import re
-    
-    # Extract error_line_number from stack trace using regex with FALLBACK logic
-    error_line_number = None
-    
-    # Try extracting from stack trace first
-    if payload.stack_trace:
-        # Try patterns: "line XXX", ":XXX:", ":XXX)", "at file.py:XXX"
-        line_match = re.search(r'line\s+(\d+)', payload.stack_trace, re.IGNORECASE)
-        if not line_match:
-            # Look for file.py:123 pattern (more specific)
-            line_match = re.search(r'\.(py|js|ts|jsx|tsx):(\d+)', payload.stack_trace)
-            if line_match:
-                error_line_number = int(line_match.group(2))
-        if not line_match:
-            line_match = re.search(r':(\d+)\)', payload.stack_trace)
-        if not line_match:
-            line_match = re.search(r'at\s+[^\s]+:(\d+)', payload.stack_trace)
-        if line_match and error_line_number is None:
-            error_line_number = int(line_match.group(1))
-    
-    # FALLBACK 1: Try extracting from error_message if stack trace didn't work
-    if error_line_number is None and payload.error_message:
-        line_match = re.search(r'line\s+(\d+)', payload.error_message, re.IGNORECASE)
-        if not line_match:
-            # Look for file.py:123 pattern
-            line_match = re.search(r'\.(py|js|ts|jsx|tsx):(\d+)', payload.error_message)
-            if line_match:
-                error_line_number = int(line_match.group(2))
-        if not line_match:
-            line_match = re.search(r':(\d+)\)', payload.error_message)
-        if line_match and error_line_number is None:
-            error_line_number = int(line_match.group(1))
-    
-    # FALLBACK 2: Try extracting from logs if still not found (but avoid timestamps)
-    if error_line_number is None and payload.logs:
-        # Only look for "line XXX" pattern in logs to avoid timestamp confusion
-        line_match = re.search(r'line\s+(\d+)', payload.logs, re.IGNORECASE)
-        if line_match:
-            error_line_number = int(line_match.group(1))
-    
-    # Validate extracted line number (should be reasonable, not from timestamp)
-    if error_line_number is not None and error_line_number > 10000:
-        error_line_number = None  # Likely a false positive
-    
-    # FALLBACK 3: Default to line 1 if still not found (ALWAYS populate)
-    if error_line_number is None:
-        error_line_number = 1
-    
-    # Extract error_file_path from stack trace with FALLBACK logic
-    error_file_path = None
-    
-    # Try extracting from stack trace first
-    if payload.stack_trace:
-        # PRIORITY 1: Look for test files specifically (test_*.py, *_test.py, *.spec.js, *.test.js)
-        test_file_match = re.search(r'(test_[^\s]+\.(?:py|js|ts)|[^\s]+_test\.(?:py|js|ts)|[^\s]+\.spec\.(?:js|ts)|[^\s]+\.test\.(?:js|ts))', payload.stack_trace, re.IGNORECASE)
-        if test_file_match:
-            error_file_path = test_file_match.group(1)
-        
-        # PRIORITY 2: Look for File "path" pattern
-        if not error_file_path:
-            file_match = re.search(r'File\s+"([^"]+)"', payload.stack_trace)
-            if file_match:
-                error_file_path = file_match.group(1)
-        
-        # PRIORITY 3: Look for "at file.py:line" pattern
-        if not error_file_path:
-            file_match = re.search(r'at\s+([^\s:]+\.(?:py|js|ts|spec\.js|spec\.ts))', payload.stack_trace)
-            if file_match:
-                error_file_path = file_match.group(1)
-        
-        # PRIORITY 4: Generic file pattern (but avoid __init__.py)
-        if not error_file_path:
-            # Find all matching files
-            all_files = re.findall(r'([^\s]+\.(?:py|js|ts|jsx|tsx|spec\.js|spec\.ts))', payload.stack_trace)
-            # Filter out __init__.py and prioritize test files
-            for file in all_files:
-                if '__init__.py' not in file:
-                    error_file_path = file
-                    break
-    
-    # FALLBACK 1: Try extracting from error_message if stack trace didn't work
-    if not error_file_path and payload.error_message:
-        # Look for test files first
-        test_file_match = re.search(r'(test_[^\s]+\.(?:py|js|ts)|[^\s]+_test\.(?:py|js|ts)|[^\s]+\.spec\.(?:js|ts))', payload.error_message, re.IGNORECASE)
-        if test_file_match:
-            error_file_path = test_file_match.group(1)
-        
-        if not error_file_path:
-            file_match = re.search(r'File\s+"([^"]+)"', payload.error_message)
-            if not file_match:
-                file_match = re.search(r'([^\s]+\.(?:py|js|ts|jsx|tsx|spec\.js|spec\.ts))', payload.error_message)
-            if file_match:
-                error_file_path = file_match.group(1)
-    
-    # FALLBACK 2: Try extracting from logs if still not found
-    if not error_file_path and payload.logs:
-        # Look for test files first
-        test_file_match = re.search(r'(test_[^\s]+\.(?:py|js|ts)|[^\s]+_test\.(?:py|js|ts)|[^\s]+\.spec\.(?:js|ts))', payload.logs, re.IGNORECASE)
-        if test_file_match:
-            error_file_path = test_file_match.group(1)
-        
-        if not error_file_path:
-            file_match = re.search(r'File\s+"([^"]+)"', payload.logs)
-            if not file_match:
-                file_match = re.search(r'([^\s]+\.(?:py|js|ts|jsx|tsx|spec\.js|spec\.ts))', payload.logs)
-            if file_match:
-                error_file_path = file_match.group(1)
-    
-    # FALLBACK 3: Use file_path from payload if still not found
-    if not error_file_path and payload.file_path:
-        error_file_path = payload.file_path
-    
-    # FALLBACK 4: Use test_name as file path if everything else failed (ALWAYS populate)
-    if not error_file_path:
-        if payload.test_name:
-            error_file_path = f"{payload.test_name}.unknown"
-        else:
-            error_file_path = "unknown_test_file"
-    
-    # Truncate stack_trace to max 3000 characters
-    stack_trace_truncated = payload.stack_trace[:3000] if payload.stack_trace else None
-    
-    # Extract bug title and description for return
-    bug_title = bug.get("title", "No title")
-    bug_description = bug.get("description", "No description")
-    
+
+def _extract_error_location(payload: FailureInput) -> Tuple[int, str]:
+    """
+    Extract (error_line_number, error_file_path) from the stack trace,
+    falling back to error message, logs and finally the payload itself.
+    """
+    error_line_number = extract_error_line(payload.stack_trace, payload.error_message, payload.logs)
+    error_file_path = extract_error_file_path(
+        payload.stack_trace,
+        payload.error_message,
+        payload.logs,
+        payload.file_path,
+        payload.test_name,
+    )
+    return error_line_number, error_file_path
+
+
+@metrics.timed(metrics.EXTRACTION_SECONDS)
+def _extract_structured_fields(payload: FailureInput) -> Dict[str, Any]:
+    """
+    CPU-only extraction stage: error location, clickable script URL and test URL.
+    """
+    error_line_number, error_file_path = _extract_error_location(payload)
+
     # Convert file path to clickable URL with line number anchor
     # Use playwright_script_url from payload if provided, otherwise auto-generate
     if payload.playwright_script_url:
@@ -307,27 +144,324 @@ Logs: {payload.logs}
     # Priority 3: Extract from error message as fallback
     elif payload.error_message:
         test_url = extract_test_url_from_logs(payload.error_message)
-        
-    cleaned_failure_text = clean_text(failure_text)
-    
-    # Generate intelligent triage label using BERT classification
-    triage_label = detect_playwright_label(
-        error_message=payload.error_message,
-        stack_trace=payload.stack_trace,
-        failure_text=cleaned_failure_text,
-        bert_url=payload.bert_url
-    )
 
     return {
-        "title": bug_title,
-        "description": bug_description,
-        "raw_failure_text": failure_text,
-        "stack_trace": stack_trace_truncated,
-        "status": "failed",
         "error_line": error_line_number,
         "playwright_script": playwright_script_url,
         "test_url": test_url,
+    }
+
+
+def _build_triage_result(
+    payload: FailureInput,
+    failure_text: str,
+    bug: Dict[str, str],
+    fields: Dict[str, Any],
+    label: Dict[str, Any],
+    stage_timings: Optional[Dict[str, float]] = None,
+    fingerprint: Optional[str] = None,
+    duplicate_of: Optional[str] = None,
+    cluster_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    # Truncate stack_trace to max 3000 characters
+    stack_trace_truncated = payload.stack_trace[:3000] if payload.stack_trace else None
+
+    # Stages that fell back to heuristics, so the result can be re-triaged later
+    fallbacks = []
+    if bug.get("degraded"):
+        fallbacks.append("llm")
+    if label["tier"] == TIER_FALLBACK and payload.bert_url:
+        fallbacks.append("label")
+
+    return {
+        "title": bug.get("title", "No title"),
+        "description": bug.get("description", "No description"),
+        "raw_failure_text": failure_text,
+        "stack_trace": stack_trace_truncated,
+        "status": "failed",
+        "error_line": fields["error_line"],
+        "playwright_script": fields["playwright_script"],
+        "test_url": fields["test_url"],
         "playwright_script_endpoint": payload.playwright_script_endpoint,
-        "triage_label": triage_label,
+        "triage_label": label["label"],
+        "label_tier": label["tier"],
+        "label_confidence": label["confidence"],
+        "stage_timings": stage_timings,
+        "fingerprint": fingerprint,
+        "duplicate_of": duplicate_of,
+        "cluster_id": cluster_id,
+        "prompt_tokens_saved": bug.get("prompt_tokens_saved"),
+        "degraded": bool(fallbacks),
+        "fallbacks": fallbacks,
+    }
+
+
+def _record_stage(timings: Dict[str, float], stage: str, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    timings[stage] = round(elapsed * 1000, 2)
+    metrics.STAGE_SECONDS.observe(elapsed, stage=stage)
+
+
+def _has_llm_description(result: dict) -> bool:
+    description = result.get("description") or ""
+    if "llm" in (result.get("fallbacks") or []):
+        return False
+    return result.get("title") != "Bug Generation Error" and not description.startswith("Bug description generation failed")
+
+
+def _fingerprint_stage(payload: FailureInput, timings: Dict[str, float]) -> Tuple[str, Optional[dict]]:
+    """
+    Fingerprint the failure and look up an already stored result with the same
+    signature; one whose LLM stage fell back is not returned.
+    """
+    stage_start = time.perf_counter()
+    fingerprint = compute_fingerprint(payload)
+    original = storage_service.find_by_fingerprint(fingerprint, REUSED_FIELDS) if DEDUP_ENABLED else None
+    if original is not None and not _has_llm_description(original):
+        # A templated fallback is not reused: triage again, now that Ollama may be back
+        original = None
+    _record_stage(timings, "fingerprint", stage_start)
+    return fingerprint, original
+
+
+def _cluster_stage(payload: FailureInput, timings: Dict[str, float]) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Assign the failure to its near-duplicate cluster and look up the cluster's
+    representative, whose LLM description is reused instead of generating a new one.
+    """
+    stage_start = time.perf_counter()
+    cluster_id = storage_service.assign_cluster(payload.error_message)
+    representative = None
+    if cluster_id and CLUSTER_REUSE_ENABLED:
+        representative_id = storage_service.get_cluster_representative_id(cluster_id)
+        representative = storage_service.get_result(representative_id, REUSED_FIELDS) if representative_id else None
+        if representative is not None and not _has_llm_description(representative):
+            representative = None
+    _record_stage(timings, "cluster", stage_start)
+    metrics.TRIAGES.inc(path="cluster_reuse" if representative is not None else "generated")
+    return cluster_id, representative
+
+
+def _reuse_cluster_bug(failure_text: str, representative: dict) -> Dict[str, str]:
+    # The heuristic title is per failure; only the LLM description is shared
+    return {"title": generate_bug_title(failure_text), "description": representative["description"]}
+
+
+def _build_duplicate_result(
+    payload: FailureInput,
+    failure_text: str,
+    fingerprint: str,
+    original: dict,
+    timings: Dict[str, float],
+    started: float,
+) -> Dict[str, Any]:
+    """
+    Repeat failure: reuse the original's title, description and label instead of
+    calling Ollama and BERT, and only run the (cheap) per-record extraction.
+    """
+    metrics.TRIAGES.inc(path="duplicate")
+    stage_start = time.perf_counter()
+    fields = _extract_structured_fields(payload)
+    _record_stage(timings, "extraction", stage_start)
+    _record_stage(timings, "total", started)
+
+    bug = {
+        "title": original.get("title"),
+        "description": original.get("description"),
+        "degraded": "llm" in (original.get("fallbacks") or []),
+    }
+    label = {
+        "label": original.get("triage_label"),
+        "tier": original.get("label_tier"),
+        "confidence": original.get("label_confidence"),
     }
+    return _build_triage_result(
+        payload, failure_text, bug, fields, label, timings,
+        fingerprint=fingerprint, duplicate_of=original["id"], cluster_id=original.get("cluster_id"),
+    )
+
+
+async def _label_stage_async(
+    payload: FailureInput,
+    failure_text: str,
+    timings: Dict[str, float],
+    deadline: Deadline,
+) -> Dict[str, Any]:
+    stage_start = time.perf_counter()
+    try:
+        return await classify_playwright_label_async(
+            error_message=payload.error_message,
+            stack_trace=payload.stack_trace,
+            failure_text=clean_text(failure_text),
+            bert_url=payload.bert_url,
+            deadline=deadline,
+        )
+    finally:
+        _record_stage(timings, "label", stage_start)
+
+
+async def _extraction_stage_async(payload: FailureInput, timings: Dict[str, float]) -> Dict[str, Any]:
+    stage_start = time.perf_counter()
+    try:
+        return await asyncio.to_thread(_extract_structured_fields, payload)
+    finally:
+        _record_stage(timings, "extraction", stage_start)
+
+
+@metrics.in_progress(metrics.IN_FLIGHT)
+async def process_failure_async(payload: FailureInput) -> Dict[str, Any]:
+    """
+    Triage a failure. The LLM description, the BERT label and the regex
+    extraction do not depend on each other, so they run concurrently and are
+    joined at the end; `stage_timings` reports how long each stage took (ms).
+    Ollama and BERT are awaited on the event loop, so slow generations do not
+    hold a worker thread each; the CPU-bound extraction runs in a worker thread.
+    Repeat failures (same fingerprint as a stored result) skip LLM and BERT;
+    near-duplicates reuse the LLM description of their cluster's representative.
+    LLM and BERT share the request's deadline (TRIAGE_DEADLINE); a stage that
+    fails, runs out of time or finds its circuit breaker open falls back to the
+    templated description / rule label and is listed in `fallbacks`.
+    """
+    started = time.perf_counter()
+    deadline = Deadline()
+    failure_text = _build_failure_text(payload)
+    timings: Dict[str, float] = {}
+
+    # Both stages read the store; keep its I/O off the event loop
+    fingerprint, original = await asyncio.to_thread(_fingerprint_stage, payload, timings)
+    if original is not None:
+        return _build_duplicate_result(payload, failure_text, fingerprint, original, timings, started)
+    cluster_id, representative = await asyncio.to_thread(_cluster_stage, payload, timings)
+
+    async def _bug_stage() -> Dict[str, str]:
+        if representative is not None:
+            return _reuse_cluster_bug(failure_text, representative)
+        stage_start = time.perf_counter()
+        try:
+            return await generate_bug_report_async(payload.llm_model, failure_text, deadline)
+        except Exception as e:
+            return {
+                "title": "Bug Generation Error",
+                "description": f"Bug generator crashed: {str(e)}",
+                "degraded": True,
+            }
+        finally:
+            _record_stage(timings, "llm", stage_start)
+
+    bug, label, fields = await asyncio.gather(
+        _bug_stage(),
+        _label_stage_async(payload, failure_text, timings, deadline),
+        _extraction_stage_async(payload, timings),
+    )
+    _record_stage(timings, "total", started)
+
+    return _build_triage_result(
+        payload, failure_text, bug, fields, label, timings,
+        fingerprint=fingerprint, cluster_id=cluster_id,
+    )
+
+
+# Result fields that are known before the LLM description starts streaming
+STREAM_META_FIELDS = (
+    "title",
+    "triage_label",
+    "label_tier",
+    "label_confidence",
+    "error_line",
+    "playwright_script",
+    "test_url",
+    "playwright_script_endpoint",
+    "fingerprint",
+    "duplicate_of",
+    "cluster_id",
+    "prompt_tokens_saved",
+)
+
+
+@metrics.in_progress(metrics.IN_FLIGHT)
+async def stream_failure(payload: FailureInput) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of process_failure_async. Yields, in order:
+    - ("meta", {...}) once the heuristic title, BERT label and extracted fields are known
+    - ("description", {"text": line}) for each cleaned description line as Ollama generates it
+    - ("result", result) with the complete triage result, ready to be stored
+    """
+    started = time.perf_counter()
+    deadline = Deadline()
+    failure_text = _build_failure_text(payload)
+    timings: Dict[str, float] = {}
+
+    fingerprint, original = await asyncio.to_thread(_fingerprint_stage, payload, timings)
+    if original is not None:
+        result = _build_duplicate_result(payload, failure_text, fingerprint, original, timings, started)
+        yield "meta", {field: result[field] for field in STREAM_META_FIELDS}
+        if result["description"]:
+            yield "description", {"text": result["description"]}
+        yield "result", result
+        return
+    cluster_id, representative = await asyncio.to_thread(_cluster_stage, payload, timings)
+
+    title = generate_bug_title(failure_text)
+    # Compacted up front so the meta event can report the prompt tokens saved
+    compacted = compact_failure_text(failure_text) if representative is None else None
+    label, fields = await asyncio.gather(
+        _label_stage_async(payload, failure_text, timings, deadline),
+        _extraction_stage_async(payload, timings),
+    )
+    # Description is filled in below; the rest of the result is final already
+    bug = {"title": title, "prompt_tokens_saved": compacted.tokens_saved if compacted else None}
+    result = _build_triage_result(
+        payload, failure_text, bug, fields, label, timings,
+        fingerprint=fingerprint, cluster_id=cluster_id,
+    )
+    yield "meta", {field: result[field] for field in STREAM_META_FIELDS}
+
+    if representative is not None:
+        result["description"] = representative["description"]
+        for line in result["description"].split("\n"):
+            yield "description", {"text": line}
+        _record_stage(timings, "total", started)
+        yield "result", result
+        return
+
+    stage_start = time.perf_counter()
+    lines = []
+    outcome: Dict[str, Any] = {}
+    async for line in stream_bug_description(payload.llm_model, failure_text, compacted, deadline, outcome):
+        lines.append(line)
+        yield "description", {"text": line}
+    _record_stage(timings, "llm", stage_start)
+    _record_stage(timings, "total", started)
+
+    result["description"] = "\n".join(lines).strip()
+    if outcome.get("degraded"):
+        result["fallbacks"] = ["llm"] + result["fallbacks"]
+        result["degraded"] = True
+    yield "result", result
+
+
+async def process_failures_batch(
+    payloads: List[FailureInput],
+    max_concurrency: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run process_failure_async for a list of failures with bounded concurrency.
+
+    Every failure is processed independently, so one crashing failure does not
+    affect the others. The returned list keeps the order of `payloads` and holds
+    one {"result": ..., "error": ...} entry per failure.
+    """
+    if not payloads:
+        return []
+
+    limit = max_concurrency or BATCH_MAX_CONCURRENCY
+    semaphore = asyncio.Semaphore(max(1, min(limit, BATCH_MAX_CONCURRENCY)))
+
+    async def _run(payload: FailureInput) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return {"result": await process_failure_async(payload), "error": None}
+            except Exception as e:
+                return {"result": None, "error": str(e)}
 
+    return list(await asyncio.gather(*(_run(payload) for payload in payloads)))
@@ -0,0 +1,94 @@
+"""
+Ollama model warm-up.
+Loading a model takes far longer than a short generation, and Ollama unloads
+idle models. At startup every configured model is loaded on every backend with
+a tiny prompt, and each request asks Ollama to keep the model loaded
+(OLLAMA_KEEP_ALIVE). The engine reports not-ready until the warm-up finished.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.services import http_client
+from app.services.ollama_pool import POOL, OllamaBackend
+
+
+WARMUP_ENABLED = os.getenv("OLLAMA_WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Comma-separated models to load at startup
+WARMUP_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARMUP_MODELS", "gemma:2b").split(",") if m.strip()]
+# Model loading from disk can take minutes on a cold CPU box
+WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+# How long Ollama keeps a model loaded after a request: a duration ("30m") or
+# seconds, negative to keep it loaded forever
+_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_KEEP_ALIVE = int(_keep_alive) if _keep_alive.lstrip("-").isdigit() else _keep_alive
+
+# Warm-up states per (backend, model)
+PENDING = "pending"
+WARM = "warm"
+FAILED = "failed"
+
+_status: Dict[str, Dict[str, str]] = {}  # backend url -> model -> state
+_started_at: Optional[str] = None
+_finished_at: Optional[str] = None
+_ready = not WARMUP_ENABLED
+
+
+async def _warm(backend: OllamaBackend, model: str) -> None:
+    payload = {
+        "model": model,
+        "prompt": "Hi",
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"num_predict": 1},
+    }
+    started = time.perf_counter()
+    try:
+        response = await http_client.post_async(backend.generate_url, timeout=WARMUP_TIMEOUT, json=payload)
+        if response.status_code == 404:
+            # The backend does not have the model; keep it from being routed there
+            backend.mark_missing(model)
+        response.raise_for_status()
+        _status[backend.base_url][model] = WARM
+        print(f"Warmed up {model} on {backend.base_url} in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        # Not fatal: requests still work, the first one just pays the load time
+        _status[backend.base_url][model] = FAILED
+        print(f"Warm-up of {model} on {backend.base_url} failed: {e}")
+
+
+async def run_warmup(models: Optional[List[str]] = None) -> None:
+    """
+    Load `models` (default OLLAMA_WARMUP_MODELS) on every backend that serves
+    them, all at once, then mark the engine ready.
+    """
+    global _ready, _started_at, _finished_at
+    models = WARMUP_MODELS if models is None else models
+    _started_at = datetime.now().isoformat()
+    jobs = []
+    for backend in POOL.backends:
+        _status[backend.base_url] = {}
+        for model in models:
+            if backend.serves(model):
+                _status[backend.base_url][model] = PENDING
+                jobs.append(_warm(backend, model))
+    try:
+        await asyncio.gather(*jobs)
+    finally:
+        _finished_at = datetime.now().isoformat()
+        _ready = True
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def get_status() -> dict:
+    return {
+        "ready": _ready,
+        "warmup_started_at": _started_at,
+        "warmup_finished_at": _finished_at,
+        "models": {url: dict(models) for url, models in _status.items()},
+    }
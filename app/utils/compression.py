@@ -0,0 +1,124 @@
+"""
+Compression of the large text fields of stored results.
+Failures of one suite repeat the same frames, log lines and wording, so a
+preset dictionary built from recorded failures (TRIAGE_COMPRESSION_DICT)
+lets even a single short field compress well. zlib is always available;
+zstd is used when the optional `zstandard` package is installed.
+"""
+import hashlib
+import os
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# zlib | zstd | none
+TRIAGE_COMPRESSION = os.getenv("TRIAGE_COMPRESSION", "zlib").lower()
+# Optional preset dictionary file (see train_dictionary)
+TRIAGE_COMPRESSION_DICT = os.getenv("TRIAGE_COMPRESSION_DICT", "")
+# Shorter texts are stored as they are
+COMPRESSION_MIN_BYTES = int(os.getenv("TRIAGE_COMPRESSION_MIN_BYTES", "64"))
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+# zlib only looks back 32 KB, so a longer dictionary is never used
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+class Codec:
+    """
+    One compression algorithm with an optional preset dictionary. Compressed
+    data can only be read back with the same dictionary, identified by `dict_id`.
+    """
+
+    def __init__(self, name: str, dictionary: bytes = b""):
+        if name not in ("zlib", "zstd"):
+            raise ValueError(f"Unknown compression {name!r} (expected 'zlib', 'zstd' or 'none')")
+        if name == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.name = name
+        self.dictionary = dictionary
+        self.dict_id = hashlib.sha256(dictionary).hexdigest()[:12] if dictionary else None
+        # zstd (de)compressors must not be shared between threads
+        self._local = threading.local()
+
+    def _zstd(self):
+        if not hasattr(self._local, "compressor"):
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            self._local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data)
+            self._local.decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return self._local.compressor, self._local.decompressor
+
+    def compress(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        if self.name == "zstd":
+            return self._zstd()[0].compress(data)
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=self.dictionary) if self.dictionary else zlib.compressobj(ZLIB_LEVEL)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> str:
+        if self.name == "zstd":
+            return self._zstd()[1].decompress(data).decode("utf-8")
+        decompressor = zlib.decompressobj(zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+        return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+
+
+_codecs: Dict[tuple, Codec] = {}
+
+
+def load_codec(name: str = TRIAGE_COMPRESSION, dict_path: str = TRIAGE_COMPRESSION_DICT) -> Optional[Codec]:
+    """
+    The configured codec, None when compression is off. Falls back to zlib
+    when zstd is asked for but not installed.
+    """
+    if name == "none":
+        return None
+    if name == "zstd" and zstandard is None:
+        print("TRIAGE_COMPRESSION=zstd but the zstandard package is not installed; using zlib")
+        name = "zlib"
+    dictionary = b""
+    if dict_path:
+        with open(dict_path, "rb") as f:
+            dictionary = f.read()
+    codec = Codec(name, dictionary)
+    _codecs[(codec.name, codec.dict_id)] = codec
+    return codec
+
+
+def get_codec(name: str, dict_id: Optional[str]) -> Codec:
+    """
+    The codec that compressed data marked with `name` and `dict_id`.
+    """
+    codec = _codecs.get((name, dict_id))
+    if codec is None:
+        if dict_id is not None:
+            raise ValueError(f"Data was compressed with dictionary {dict_id}, which is not loaded")
+        codec = _codecs[(name, None)] = Codec(name)
+    return codec
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_SIZE) -> bytes:
+    """
+    A raw preset dictionary (usable by zlib and zstd) from sample texts: the
+    lines found in the most samples, the most common last, since both
+    algorithms reach the end of the dictionary with the shortest distances.
+    """
+    counts: Counter = Counter()
+    for sample in samples:
+        counts.update({line.rstrip() for line in sample.splitlines() if len(line.strip()) > 8})
+    chosen, total = [], 0
+    for line, count in counts.most_common():
+        if count < 2:
+            break
+        encoded = (line + "\n").encode("utf-8")
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(chosen))
@@ -0,0 +1,277 @@
+"""
+Precompiled extraction of error line, error file path and test URL.
+
+Each field is described by an ordered list of patterns in which an earlier
+pattern always wins, wherever in the text it occurs. The techniques below keep
+this cheap on multi-MB logs while giving exactly the results of trying the
+patterns one after another with re.search (see verify_extraction.py):
+
+- PriorityPatterns compiles literal-led patterns into a single alternation and
+  scans the text forward once instead of once per pattern.
+- TokenAnchoredPattern handles patterns led by `[^\s]+`, which make a plain
+  search retry every start position of every long token. Such matches never
+  contain whitespace, so only tokens containing a required literal are tried.
+- Navigation URLs are found from the "://" of each URL, checking the keywords
+  right before it, instead of one case-insensitive scan per keyword.
+"""
+
+import re
+from typing import Iterator, List, Optional, Tuple
+
+
+class PriorityPatterns:
+    """
+    An ordered group of regexes, each with exactly one named group `v` (the value)
+    and no other capturing groups, searched in a single forward scan.
+    """
+
+    def __init__(self, patterns: List[str]):
+        alternatives = [
+            pattern.replace("(?P<v>", f"(?P<v{priority}>", 1)
+            for priority, pattern in enumerate(patterns)
+        ]
+        # _prefixes[k] matches only the patterns with priority < k
+        self._prefixes = [None] + [
+            re.compile("|".join(alternatives[:count]))
+            for count in range(1, len(alternatives) + 1)
+        ]
+
+    def search(self, text: str) -> Optional[Tuple[int, str]]:
+        """
+        Return (priority, value) for the highest-priority pattern found in `text`,
+        taken from its first occurrence, or None if no pattern matches.
+        """
+        if not text:
+            return None
+
+        best = None
+        pos = 0
+        pattern = self._prefixes[-1]
+        while pattern is not None:
+            match = pattern.search(text, pos)
+            if match is None:
+                break
+            priority = int(match.lastgroup[1:])
+            best = (priority, match.group(match.lastgroup))
+            pattern = self._prefixes[priority]
+            pos = match.start() + 1
+        return best
+
+
+class TokenAnchoredPattern:
+    """
+    A regex whose matches never contain whitespace, plus a cheap `anchor` regex
+    that every match must contain. The full regex only runs inside the
+    whitespace-delimited tokens where the anchor occurs.
+    """
+
+    _TOKEN_REST = re.compile(r"\S*")
+
+    def __init__(self, pattern: str, anchor: str):
+        self._pattern = re.compile(pattern)
+        self._anchor = re.compile(anchor)
+
+    def _candidate_tokens(self, text: str) -> Iterator[Tuple[int, int]]:
+        pos = 0
+        while True:
+            anchor = self._anchor.search(text, pos)
+            if anchor is None:
+                return
+            start = anchor.start()
+            while start > pos and not text[start - 1].isspace():
+                start -= 1
+            end = self._TOKEN_REST.match(text, anchor.end()).end()
+            yield start, end
+            pos = end
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        Return the `v` group of the first match, like re.search.
+        """
+        for value in self.finditer(text):
+            return value
+        return None
+
+    def finditer(self, text: str) -> Iterator[str]:
+        """
+        Yield the `v` group of every match, like re.finditer.
+        """
+        if not text:
+            return
+        for start, end in self._candidate_tokens(text):
+            for match in self._pattern.finditer(text, start, end):
+                yield match.group("v")
+
+
+# --- error line ---------------------------------------------------------------
+
+_LINE_WORD = r"(?i:line)\s+(?P<v>\d+)"
+_LINE_FILE_SUFFIX = r"\.(?:py|js|ts|jsx|tsx):(?P<v>\d+)"
+_LINE_PAREN = r":(?P<v>\d+)\)"
+_LINE_AT = r"at\s+[^\s]+:(?P<v>\d+)"
+
+_STACK_LINE = PriorityPatterns([_LINE_WORD, _LINE_FILE_SUFFIX, _LINE_PAREN, _LINE_AT])
+_MESSAGE_LINE = PriorityPatterns([_LINE_WORD, _LINE_FILE_SUFFIX, _LINE_PAREN])
+# Logs only trust "line XXX" to avoid picking up timestamps
+_LOGS_LINE = PriorityPatterns([_LINE_WORD])
+
+# Larger values are most likely timestamps or other false positives
+MAX_ERROR_LINE = 10000
+
+
+def extract_error_line(stack_trace: str, error_message: str, logs: Optional[str]) -> int:
+    """
+    Find the error line number in the stack trace, then the error message, then
+    the logs. Always returns a number (1 when nothing reasonable is found).
+    """
+    hit = _STACK_LINE.search(stack_trace) or _MESSAGE_LINE.search(error_message) or _LOGS_LINE.search(logs)
+    if hit is None:
+        return 1
+
+    error_line_number = int(hit[1])
+    if error_line_number > MAX_ERROR_LINE:
+        return 1
+    return error_line_number
+
+
+# --- error file path ----------------------------------------------------------
+
+# Anchors are the extension every match ends with
+_TEST_FILE = TokenAnchoredPattern(
+    r"(?i:(?P<v>test_[^\s]+\.(?:py|js|ts)|[^\s]+_test\.(?:py|js|ts)|[^\s]+\.spec\.(?:js|ts)|[^\s]+\.test\.(?:js|ts)))",
+    r"\.(?i:py|js|ts)",
+)
+_TEST_FILE_NO_DOT_TEST = TokenAnchoredPattern(
+    r"(?i:(?P<v>test_[^\s]+\.(?:py|js|ts)|[^\s]+_test\.(?:py|js|ts)|[^\s]+\.spec\.(?:js|ts)))",
+    r"\.(?i:py|js|ts)",
+)
+_FILE_GENERIC = TokenAnchoredPattern(
+    r"(?P<v>[^\s]+\.(?:py|js|ts|jsx|tsx|spec\.js|spec\.ts))",
+    r"\.(?:py|js|ts)",
+)
+_FILE_QUOTED = r'File\s+"(?P<v>[^"]+)"'
+_FILE_AT = r"at\s+(?P<v>[^\s:]+\.(?:py|js|ts|spec\.js|spec\.ts))"
+
+_STACK_FILE = PriorityPatterns([_FILE_QUOTED, _FILE_AT])
+_TEXT_FILE = PriorityPatterns([_FILE_QUOTED])
+
+
+def _first_non_init_file(stack_trace: str) -> Optional[str]:
+    for file in _FILE_GENERIC.finditer(stack_trace):
+        if "__init__.py" not in file:
+            return file
+    return None
+
+
+def _file_from_stack_trace(stack_trace: str) -> Optional[str]:
+    # Test files first, then File "path" / "at path", then any non-__init__ file
+    test_file = _TEST_FILE.search(stack_trace)
+    if test_file:
+        return test_file
+    hit = _STACK_FILE.search(stack_trace)
+    if hit:
+        return hit[1]
+    return _first_non_init_file(stack_trace)
+
+
+def _file_from_text(text: Optional[str]) -> Optional[str]:
+    # Test files first, then File "path", then any file
+    test_file = _TEST_FILE_NO_DOT_TEST.search(text)
+    if test_file:
+        return test_file
+    hit = _TEXT_FILE.search(text)
+    if hit:
+        return hit[1]
+    return _FILE_GENERIC.search(text)
+
+
+def extract_error_file_path(
+    stack_trace: str,
+    error_message: str,
+    logs: Optional[str],
+    file_path: str,
+    test_name: str,
+) -> str:
+    """
+    Find the failing file in the stack trace (test files first, skipping
+    __init__.py), then the error message, then the logs, then fall back to the
+    payload's file path or test name. Always returns a non-empty string.
+    """
+    error_file_path = (
+        _file_from_stack_trace(stack_trace)
+        or _file_from_text(error_message)
+        or _file_from_text(logs)
+    )
+    if error_file_path:
+        return error_file_path
+    if file_path:
+        return file_path
+    if test_name:
+        return f"{test_name}.unknown"
+    return "unknown_test_file"
+
+
+# --- test URL -----------------------------------------------------------------
+
+_URL = r"(?P<v>https?://[^\s\]]+)"
+
+# Priority 1: URLs after navigation keywords, as (keyword length, pattern)
+_NAVIGATION_KEYWORDS = ["Navigating to", "Opening", "URL:", "Visiting", "Loading", "Navigate to"]
+_NAVIGATION_URLS = [
+    (len(keyword), re.compile(rf"(?i:{re.escape(keyword)}\s+{_URL})"))
+    for keyword in _NAVIGATION_KEYWORDS
+]
+# Priority 2: any http/https URL
+_ANY_URL = re.compile(_URL)
+
+# Every URL contains "://", which is far cheaper to scan for than the keywords
+_SCHEME_SEPARATOR = re.compile(r"://")
+_NAVIGATION_SCHEME = re.compile(r"(?i:https?)://")
+
+
+def _navigation_url(text: str) -> Optional[str]:
+    """
+    URL after the highest-priority navigation keyword (first occurrence), checked
+    only where a URL actually starts instead of scanning once per keyword.
+    """
+    best_priority = len(_NAVIGATION_URLS)
+    best_url = None
+    for separator in _SCHEME_SEPARATOR.finditer(text):
+        url_start = None
+        for scheme_start in (separator.start() - 5, separator.start() - 4):
+            if scheme_start >= 0 and _NAVIGATION_SCHEME.match(text, scheme_start):
+                url_start = scheme_start
+                break
+        if url_start is None:
+            continue
+
+        keyword_end = url_start
+        while keyword_end > 0 and text[keyword_end - 1].isspace():
+            keyword_end -= 1
+        if keyword_end == url_start:
+            continue
+
+        for priority in range(best_priority):
+            length, pattern = _NAVIGATION_URLS[priority]
+            if keyword_end >= length:
+                match = pattern.match(text, keyword_end - length)
+                if match:
+                    best_priority, best_url = priority, match.group("v")
+                    break
+        if best_priority == 0:
+            break
+    return best_url
+
+
+def extract_test_url(text: Optional[str]) -> Optional[str]:
+    """
+    Extract the test URL from log text, preferring URLs after navigation keywords.
+    """
+    if not text:
+        return None
+
+    url = _navigation_url(text)
+    if url is None:
+        match = _ANY_URL.search(text)
+        url = match.group("v") if match else None
+    return url.rstrip('.,;') if url else None
@@ -0,0 +1,320 @@
+"""
+Keyword rule table for failure classification.
+
+The category, assertion label, candidate labels and heuristic title of a failure
+are all decided by keyword rules declared in keyword_rules.json. The keywords of
+all rules are de-duplicated per input text (scope) and looked up together, and
+only rules whose keywords were actually seen are evaluated. Once a scope has
+AUTOMATON_MIN_KEYWORDS keywords they are compiled into an Aho-Corasick automaton
+that scans the text once, so the cost stays flat as rules are added.
+
+Rules (JSON objects, evaluated in file order within their kind):
+- kind:  "assertion", "candidate", "title" or "category"
+- value: the label / title / category; titles may use {test_name} and {element}
+         and are skipped when a placeholder they use is empty
+- any:   list of alternatives, each a list of keywords that must all occur;
+         a keyword is a string or {"scope": ..., "keyword": ...}
+- scope: optional default scope of the rule's keywords (see KIND_SCOPES)
+- confidence: optional, how sure an assertion / candidate label is (0..1, see
+         DEFAULT_CONFIDENCE); confident labels let the label classifier skip BERT
+
+Extra rules can be loaded from the JSON file named by TRIAGE_RULES_FILE (same
+format); they are evaluated before the built-in rules of the same kind.
+"""
+
+import json
+import os
+import re
+import string
+from collections import deque
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(__file__), "keyword_rules.json")
+RULES_FILE = os.getenv("TRIAGE_RULES_FILE", "")
+
+# Texts each kind of rule is matched against (all lowercased), default scope first:
+# - error_message:   the failure's error message
+# - error_and_stack: error message and stack trace
+# - message:         the "Error Message:" line of the failure text
+# - message_head:    that line cut before "Traceback"
+# - failure_text:    the whole failure text
+KIND_SCOPES = {
+    "assertion": ("error_message",),
+    "candidate": ("error_and_stack",),
+    "title": ("message", "message_head"),
+    "category": ("message", "failure_text"),
+}
+
+# Below this many keywords in a scope, CPython's C-level substring search of each
+# keyword is faster than a single pass of the pure-Python automaton
+AUTOMATON_MIN_KEYWORDS = int(os.getenv("TRIAGE_RULES_AUTOMATON_MIN", "128"))
+
+# Confidence of labels from rules that do not set their own
+DEFAULT_CONFIDENCE = {"assertion": 0.95, "candidate": 0.5}
+
+_ELEMENT_ID = re.compile(r"#([\w\-]+)")
+
+
+class AhoCorasick:
+    """
+    Multi-keyword matcher: finds which keywords occur in a text in a single pass.
+    """
+
+    def __init__(self, keywords: List[str]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Set[int]] = [set()]
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto.append({})
+                    outputs.append(set())
+                    goto[state][char] = next_state
+                state = next_state
+            outputs[state].add(index)
+
+        # Breadth-first: fail links, then full transition tables so a scan never
+        # has to walk fail links
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] |= outputs[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for char, next_state in goto[state].items():
+                if state:
+                    fail[next_state] = delta[fail[state]].get(char, 0)
+                queue.append(next_state)
+
+        self._step = [transitions.get for transitions in delta]
+        self._outputs: List[FrozenSet[int]] = [frozenset(output) for output in outputs]
+
+    def find(self, text: str) -> Set[int]:
+        """
+        Return the indexes of the keywords that occur in `text`.
+        """
+        found: Set[int] = set()
+        step, outputs = self._step, self._outputs
+        state = 0
+        for char in text:
+            state = step[state](char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+class SubstringMatcher:
+    """
+    Same interface as AhoCorasick, one `in` check per keyword.
+    """
+
+    def __init__(self, keywords: List[str]):
+        self._keywords = keywords
+
+    def find(self, text: str) -> Set[int]:
+        return {index for index, keyword in enumerate(self._keywords) if keyword in text}
+
+
+def compile_keywords(keywords: List[str]):
+    """
+    Pick the cheaper matcher for this many keywords.
+    """
+    if len(keywords) >= AUTOMATON_MIN_KEYWORDS:
+        return AhoCorasick(keywords)
+    return SubstringMatcher(keywords)
+
+
+class RuleMatch(NamedTuple):
+    """Classification results; None for kinds whose inputs were not given."""
+    category: Optional[str]
+    assertion_label: Optional[str]
+    candidate_labels: Optional[List[str]]
+    title: Optional[str]
+    label_confidence: Optional[Dict[str, float]] = None  # assertion / candidate label -> confidence
+
+
+def _css_id_to_words(selector: str) -> str:
+    """
+    '#edit-profile-btn' -> 'Edit profile btn'
+    """
+    selector = selector.lstrip("#.")
+    selector = selector.replace("-", " ").replace("_", " ").strip()
+    if not selector:
+        return "UI element"
+    return selector.capitalize()
+
+
+class KeywordRules:
+    """
+    A compiled rule table (see the module docstring for the rule format).
+    """
+
+    def __init__(self, rules: List[dict]):
+        # {scope: {keyword: index}}
+        keywords: Dict[str, Dict[str, int]] = {}
+        # Per rule: (kind, value, alternatives as lists of (scope, keyword index), placeholders)
+        self._rules: List[Tuple[str, str, List[List[Tuple[str, int]]], Set[str]]] = []
+        self._confidence: List[Optional[float]] = []
+        # kind -> scope -> keyword index -> indexes of the rules that keyword alone satisfies
+        self._direct: Dict[str, Dict[str, Dict[int, List[int]]]] = {kind: {} for kind in KIND_SCOPES}
+        # kind -> scope -> keyword index -> indexes of the other rules using that keyword
+        self._partial: Dict[str, Dict[str, Dict[int, List[int]]]] = {kind: {} for kind in KIND_SCOPES}
+
+        for rule in rules:
+            kind = rule.get("kind")
+            if kind not in KIND_SCOPES:
+                raise ValueError(f"Unknown rule kind {kind!r} in {rule!r}")
+            default_scope = rule.get("scope", KIND_SCOPES[kind][0])
+            alternatives = []
+            for alternative in rule.get("any") or []:
+                atoms = []
+                for atom in alternative:
+                    scope, keyword = (
+                        (atom.get("scope", default_scope), atom.get("keyword"))
+                        if isinstance(atom, dict) else (default_scope, atom)
+                    )
+                    if scope not in KIND_SCOPES[kind]:
+                        raise ValueError(f"Scope {scope!r} cannot be used by {kind} rules: {rule!r}")
+                    if not isinstance(keyword, str) or not keyword:
+                        raise ValueError(f"Invalid keyword {keyword!r} in {rule!r}")
+                    scope_keywords = keywords.setdefault(scope, {})
+                    atoms.append((scope, scope_keywords.setdefault(keyword.lower(), len(scope_keywords))))
+                if atoms:
+                    alternatives.append(atoms)
+            if not alternatives:
+                raise ValueError(f"Rule without keywords: {rule!r}")
+
+            value = rule.get("value")
+            placeholders = {field for _, field, _, _ in string.Formatter().parse(value) if field} if kind == "title" else set()
+            rule_index = len(self._rules)
+            self._rules.append((kind, value, alternatives, placeholders))
+            self._confidence.append(float(rule.get("confidence", DEFAULT_CONFIDENCE.get(kind, 1.0))))
+            direct = {atoms[0] for atoms in alternatives if len(atoms) == 1}
+            for scope, keyword in direct:
+                self._direct[kind].setdefault(scope, {}).setdefault(keyword, []).append(rule_index)
+            for scope, keyword in {atom for atoms in alternatives for atom in atoms} - direct:
+                self._partial[kind].setdefault(scope, {}).setdefault(keyword, []).append(rule_index)
+
+        self._matchers = {scope: compile_keywords(list(scope_keywords)) for scope, scope_keywords in keywords.items()}
+
+    def _find(self, scope: str, text: str) -> Set[int]:
+        matcher = self._matchers.get(scope)
+        return matcher.find(text) if matcher is not None else set()
+
+    def _matching_rules(self, kind: str, found: Dict[str, Set[int]]) -> List[int]:
+        """
+        Indexes of the rules of `kind` that hold, in table order.
+        """
+        matched = set()
+        candidates = set()
+        for scope, keywords in found.items():
+            direct = self._direct[kind].get(scope, {})
+            partial = self._partial[kind].get(scope, {})
+            for keyword in keywords:
+                if keyword in direct:
+                    matched.update(direct[keyword])
+                if keyword in partial:
+                    candidates.update(partial[keyword])
+
+        for rule_index in candidates - matched:
+            for atoms in self._rules[rule_index][2]:
+                if all(keyword in found.get(scope, ()) for scope, keyword in atoms):
+                    matched.add(rule_index)
+                    break
+        return sorted(matched)
+
+    def _title(self, found: Dict[str, Set[int]], values: Dict[str, str]) -> Optional[str]:
+        for rule_index in self._matching_rules("title", found):
+            _, value, _, placeholders = self._rules[rule_index]
+            if all(values.get(name) for name in placeholders):
+                return value.format(**values)
+        return None
+
+    def classify(
+        self,
+        error_message: Optional[str] = None,
+        stack_trace: Optional[str] = None,
+        message: Optional[str] = None,
+        test_name: str = "",
+        failure_text: Optional[str] = None,
+    ) -> RuleMatch:
+        """
+        Run every kind of rule whose inputs are given, scanning each text once:
+        - assertion label: error_message
+        - candidate labels: error_message and stack_trace
+        - title: message (the "Error Message:" line) and test_name
+        - category: message and failure_text
+        """
+        texts: Dict[str, str] = {}
+        if error_message is not None:
+            texts["error_message"] = error_message.lower()
+            if stack_trace is not None:
+                texts["error_and_stack"] = f"{error_message} {stack_trace}".lower()
+        if message is not None:
+            texts["message"] = message.lower()
+        if failure_text is not None:
+            texts["failure_text"] = failure_text.lower()
+
+        found = {scope: self._find(scope, text) for scope, text in texts.items()}
+
+        title = None
+        if message is not None:
+            # Later title rules ignore anything after 'Traceback'
+            head = message
+            if "traceback" in texts["message"]:
+                head = message.split("Traceback", 1)[0].strip()
+            found["message_head"] = self._find("message_head", head.lower())
+            element = _ELEMENT_ID.search(head)
+            title = self._title(found, {
+                "test_name": test_name,
+                "element": _css_id_to_words("#" + element.group(1)) if element else "",
+            })
+
+        category = None
+        if message is not None and failure_text is not None:
+            rule_indexes = self._matching_rules("category", found)
+            category = self._rules[rule_indexes[0]][1] if rule_indexes else None
+
+        assertion_label = candidate_labels = label_confidence = None
+        if error_message is not None:
+            label_confidence = {}
+            rule_indexes = self._matching_rules("assertion", found)
+            if rule_indexes:
+                assertion_label = self._rules[rule_indexes[0]][1]
+                label_confidence[assertion_label] = self._confidence[rule_indexes[0]]
+        if "error_and_stack" in found:
+            candidates: Dict[str, float] = {}
+            for rule_index in self._matching_rules("candidate", found):
+                label = self._rules[rule_index][1]
+                candidates[label] = max(candidates.get(label, 0.0), self._confidence[rule_index])
+            candidate_labels = list(candidates)
+            for label, confidence in candidates.items():
+                label_confidence[label] = max(label_confidence.get(label, 0.0), confidence)
+
+        return RuleMatch(category, assertion_label, candidate_labels, title, label_confidence)
+
+
+def load_rules(path: str = RULES_FILE) -> List[dict]:
+    """
+    Built-in rules, preceded by the extra rules from `path` (if set).
+    """
+    with open(DEFAULT_RULES_FILE, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f) + rules
+    return rules
+
+
+RULES = KeywordRules(load_rules())
+
+
+def classify(**texts) -> RuleMatch:
+    """
+    Classify with the configured rule table; see KeywordRules.classify.
+    """
+    return RULES.classify(**texts)
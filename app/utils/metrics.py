@@ -0,0 +1,287 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+Counters, gauges and histograms with labels; recording a value is one lock and
+a few dict/list operations, so the instrumentation can stay on in production.
+All metrics of the engine are declared at the bottom of this module and served
+by GET /metrics.
+"""
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Tuple
+
+
+# Seconds, from a fast regex pass up to a slow CPU generation
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        """
+        Read the value from `fn` whenever the metrics are rendered.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            value = fn()
+            with self._lock:
+                self._values[key] = value
+        return super()._samples()
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            samples.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+def timed(histogram: Histogram, **labels) -> Callable:
+    """
+    Decorator: observe the duration of every call of the function.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+def in_progress(gauge: Gauge) -> Callable:
+    """
+    Decorator: count running calls of a function, coroutine function or async
+    generator function in `gauge`.
+    """
+    def decorator(fn: Callable) -> Callable:
+        if inspect.isasyncgenfunction(fn):
+            @wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                with gauge.track_inprogress():
+                    async for item in fn(*args, **kwargs):
+                        yield item
+            return agen_wrapper
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def coro_wrapper(*args, **kwargs):
+                with gauge.track_inprogress():
+                    return await fn(*args, **kwargs)
+            return coro_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with gauge.track_inprogress():
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+REGISTRY: List[_Metric] = []
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# --- engine metrics -----------------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "triage_stage_duration_seconds", "Duration of each triage pipeline stage", ("stage",),
+)
+OLLAMA_SECONDS = Histogram(
+    "ollama_generation_duration_seconds", "Duration of Ollama generations", ("backend", "outcome"),
+)
+BERT_SECONDS = Histogram(
+    "bert_classification_duration_seconds", "Duration of BERT classification calls", ("outcome",),
+)
+EXTRACTION_SECONDS = Histogram(
+    "regex_extraction_duration_seconds", "Duration of the regex extraction of error line, script and test URL",
+)
+CLEAN_TEXT_SECONDS = Histogram(
+    "clean_text_duration_seconds", "Duration of clean_text calls",
+)
+SANITIZE_SECONDS = Histogram(
+    "sanitize_description_duration_seconds", "Duration of LLM description sanitizing",
+)
+STORAGE_SECONDS = Histogram(
+    "storage_operation_duration_seconds", "Duration of result storage operations", ("operation",),
+)
+FALLBACKS = Counter(
+    "triage_fallbacks_total", "Stages that fell back to heuristics", ("stage", "reason"),
+)
+RESULTS_STORED = Counter(
+    "triage_results_stored_total", "Triage results stored",
+)
+TRIAGES = Counter(
+    "triage_requests_total", "Triaged failures by how they were handled", ("path",),
+)
+IN_FLIGHT = Gauge(
+    "triage_requests_in_flight", "Failures being triaged right now",
+)
+STORAGE_USAGE = Gauge(
+    "triage_storage_usage", "Stored results and their estimated size in bytes", ("resource",),
+)
+STORAGE_LIMIT = Gauge(
+    "triage_storage_limit", "Configured retention limits (0 = unlimited)", ("resource",),
+)
+EVICTIONS = Counter(
+    "triage_results_evicted_total", "Stored results evicted by retention", ("reason",),
+)
+STORED_TEXT_BYTES = Counter(
+    "triage_stored_text_bytes_total", "Bytes of the large text fields of stored results, raw and as stored", ("state",),
+)
+COMPRESSION_RATIO = Gauge(
+    "triage_storage_compression_ratio", "Raw / stored bytes of the large text fields of stored results",
+)
+
+# Unlabelled series are exported as 0 before their first update
+RESULTS_STORED.inc(0)
+IN_FLIGHT.set(0)
@@ -0,0 +1,204 @@
+"""
+Compaction of the failure text before it is put into an LLM prompt.
+Prompt evaluation time on a small CPU model grows with prompt size, while most
+of a raw failure text is repetition: the stack trace starts with the error
+message again, logs repeat it once more, frames repeat, and ANSI codes and
+timestamps carry nothing the model can use. The compacted text keeps the same
+"Test Name / File Path / Error Message / Stack Trace / Logs" layout.
+"""
+
+import os
+import re
+from typing import List, NamedTuple, Tuple
+
+
+PROMPT_COMPACTION_ENABLED = os.getenv("TRIAGE_PROMPT_COMPACTION", "true").lower() in ("1", "true", "yes")
+# Token budget for the failure details inside the description prompt
+PROMPT_TOKEN_BUDGET = int(os.getenv("TRIAGE_PROMPT_TOKEN_BUDGET", "1024"))
+# Rough characters per token for English text and code (no tokenizer is available here)
+CHARS_PER_TOKEN = 4
+
+SECTION_HEADERS = ("Test Name:", "File Path:", "Error Message:", "Stack Trace:", "Logs:")
+
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_TIMESTAMP = re.compile(
+    r"^\s*\[?(?:\d{4}-\d{2}-\d{2}[ T])?\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?\]?\s*"
+)
+_FRAME = re.compile(r'^\s*(?:at\s|File\s+")')
+_LIBRARY_FRAME = re.compile(r"node_modules|node:internal|internal/|site-packages|dist-packages|[\\/]lib[\\/]python")
+_INFORMATIVE_LOG = re.compile(r"error|fail|warn|exception|timeout|https?://", re.IGNORECASE)
+
+# Line priorities: lowest go first when the text is over budget
+_KEEP = 100
+_USER_FRAME = 70
+_ERROR_LINE = 50
+_STACK_LINE = 40
+_INFORMATIVE_LOG_LINE = 35
+_LIBRARY_FRAME_LINE = 30
+_LOG_LINE = 20
+
+_OMITTED_MARKER_CHARS = len("... (9999 lines omitted)") + 1
+# Share of the budget the first error-message line may take; it is kept, but cut to this
+FIRST_ERROR_LINE_SHARE = 0.5
+
+
+class CompactedText(NamedTuple):
+    text: str
+    original_tokens: int
+    tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _split_sections(failure_text: str) -> List[Tuple[str, List[str]]]:
+    """
+    Split the failure text into (header, lines) in SECTION_HEADERS order; text
+    before the first header is kept under an empty header.
+    """
+    sections = [("", [])]
+    expected = list(SECTION_HEADERS)
+    for line in failure_text.splitlines():
+        header = next((h for h in expected if line.startswith(h)), None)
+        if header is not None:
+            # Headers only appear in order, so "Logs:" inside an error message is just text
+            expected = expected[expected.index(header) + 1:]
+            sections.append((header, [line[len(header):].strip()]))
+        else:
+            sections[-1][1].append(line)
+    return [(header, lines) for header, lines in sections if header or any(l.strip() for l in lines)]
+
+
+def _clean_lines(lines: List[str]) -> List[str]:
+    """
+    Strip ANSI codes, leading timestamps and trailing spaces; collapse blank lines.
+    """
+    cleaned = []
+    for line in lines:
+        line = _TIMESTAMP.sub("", _ANSI_ESCAPE.sub("", line)).rstrip()
+        if line or (cleaned and cleaned[-1]):
+            cleaned.append(line)
+    while cleaned and not cleaned[-1]:
+        cleaned.pop()
+    return cleaned
+
+
+def _prioritized_lines(failure_text: str, budget_chars: int) -> List[Tuple[float, str]]:
+    """
+    Cleaned, de-duplicated lines of the failure text, each with its priority.
+    The first error-message line is always kept, cut to FIRST_ERROR_LINE_SHARE
+    of `budget_chars`.
+    """
+    sections = [(header, _clean_lines(lines)) for header, lines in _split_sections(failure_text)]
+    error_lines = next((lines for header, lines in sections if header == "Error Message:"), [])
+    error_text = "\n".join(error_lines)
+    known = {line.strip() for line in error_lines if line.strip()}
+
+    def _repeats_error(line: str) -> bool:
+        content = line.strip()
+        if content.startswith("Error:") and content[len("Error:"):].strip() in known:
+            return True
+        return content in known or (len(content) >= 20 and content in error_text)
+
+    items: List[Tuple[float, str]] = []
+    seen_frames = set()
+    for header, lines in sections:
+        if header in ("Test Name:", "File Path:", "Error Message:", ""):
+            for index, line in enumerate(lines):
+                if header != "Error Message:":
+                    priority = _KEEP
+                elif index == 0:
+                    priority = _KEEP
+                    max_chars = int(budget_chars * FIRST_ERROR_LINE_SHARE)
+                    if len(line) > max_chars:
+                        line = line[:max_chars].rstrip() + " ..."
+                else:
+                    priority = _ERROR_LINE
+                items.append((priority, f"{header} {line}".strip() if index == 0 else line))
+            continue
+
+        kept = []
+        frame_rank = 0
+        for line in lines:
+            content = line.strip()
+            if not content:
+                kept.append((_KEEP, line))
+                continue
+            if header == "Stack Trace:" and _FRAME.match(line):
+                if content in seen_frames:
+                    continue
+                seen_frames.add(content)
+                # Top frames first; frames in the project before library internals
+                base = _LIBRARY_FRAME_LINE if _LIBRARY_FRAME.search(content) else _USER_FRAME
+                kept.append((base - frame_rank * 0.01, line))
+                frame_rank += 1
+            elif _repeats_error(content):
+                continue
+            elif header == "Stack Trace:":
+                kept.append((_STACK_LINE, line))
+            else:
+                # Later log lines are closer to the failure
+                base = _INFORMATIVE_LOG_LINE if _INFORMATIVE_LOG.search(content) else _LOG_LINE
+                kept.append((base + len(kept) * 0.0001, line))
+
+        # Drop blank lines left at the edges by removed lines
+        while kept and not kept[0][1].strip():
+            kept.pop(0)
+        while kept and not kept[-1][1].strip():
+            kept.pop()
+        if kept:
+            items.append((_KEEP, header))
+            items.extend(kept)
+        else:
+            items.append((_KEEP, f"{header} (none)" if header == "Stack Trace:" else f"{header}"))
+    return items
+
+
+def compact_failure_text(failure_text: str, token_budget: int = PROMPT_TOKEN_BUDGET) -> CompactedText:
+    """
+    Remove repeated error-message lines and stack frames, ANSI codes and
+    timestamps, then drop the least informative lines (library frames, plain log
+    lines, ...) until the text fits `token_budget`.
+    Returns the text unchanged when TRIAGE_PROMPT_COMPACTION is off.
+    """
+    original_tokens = estimate_tokens(failure_text)
+    if not PROMPT_COMPACTION_ENABLED:
+        return CompactedText(failure_text, original_tokens, original_tokens)
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    items = _prioritized_lines(failure_text, budget_chars)
+
+    total_chars = sum(len(line) + 1 for _, line in items)
+    dropped = set()
+    if total_chars > budget_chars:
+        for index in sorted(range(len(items)), key=lambda i: items[i][0]):
+            if items[index][0] >= _KEEP or total_chars <= budget_chars:
+                break
+            dropped.add(index)
+            total_chars -= len(items[index][1]) + 1
+            # Each run of dropped lines is replaced by one "omitted" marker
+            neighbours = (index - 1 in dropped) + (index + 1 in dropped)
+            total_chars += (1 - neighbours) * _OMITTED_MARKER_CHARS
+
+    lines = []
+    omitted = 0
+    for index, (_, line) in enumerate(items):
+        if index in dropped:
+            omitted += 1
+            continue
+        if omitted:
+            lines.append(f"... ({omitted} lines omitted)")
+            omitted = 0
+        lines.append(line)
+    if omitted:
+        lines.append(f"... ({omitted} lines omitted)")
+
+    text = "\n".join(lines).strip()
+    if len(text) > budget_chars:
+        # Only must-keep lines are left; cut the text itself
+        text = text[:budget_chars].rstrip() + "\n... (truncated)"
+    return CompactedText(text, original_tokens, estimate_tokens(text))
@@ -0,0 +1,17 @@
+"""
+Text normalization helpers shared by the triage pipeline.
+"""
+import re
+
+from app.utils import metrics
+
+
+@metrics.timed(metrics.CLEAN_TEXT_SECONDS)
+def clean_text(text: str) -> str:
+    if not text:
+        return ""
+    text = text.lower()
+    text = re.sub(r"\d+", "<NUM>", text)
+    text = re.sub(r"[^a-z0-9 <>\n]", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
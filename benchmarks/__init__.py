@@ -0,0 +1,4 @@
+"""
+Benchmarks of the triage engine.
+Run them from the repository root, e.g. `python -m benchmarks.replay`.
+"""
@@ -0,0 +1,76 @@
+"""
+Compression of stored failure text
+Builds the raw_failure_text of the recorded failures, trains a preset
+dictionary on half of them and prints the compression ratio and speed of
+each codec on the other half, with and without the dictionary. --dict-output
+saves the dictionary for TRIAGE_COMPRESSION_DICT.
+
+Usage:
+  python -m benchmarks.compression
+  python -m benchmarks.compression --dict-output failure.dict
+"""
+import argparse
+import time
+from typing import List
+
+from app.schemas import FailureInput
+from app.services.triage_service import _build_failure_text
+from app.utils import compression
+from benchmarks.corpus import load_failures, scale
+
+
+def failure_texts(count: int, seed: int) -> List[str]:
+    return [
+        _build_failure_text(FailureInput(**dict(failure, llm_model="", bert_url="")))
+        for failure in scale(load_failures(), count, duplicate_ratio=0.0, seed=seed)
+    ]
+
+
+def measure(codec: compression.Codec, texts: List[str]) -> dict:
+    raw = sum(len(text.encode("utf-8")) for text in texts)
+    started = time.perf_counter()
+    packed = [codec.compress(text) for text in texts]
+    compress_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for data in packed:
+        codec.decompress(data)
+    decompress_seconds = time.perf_counter() - started
+    stored = sum(len(data) for data in packed)
+    return {
+        "ratio": raw / stored,
+        "compress_us": compress_seconds / len(texts) * 1e6,
+        "decompress_us": decompress_seconds / len(texts) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compression ratio of stored failure text")
+    parser.add_argument("--failures", type=int, default=400, help="failures to build (half train the dictionary)")
+    parser.add_argument("--dict-size", type=int, default=compression.MAX_DICTIONARY_SIZE)
+    parser.add_argument("--dict-output", help="write the trained dictionary to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = failure_texts(args.failures, args.seed)
+    train, test = texts[::2], texts[1::2]
+    dictionary = compression.train_dictionary(train, args.dict_size)
+    print(f"{len(test)} failures, {sum(map(len, test)) // len(test)} bytes on average; dictionary {len(dictionary)} bytes")
+    print()
+    print(f"{'codec':<16} {'ratio':>7} {'compress':>10} {'decompress':>11}")
+    names = ["zlib"] + (["zstd"] if compression.zstandard is not None else [])
+    for name in names:
+        for preset in (b"", dictionary):
+            result = measure(compression.Codec(name, preset), test)
+            label = f"{name}+dict" if preset else name
+            print(f"{label:<16} {result['ratio']:>6.2f}x {result['compress_us']:>8.0f}us {result['decompress_us']:>9.0f}us")
+    if compression.zstandard is None:
+        print("(zstd skipped: the zstandard package is not installed)")
+
+    if args.dict_output:
+        with open(args.dict_output, "wb") as f:
+            f.write(dictionary)
+        print(f"Dictionary written to {args.dict_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark inputs: the failures of playwright-report.json and the
+failure_payload_*.json files, scaled up to any number of requests.
+Scaling is seeded, so the same arguments always give the same corpus.
+"""
+import random
+from typing import Dict, List
+
+from verify_extraction import _failures_from_payloads, _failures_from_report
+
+
+# Words swapped into scaled copies so they get new fingerprints
+_VARIANT_WORDS = [
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+]
+
+
+def load_failures() -> List[Dict[str, str]]:
+    """
+    The recorded failures, each once (the report's ANSI-stripped variants only).
+    """
+    report = _failures_from_report()[::2]
+    return [
+        {key: value or "" for key, value in failure.items()}
+        for failure in report + _failures_from_payloads()
+    ]
+
+
+def _variant_tag(index: int) -> str:
+    # Letters only: digits are normalized away by the fingerprint
+    words = []
+    while True:
+        index, digit = divmod(index, len(_VARIANT_WORDS))
+        words.append(_VARIANT_WORDS[digit])
+        if not index:
+            return "-".join(words)
+
+
+def scale(failures: List[Dict[str, str]], count: int, duplicate_ratio: float = 0.3, seed: int = 0) -> List[Dict[str, str]]:
+    """
+    `count` failures: the recorded ones first, then copies of random recorded
+    ones. A `duplicate_ratio` share of the copies are exact repeats (a CI
+    rerun); the others get a distinct tag in their test name and error message
+    and so a new fingerprint, like the same bug hit by another test.
+    """
+    rng = random.Random(seed)
+    corpus = [dict(failure) for failure in failures[:count]]
+    for index in range(len(corpus), count):
+        failure = dict(rng.choice(failures))
+        if rng.random() >= duplicate_ratio:
+            tag = _variant_tag(index)
+            failure["test_name"] = f"{failure['test_name']} [{tag}]"
+            failure["error_message"] = f"{failure['error_message']} ({tag})"
+        corpus.append(failure)
+    return corpus
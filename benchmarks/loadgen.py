@@ -0,0 +1,235 @@
+"""
+Load Generator
+Drives a running triage engine at stepped concurrency levels with a mix of
+POST /api/triage (failures from the recorded reports) and GET requests
+(latest, by id, list, clusters), and prints throughput, latency and error
+rate per level: the curve shows where the engine saturates, to size uvicorn
+workers and Ollama backends.
+
+Usage:
+  python -m benchmarks.loadgen --url http://localhost:8003
+  python -m benchmarks.loadgen --levels 1,4,16,64 --duration 60 --read-ratio 0.5
+  python -m benchmarks.loadgen --output loadgen.json
+
+Without Ollama and BERT, point the engine at benchmarks/stub_servers.py.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.corpus import load_failures, scale
+from benchmarks.replay import percentile
+
+
+# Throughput within this share of the peak (or growth below it) counts as saturated
+SATURATION_MARGIN = 0.1
+BAR_WIDTH = 30
+
+
+class LevelStats:
+    """
+    Outcome of one concurrency level.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.latencies_ms: Dict[str, List[float]] = {"write": [], "read": []}
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+        self.seconds = 0.0
+
+    def record(self, kind: str, started: float, status: str, ok: bool) -> None:
+        self.latencies_ms[kind].append((time.perf_counter() - started) * 1000)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        latency = {
+            kind: {
+                "p50": _round(percentile(values, 50)),
+                "p95": _round(percentile(values, 95)),
+                "p99": _round(percentile(values, 99)),
+            }
+            for kind, values in self.latencies_ms.items()
+        }
+        return {
+            "concurrency": self.concurrency,
+            "seconds": round(self.seconds, 2),
+            "requests": self.requests,
+            "writes": len(self.latencies_ms["write"]),
+            "reads": len(self.latencies_ms["read"]),
+            "throughput_rps": round(self.throughput, 2),
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "statuses": self.statuses,
+            "latency_ms": latency,
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, corpus: List[dict], read_ratio: float, timeout: float, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.corpus = corpus
+        self.read_ratio = read_ratio
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self._next_failure = 0
+        self.result_ids: List[str] = []
+
+    def _read_path(self) -> str:
+        choice = self.rng.random()
+        if choice < 0.4 and self.result_ids:
+            return f"/api/triage/{self.rng.choice(self.result_ids)}"
+        if choice < 0.7:
+            return "/api/triage/latest"
+        if choice < 0.9:
+            return "/api/triage"
+        return "/api/clusters"
+
+    async def _request(self, client: httpx.AsyncClient, stats: LevelStats) -> None:
+        started = time.perf_counter()
+        if self.rng.random() < self.read_ratio:
+            kind, path = "read", self._read_path()
+            request = client.get(path)
+        else:
+            kind = "write"
+            failure = self.corpus[self._next_failure % len(self.corpus)]
+            self._next_failure += 1
+            request = client.post("/api/triage", json=failure)
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            stats.record(kind, started, type(e).__name__, ok=False)
+            return
+        # A read of "latest" before anything is stored is not an engine error
+        ok = response.is_success or (kind == "read" and response.status_code == 404)
+        stats.record(kind, started, str(response.status_code), ok)
+        if kind == "write" and response.status_code == 200:
+            self.result_ids.append(response.json()["id"])
+
+    async def run_level(self, concurrency: int, duration: float) -> LevelStats:
+        """
+        `concurrency` clients send requests back to back for `duration` seconds.
+        """
+        stats = LevelStats(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.timeout) as client:
+            started = time.perf_counter()
+            stop_at = started + duration
+
+            async def client_loop():
+                while time.perf_counter() < stop_at:
+                    await self._request(client, stats)
+
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+            stats.seconds = time.perf_counter() - started
+        return stats
+
+
+def saturation_level(levels: List[LevelStats]) -> Optional[LevelStats]:
+    """
+    The lowest level within SATURATION_MARGIN of the peak throughput, or None
+    while the last level still gained more than that over the one before.
+    """
+    if not levels:
+        return None
+    if len(levels) > 1 and levels[-1].throughput > levels[-2].throughput * (1 + SATURATION_MARGIN):
+        return None
+    peak = max(level.throughput for level in levels)
+    return next(level for level in levels if level.throughput >= peak * (1 - SATURATION_MARGIN))
+
+
+def print_curve(levels: List[LevelStats]) -> None:
+    best = max((level.throughput for level in levels), default=0.0) or 1.0
+    print()
+    print(f"{'conc':>5} {'req/s':>8} {'write p50':>10} {'p95':>9} {'p99':>9} {'read p95':>9} {'errors':>7}  throughput")
+    for level in levels:
+        data = level.to_dict()
+        write, read = data["latency_ms"]["write"], data["latency_ms"]["read"]
+        bar = "#" * max(1, round(BAR_WIDTH * level.throughput / best)) if level.throughput else ""
+        print(
+            f"{level.concurrency:>5} {data['throughput_rps']:>8.1f} {_ms(write['p50']):>10} {_ms(write['p95']):>9} "
+            f"{_ms(write['p99']):>9} {_ms(read['p95']):>9} {data['error_rate']:>7.1%}  {bar}"
+        )
+    saturated = saturation_level(levels)
+    print()
+    if saturated is not None:
+        print(f"Throughput saturates at ~{saturated.concurrency} concurrent clients ({saturated.throughput:.1f} req/s)")
+    else:
+        print("Throughput still grows at the highest level; try higher --levels")
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f}ms"
+
+
+async def sweep(generator: LoadGenerator, levels: List[int], duration: float, pause: float) -> List[LevelStats]:
+    results = []
+    for index, concurrency in enumerate(levels):
+        if index and pause:
+            await asyncio.sleep(pause)
+        print(f"Running {concurrency} concurrent clients for {duration:g}s...", flush=True)
+        stats = await generator.run_level(concurrency, duration)
+        print(f"  {stats.requests} requests, {stats.throughput:.1f} req/s, {stats.errors} errors", flush=True)
+        results.append(stats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency sweep against a running triage engine")
+    parser.add_argument("--url", default="http://localhost:8003", help="engine base URL")
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per level")
+    parser.add_argument("--pause", type=float, default=2.0, help="seconds between levels, to let queues drain")
+    parser.add_argument("--read-ratio", type=float, default=0.2, help="share of GET requests")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="share of repeated failures")
+    parser.add_argument("--failures", type=int, default=5000, help="distinct failures to cycle through")
+    parser.add_argument("--model", default="gemma:2b")
+    parser.add_argument("--bert-url", default="http://localhost:8001/triage")
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-request timeout (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    corpus = [
+        dict(failure, llm_model=args.model, bert_url=args.bert_url)
+        for failure in scale(load_failures(), args.failures, args.duplicate_ratio, args.seed)
+    ]
+    generator = LoadGenerator(args.url, corpus, args.read_ratio, args.timeout, args.seed)
+    results = asyncio.run(sweep(generator, levels, args.duration, args.pause))
+    print_curve(results)
+
+    if args.output:
+        saturated = saturation_level(results)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "benchmark": "loadgen",
+                "timestamp": datetime.now().isoformat(),
+                "config": {key: value for key, value in vars(args).items() if key != "output"},
+                "saturation_concurrency": saturated.concurrency if saturated else None,
+                "levels": [level.to_dict() for level in results],
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Micro-benchmarks of the pure-Python hot paths.
+Times clean_text, the error line / file extraction, test URL extraction, the
+heuristic bug title, description sanitizing and candidate label matching on
+failures from 1 KB to 10 MB, built by repeating lines of the recorded
+failures. Fails (exit code 1) when a stage got slower than the saved
+baseline by more than --threshold, or when its time grows faster than
+--max-exponent with the input size (e.g. quadratic regex backtracking).
+
+Timings are scaled by a fixed calibration workload timed on the same
+machine, so a baseline recorded on one machine stays usable on another.
+
+Usage:
+  python -m benchmarks.micro                       # compare against benchmarks/micro_baseline.json
+  python -m benchmarks.micro --update              # re-record the baseline
+  python -m benchmarks.micro --sizes 1K,100K --cases clean_text,test_url
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+from app.schemas import FailureInput
+from app.services.ollama_service import _heuristic_bug_title, _sanitize_description
+from app.services.playwright_label_detector import _get_candidate_labels_from_patterns
+from app.services.triage_service import _build_failure_text, _extract_error_location
+from app.utils.text_utils import clean_text
+from app.utils.url_utils import extract_test_url_from_logs
+from benchmarks.corpus import load_failures
+
+
+BASELINE_FILE = os.path.join("benchmarks", "micro_baseline.json")
+DEFAULT_SIZES = "1K,10K,100K,1M,10M"
+# Below this size per-call timings are dominated by fixed costs; the growth check skips them
+MIN_GROWTH_SIZE = 100 * 1024
+
+_UNITS = {"K": 1024, "M": 1024 * 1024}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    if text[-1:] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit in ("M", "K"):
+        if size >= _UNITS[unit] and size % _UNITS[unit] == 0:
+            return f"{size // _UNITS[unit]}{unit}"
+    return str(size)
+
+
+def _fill(lines: List[str], size: int) -> str:
+    """
+    Repeat `lines` until the text is `size` characters long.
+    """
+    lines = [line for line in lines if line.strip()] or ["no output"]
+    parts, total, index = [], 0, 0
+    while total < size:
+        line = lines[index % len(lines)]
+        parts.append(line)
+        total += len(line) + 1
+        index += 1
+    return "\n".join(parts)[:size]
+
+
+def build_failure(size: int) -> FailureInput:
+    """
+    A failure of about `size` characters: 10% error message, 30% stack trace,
+    60% logs, made of lines of the recorded failures.
+    """
+    failures = load_failures()
+    messages = [line for failure in failures for line in failure["error_message"].splitlines()]
+    frames = [line for failure in failures for line in failure["stack_trace"].splitlines()]
+    logs = [line for failure in failures for line in failure["logs"].splitlines()]
+    return FailureInput(
+        test_name=failures[0]["test_name"],
+        file_path=failures[0]["file_path"],
+        error_message=_fill(messages, max(1, size // 10)),
+        stack_trace=_fill(frames, max(1, size * 3 // 10)),
+        logs=_fill(logs, max(1, size * 6 // 10)),
+        llm_model="",
+        bert_url="",
+    )
+
+
+def _description(failure_text: str, size: int) -> str:
+    # LLM output that echoes every other failure line between prose lines
+    echoed = failure_text.splitlines()[::2]
+    prose = "The submit button stays disabled after the form is filled in."
+    return _fill([line for pair in zip(echoed, [prose] * len(echoed)) for line in pair], size)
+
+
+def build_cases(payload: FailureInput) -> Dict[str, Callable[[], object]]:
+    """
+    name -> zero-argument call of the stage on `payload`.
+    """
+    failure_text = _build_failure_text(payload)
+    description = _description(failure_text, max(1, len(failure_text) // 4))
+    return {
+        "clean_text": lambda: clean_text(payload.logs),
+        "extract_error_location": lambda: _extract_error_location(payload),
+        "test_url": lambda: extract_test_url_from_logs(payload.logs),
+        "heuristic_bug_title": lambda: _heuristic_bug_title(failure_text),
+        "sanitize_description": lambda: _sanitize_description(description, failure_text),
+        "candidate_labels": lambda: _get_candidate_labels_from_patterns(payload.error_message, payload.stack_trace),
+    }
+
+
+def time_call(fn: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> float:
+    """
+    Best seconds per call over `repeat` rounds of enough calls to take `min_time`.
+    """
+    started = time.perf_counter()
+    fn()
+    first = time.perf_counter() - started
+    number = max(1, min(100_000, int(min_time / max(first, 1e-7))))
+    best = first
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def calibrate() -> float:
+    """
+    Seconds taken by a fixed mix of string, regex and dict work.
+    """
+    text = "Error: locator('#submit') timed out after 30000ms at tests/login.spec.js:42:7\n" * 2000
+    pattern = re.compile(r"([\w./-]+\.js):(\d+)")
+
+    def workload():
+        counts: Dict[str, int] = {}
+        for line in text.lower().splitlines():
+            for word in line.split():
+                counts[word] = counts.get(word, 0) + 1
+        return pattern.findall(text), counts
+
+    return time_call(workload)
+
+
+def run(sizes: List[int], case_names: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    case -> size label -> seconds per call.
+    """
+    results: Dict[str, Dict[str, float]] = {name: {} for name in case_names}
+    for size in sizes:
+        cases = build_cases(build_failure(size))
+        for name in case_names:
+            seconds = time_call(cases[name])
+            results[name][format_size(size)] = seconds
+            print(f"  {name:24} {format_size(size):>5}  {seconds * 1000:12.4f} ms", flush=True)
+    return results
+
+
+def growth_exponents(timings: Dict[str, float]) -> Dict[str, float]:
+    """
+    Exponent k of time ~ size^k between consecutive sizes of at least MIN_GROWTH_SIZE.
+    """
+    points = sorted((parse_size(label), seconds) for label, seconds in timings.items())
+    points = [point for point in points if point[0] >= MIN_GROWTH_SIZE]
+    return {
+        f"{format_size(small)}-{format_size(big)}": math.log(t_big / t_small) / math.log(big / small)
+        for (small, t_small), (big, t_big) in zip(points, points[1:])
+        if t_small > 0 and t_big > 0
+    }
+
+
+def check(results: dict, baseline: dict, threshold: float, max_exponent: float) -> List[str]:
+    """
+    Regressions against `baseline` and superlinear growth, as messages.
+    """
+    problems = []
+    speed = baseline["calibration_seconds"] / results["calibration_seconds"] if baseline else 1.0
+    for name, timings in results["timings"].items():
+        for label, seconds in timings.items():
+            previous = (baseline.get("timings", {}).get(name) or {}).get(label) if baseline else None
+            if previous:
+                ratio = seconds * speed / previous
+                if ratio > 1 + threshold:
+                    problems.append(f"{name} @ {label}: {ratio:.2f}x the baseline")
+        for span, exponent in growth_exponents(timings).items():
+            if exponent > max_exponent:
+                problems.append(f"{name} @ {span}: time grows as size^{exponent:.2f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the pure-Python hot paths")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma-separated input sizes (default {DEFAULT_SIZES})")
+    parser.add_argument("--cases", help="comma-separated subset of the benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.5, help="allowed slowdown against the baseline (0.5 = 50%%)")
+    parser.add_argument("--max-exponent", type=float, default=1.3, help="allowed growth exponent on big inputs")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    sizes = sorted(parse_size(size) for size in args.sizes.split(","))
+    case_names = list(build_cases(build_failure(1024)))
+    if args.cases:
+        unknown = set(args.cases.split(",")) - set(case_names)
+        if unknown:
+            parser.error(f"unknown cases {sorted(unknown)}; known: {', '.join(case_names)}")
+        case_names = [name for name in case_names if name in args.cases.split(",")]
+
+    calibration = calibrate()
+    timings = run(sizes, case_names)
+    results = {
+        "python": platform.python_version(),
+        # Best of a run before and after the benchmarks, to damp a noisy neighbour
+        "calibration_seconds": min(calibration, calibrate()),
+        "timings": timings,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        speed = baseline.get("calibration_seconds", results["calibration_seconds"]) / results["calibration_seconds"]
+        # Keep the saved calibration so timings of cases and sizes not re-run stay comparable
+        baseline.setdefault("calibration_seconds", results["calibration_seconds"])
+        baseline["python"] = results["python"]
+        for name, timings in results["timings"].items():
+            baseline.setdefault("timings", {}).setdefault(name, {}).update(
+                {label: seconds * speed for label, seconds in timings.items()}
+            )
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        print(f"No baseline at {args.baseline}; only checking growth (record one with --update)")
+
+    problems = check(results, baseline, args.threshold, args.max_exponent)
+    if problems:
+        print(f"[FAIL] {len(problems)} problem(s):")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("[OK] No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Replay Benchmark
+Replays recorded failures (see benchmarks/corpus.py) against the full FastAPI
+app, served by uvicorn in a child process, with the stand-in Ollama and BERT
+servers of benchmarks/stub_servers.py in another. Reports throughput,
+p50/p95/p99 latency, the memory of the app process and per-stage timings, and
+writes them as JSON so runs can be compared across commits.
+
+Usage:
+  python -m benchmarks.replay                                # 2000 requests to POST /api/triage
+  python -m benchmarks.replay --requests 5000 --concurrency 64
+  python -m benchmarks.replay --endpoint batch --batch-size 50
+  python -m benchmarks.replay --no-reuse                     # every request goes to the LLM
+  python -m benchmarks.replay --env TRIAGE_PROMPT_COMPACTION=false
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.corpus import load_failures, scale
+
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+READY_TIMEOUT = 60
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, process: subprocess.Popen, timeout: float = READY_TIMEOUT) -> None:
+    expires = time.monotonic() + timeout
+    while time.monotonic() < expires:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process {process.args} exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def _memory_mb(pid: int) -> Dict[str, Optional[float]]:
+    """
+    Current (VmRSS) and peak (VmHWM) resident memory of a process; None where /proc is missing.
+    """
+    memory = {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    memory["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    memory["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return memory
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of `values` (None if empty).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _summary(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def _triage_path(result: dict) -> str:
+    if result.get("duplicate_of"):
+        return "duplicate"
+    if "llm" in (result.get("stage_timings") or {}):
+        return "generated"
+    return "cluster_reuse"
+
+
+def _result_from_sse(body: str) -> Optional[dict]:
+    for block in body.split("\n\n"):
+        lines = block.strip().splitlines()
+        if len(lines) == 2 and lines[0] == "event: done":
+            return json.loads(lines[1][len("data: "):])
+    return None
+
+
+class Replay:
+    """
+    Sends a corpus to the app with a fixed number of concurrent clients and
+    collects per-request latency and the returned triage results.
+    """
+
+    def __init__(self, base_url: str, endpoint: str, concurrency: int, batch_size: int):
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.latencies_ms: List[float] = []
+        self.results: List[dict] = []
+        self.errors: Dict[str, int] = {}
+
+    def _requests(self, corpus: List[dict]) -> List[tuple]:
+        if self.endpoint == "batch":
+            return [
+                ("/api/triage/batch", {"failures": corpus[i:i + self.batch_size]})
+                for i in range(0, len(corpus), self.batch_size)
+            ]
+        path = "/api/triage/stream" if self.endpoint == "stream" else "/api/triage"
+        return [(path, failure) for failure in corpus]
+
+    async def _send(self, client: httpx.AsyncClient, path: str, body: dict) -> None:
+        started = time.perf_counter()
+        try:
+            response = await client.post(path, json=body)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                self.errors[str(response.status_code)] = self.errors.get(str(response.status_code), 0) + 1
+                return
+            if self.endpoint == "batch":
+                results = [item["result"] for item in response.json()["results"] if item["result"]]
+            elif self.endpoint == "stream":
+                result = _result_from_sse(response.text)
+                results = [result] if result else []
+            else:
+                results = [response.json()]
+        except httpx.HTTPError as e:
+            self.errors[type(e).__name__] = self.errors.get(type(e).__name__, 0) + 1
+            return
+        self.latencies_ms.append(round(elapsed_ms, 2))
+        self.results.extend(results)
+
+    async def run(self, corpus: List[dict]) -> float:
+        """
+        Replay `corpus`; returns the wall time in seconds.
+        """
+        pending = iter(self._requests(corpus))
+
+        async def client_loop(client: httpx.AsyncClient):
+            for path, body in pending:
+                await self._send(client, path, body)
+
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=None) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(client_loop(client) for _ in range(self.concurrency)))
+            return time.perf_counter() - started
+
+    def report(self, wall_seconds: float) -> dict:
+        paths: Dict[str, int] = {}
+        fallbacks: Dict[str, int] = {}
+        stages: Dict[str, List[float]] = {}
+        for result in self.results:
+            path = _triage_path(result)
+            paths[path] = paths.get(path, 0) + 1
+            for stage in result.get("fallbacks") or []:
+                fallbacks[stage] = fallbacks.get(stage, 0) + 1
+            for stage, ms in (result.get("stage_timings") or {}).items():
+                stages.setdefault(stage, []).append(ms)
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "requests": len(self.latencies_ms) + sum(self.errors.values()),
+            "failures_triaged": len(self.results),
+            "throughput_rps": round(len(self.latencies_ms) / wall_seconds, 2) if wall_seconds else None,
+            "failures_per_second": round(len(self.results) / wall_seconds, 2) if wall_seconds else None,
+            "errors": self.errors,
+            "latency_ms": _summary(self.latencies_ms),
+            "paths": paths,
+            "degraded": sum(1 for result in self.results if result.get("degraded")),
+            "fallbacks": fallbacks,
+            "stage_timings_ms": {stage: _summary(values) for stage, values in sorted(stages.items())},
+        }
+
+
+def _start_stubs(args, ollama_port: int, bert_port: int) -> subprocess.Popen:
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.stub_servers",
+        "--ollama-port", str(ollama_port), "--bert-port", str(bert_port),
+        "--ollama-latency", str(args.ollama_latency), "--tokens-per-second", str(args.tokens_per_second),
+        "--bert-latency", str(args.bert_latency),
+    ], stdout=subprocess.DEVNULL)
+    _wait_for_port(ollama_port, process)
+    _wait_for_port(bert_port, process)
+    return process
+
+
+def _start_app(args, app_port: int, ollama_port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "OLLAMA_BACKENDS": f"http://127.0.0.1:{ollama_port}={args.backend_concurrency}",
+        "OLLAMA_WARMUP_MODELS": args.model,
+    })
+    if args.no_reuse:
+        env.update({"TRIAGE_DEDUP_ENABLED": "false", "TRIAGE_CLUSTER_REUSE_ENABLED": "false"})
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        env[key] = value
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning", "--no-access-log",
+    ], env=env, stdout=subprocess.DEVNULL)
+    _wait_for_port(app_port, process)
+    return process
+
+
+def _wait_until_ready(base_url: str) -> None:
+    expires = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < expires:
+        if httpx.get(f"{base_url}/api/ready").status_code == 200:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"App at {base_url} not ready after {READY_TIMEOUT}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded failures against the triage engine")
+    parser.add_argument("--requests", type=int, default=2000, help="failures to replay")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--endpoint", choices=("triage", "batch", "stream"), default="triage")
+    parser.add_argument("--batch-size", type=int, default=25, help="failures per request with --endpoint batch")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="share of scaled copies that are exact repeats")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-reuse", action="store_true", help="disable duplicate and cluster reuse in the app")
+    parser.add_argument("--model", default="gemma:2b")
+    parser.add_argument("--backend-concurrency", type=int, default=32, help="concurrent generations on the Ollama stub")
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="stub seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="stub token rate, 0 = instant")
+    parser.add_argument("--bert-latency", type=float, default=0.01, help="stub seconds per BERT call")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app setting")
+    parser.add_argument("--output", help=f"result file (default: {RESULTS_DIR}/replay-<endpoint>-<commit>.json)")
+    args = parser.parse_args()
+
+    ollama_port, bert_port, app_port = _free_port(), _free_port(), _free_port()
+    base_url = f"http://127.0.0.1:{app_port}"
+    corpus = [
+        dict(failure, llm_model=args.model, bert_url=f"http://127.0.0.1:{bert_port}/triage")
+        for failure in scale(load_failures(), args.requests, args.duplicate_ratio, args.seed)
+    ]
+
+    stubs = _start_stubs(args, ollama_port, bert_port)
+    app = None
+    try:
+        app = _start_app(args, app_port, ollama_port)
+        _wait_until_ready(base_url)
+        memory_before = _memory_mb(app.pid)
+
+        replay = Replay(base_url, args.endpoint, args.concurrency, args.batch_size)
+        wall_seconds = asyncio.run(replay.run(corpus))
+        memory_after = _memory_mb(app.pid)
+    finally:
+        for process in (app, stubs):
+            if process is not None:
+                process.terminate()
+                process.wait(10)
+
+    commit = _git_commit()
+    report = {
+        "benchmark": "replay",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **replay.report(wall_seconds),
+        "memory": {
+            "rss_before_mb": memory_before["rss_mb"],
+            "rss_after_mb": memory_after["rss_mb"],
+            "peak_rss_mb": memory_after["peak_rss_mb"],
+        },
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"replay-{args.endpoint}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    latency = report["latency_ms"]
+    print(f"{report['failures_triaged']} failures in {report['wall_seconds']}s "
+          f"({report['failures_per_second']} failures/s, {report['throughput_rps']} requests/s)")
+    print(f"latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"paths: {report['paths']}  degraded: {report['degraded']} {report['fallbacks']}  errors: {report['errors']}")
+    print(f"app memory: {report['memory']['rss_before_mb']} -> {report['memory']['rss_after_mb']} MB "
+          f"(peak {report['memory']['peak_rss_mb']} MB)")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Stand-in Ollama and BERT servers for offline, deterministic benchmarks.
+The Ollama stub answers /api/generate (streaming and not) with a fixed
+description after a configurable load latency, emitting tokens at a fixed
+rate; the BERT stub answers /predict with a label chosen from a hash of the
+text. Nothing is random, so two runs of a benchmark see the same downstreams.
+
+Usage:
+  python -m benchmarks.stub_servers --ollama-port 11434 --bert-port 8001
+  python -m benchmarks.stub_servers --ollama-latency 0.2 --tokens-per-second 40
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+
+LABELS = [
+    "UI Error",
+    "Backend Error",
+    "Assertion Failure",
+    "Timeout Error",
+    "Test Data Issue",
+]
+
+DESCRIPTION = (
+    "The test failed because the expected element did not reach the required state before the timeout.\n"
+    "\n"
+    "Steps to reproduce:\n"
+    "1. Open the page under test.\n"
+    "2. Perform the action from the test step.\n"
+    "3. Observe that the element does not appear.\n"
+    "\n"
+    "Expected result: the element is visible and enabled.\n"
+    "Actual result: the locator timed out waiting for the element.\n"
+)
+
+# Whitespace-separated chunks stand in for model tokens
+TOKENS = [word + " " for word in DESCRIPTION.split(" ")]
+
+
+def create_ollama_app(latency: float = 0.0, tokens_per_second: float = 0.0) -> FastAPI:
+    """
+    Ollama stand-in: every generation waits `latency` seconds (prompt
+    evaluation), then produces the description at `tokens_per_second`
+    (0 = instantly), cut to options.num_predict tokens.
+    """
+    app = FastAPI(title="Ollama stub")
+    token_delay = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    @app.post("/api/generate")
+    async def generate(body: dict):
+        num_predict = (body.get("options") or {}).get("num_predict") or len(TOKENS)
+        tokens = TOKENS[:max(1, min(num_predict, len(TOKENS)))]
+        model = body.get("model", "")
+
+        if not body.get("stream", True):
+            await asyncio.sleep(latency + token_delay * len(tokens))
+            return {"model": model, "response": "".join(tokens), "done": True, "eval_count": len(tokens)}
+
+        async def chunks():
+            await asyncio.sleep(latency)
+            for token in tokens:
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+                yield json.dumps({"model": model, "response": token, "done": False}) + "\n"
+            yield json.dumps({"model": model, "response": "", "done": True, "eval_count": len(tokens)}) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return app
+
+
+def create_bert_app(latency: float = 0.0) -> FastAPI:
+    """
+    bert_server.py stand-in: answers /predict after `latency` seconds.
+    """
+    app = FastAPI(title="BERT stub")
+
+    @app.post("/predict")
+    async def predict(body: dict):
+        await asyncio.sleep(latency)
+        text = body.get("text", "")
+        labels = body.get("labels") or LABELS
+        best = labels[int(hashlib.sha1(text.encode("utf-8")).hexdigest(), 16) % len(labels)]
+        scores = {label: (0.8 if label == best else 0.2 / max(1, len(labels) - 1)) for label in labels}
+        return {"label": best, "confidence": scores[best], "scores": scores}
+
+    return app
+
+
+def serve(app: FastAPI, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """
+    Run `app` on a daemon thread; returns once it accepts connections.
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Stub server on port {port} failed to start")
+        thread.join(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Ollama and BERT servers for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ollama-port", type=int, default=11434)
+    parser.add_argument("--bert-port", type=int, default=8001)
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="0 = no generation delay")
+    parser.add_argument("--bert-latency", type=float, default=0.01, help="seconds per /predict call")
+    args = parser.parse_args()
+
+    servers = [
+        serve(create_ollama_app(args.ollama_latency, args.tokens_per_second), args.ollama_port, args.host),
+        serve(create_bert_app(args.bert_latency), args.bert_port, args.host),
+    ]
+    print(f"Ollama stub on http://{args.host}:{args.ollama_port}, BERT stub on http://{args.host}:{args.bert_port}",
+          flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
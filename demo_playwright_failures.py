@@ -9,6 +9,8 @@ import requests
 import re
 from datetime import datetime
 
+import triage_client
+
 # Configuration
 API_URL = "http://192.168.1.13:8003/api/triage"
 LLM_MODEL = "gemma:2b"
@@ -145,7 +147,7 @@ def send_to_triage(failures):
         print("-" * 80)
         
         try:
-            response = requests.post(API_URL, json=failure, timeout=600)
+            response = triage_client.post(API_URL, json=failure, timeout=600)
             response.raise_for_status()
             result = response.json()
             
@@ -1,9 +1,4 @@
-from fastapi import FastAPI
-from app.api.routes import router as api_router
-
-app = FastAPI(title="Bug Triage Engine")
-
-app.include_router(api_router, prefix="/api")
+from app.main import app
 
 if __name__ == "__main__":
     import uvicorn
@@ -13,4 +8,3 @@ if __name__ == "__main__":
         port=8003,
         reload=True
     )
-
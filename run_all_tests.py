@@ -9,11 +9,17 @@ import requests
 import re
 from datetime import datetime
 
+import triage_client
+
 # Configuration
 API_URL = "http://192.168.1.13:8003/api/triage"
 LLM_MODEL = "gemma:2b"
 BERT_URL = "http://192.168.1.13:8001/triage"
 REPORT_FILE = "playwright-report.json"
+# Submit all failures at once (202 + job id) and poll for results instead of
+# blocking on every POST while the LLM generates a description
+QUEUED_MODE = False
+POLL_WAIT_SECONDS = 30
 
 def run_tests():
     """Run all Playwright tests in tests/ directory"""
@@ -145,7 +151,7 @@ def send_to_triage(failures):
         print("-" * 80)
         
         try:
-            response = requests.post(API_URL, json=failure, timeout=600)
+            response = triage_client.post(API_URL, json=failure, timeout=600)
             response.raise_for_status()
             result = response.json()
             
@@ -176,6 +182,75 @@ def send_to_triage(failures):
     print(f"Total failures: {len(failures)}")
     print()
 
+def send_to_triage_queued(failures):
+    """Submit all failures in queued mode, then poll until each one is triaged"""
+    print("\n" + "=" * 80)
+    print("Sending Failures to Triage Engine (queued mode)")
+    print("=" * 80)
+    print()
+    
+    if not failures:
+        print("No failures to send")
+        return
+    
+    jobs = []
+    failed = 0
+    
+    for i, failure in enumerate(failures, 1):
+        try:
+            response = triage_client.post(API_URL, params={"queued": "true"}, json=failure, timeout=30)
+            response.raise_for_status()
+            jobs.append((failure, response.json()["job_id"]))
+            print(f"[{i}/{len(failures)}] Queued: {failure['test_name']}")
+        except requests.exceptions.ConnectionError:
+            print(f"[ERROR] ERROR: Cannot connect to {API_URL}")
+            print("  Make sure the triage engine is running: python main.py")
+            return
+        except Exception as e:
+            print(f"[ERROR] ERROR queuing {failure['test_name']}: {e}")
+            failed += 1
+    
+    print()
+    success = 0
+    
+    for i, (failure, job_id) in enumerate(jobs, 1):
+        print(f"[{i}/{len(jobs)}] {failure['test_name']}")
+        print("-" * 80)
+        
+        try:
+            while True:
+                response = triage_client.get(
+                    f"{API_URL}/{job_id}",
+                    params={"wait": POLL_WAIT_SECONDS},
+                    timeout=POLL_WAIT_SECONDS + 10
+                )
+                if response.status_code != 202:
+                    break
+            response.raise_for_status()
+            result = response.json()
+            
+            print(f"[OK] SUCCESS")
+            print(f"  Title: {result.get('title', 'N/A')}")
+            print(f"  Error Line: {result.get('error_line', 'N/A')}")
+            print(f"  Playwright Script: {result.get('playwright_script', 'N/A')}")
+            print(f"  Triage Label: {result.get('triage_label', 'N/A')}")
+            print(f"  ID: {result.get('id', 'N/A')}")
+            success += 1
+            
+        except Exception as e:
+            print(f"[ERROR] ERROR: {e}")
+            failed += 1
+        
+        print()
+    
+    print("=" * 80)
+    print("SUMMARY")
+    print("=" * 80)
+    print(f"[OK] Successfully triaged: {success}")
+    print(f"[ERROR] Failed to triage: {failed}")
+    print(f"Total failures: {len(failures)}")
+    print()
+
 def main():
     """Main workflow"""
     print("\n" + "=" * 80)
@@ -198,7 +273,10 @@ def main():
         return
     
     # Step 3: Send to triage engine
-    send_to_triage(failures)
+    if QUEUED_MODE:
+        send_to_triage_queued(failures)
+    else:
+        send_to_triage(failures)
     
     # Step 4: Next steps
     print("=" * 80)
@@ -0,0 +1,63 @@
+"""
+Triage API Client Session
+Pooled keep-alive HTTP session shared by the client scripts (run_all_tests.py,
+demo_playwright_failures.py, view_results.py). It only needs requests, not the
+triage engine package, so the scripts run on machines without the server setup.
+
+Failed connects are retried with exponential backoff, and so are 502/503/504
+answers to GET requests. A POST is only retried on 503: after a 502/504 the
+engine may still be triaging it, and a retry would store a second result.
+"""
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))
+
+RETRY_STATUSES = (502, 503, 504)
+POST_RETRY_STATUSES = (503,)
+
+
+class _Retry(Retry):
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() not in Retry.DEFAULT_ALLOWED_METHODS and status_code not in POST_RETRY_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+_session = None
+
+
+def get_session():
+    """Return the pooled keep-alive session (created on first use)"""
+    global _session
+    if _session is None:
+        retry = _Retry(
+            total=RETRIES,
+            connect=RETRIES,
+            read=0,
+            status=RETRIES,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,
+            backoff_factor=RETRY_BACKOFF,
+            raise_on_status=False,
+        )
+        _session = requests.Session()
+        adapter = HTTPAdapter(max_retries=retry)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def get(url, timeout, **kwargs):
+    """GET through the shared session; `timeout` is the read timeout"""
+    return get_session().get(url, timeout=(CONNECT_TIMEOUT, timeout), **kwargs)
+
+
+def post(url, timeout, **kwargs):
+    """POST through the shared session; `timeout` is the read timeout"""
+    return get_session().post(url, timeout=(CONNECT_TIMEOUT, timeout), **kwargs)
@@ -0,0 +1,70 @@
+"""
+Verify Failure Clusters
+Checks that near-duplicate clustering only groups failures whose LLM description
+can be shared: for every pair of failures in playwright-report.json (ANSI-stripped
+and raw), the second one must join the first one's cluster exactly when both are
+in the same group below, whichever of the two arrives first.
+
+Usage:
+  python verify_clusters.py
+"""
+import itertools
+import sys
+
+from app.services import cluster_service
+from verify_extraction import _failures_from_report
+
+# Tests of the Playwright report whose failures belong together; every other test
+# (e.g. "checkout button disabled", a toBeEnabled failure) stays on its own
+CLUSTERED_TOGETHER = [
+    ["should fail - login button not visible", "should fail - menu not visible",
+     "should fail - profile picture not visible"],
+    ["should fail - incorrect page title", "should fail - settings page title"],
+    ["should fail - footer links count", "should fail - result count mismatch"],
+]
+
+
+def _group(test_name):
+    for i, group in enumerate(CLUSTERED_TOGETHER):
+        if test_name in group:
+            return i
+    return test_name
+
+
+def _same_cluster(first, second):
+    """Cluster `first`, then `second`, starting from no clusters at all."""
+    first_id = cluster_service.assign_cluster(first)
+    second_id = cluster_service.assign_cluster(second)
+    cluster_service.remove_cluster(first_id)
+    cluster_service.remove_cluster(second_id)
+    return first_id == second_id
+
+
+def main():
+    failures = _failures_from_report()
+    if not failures:
+        print("[ERROR] No failures found in the Playwright report")
+        return 1
+
+    errors = 0
+    checked = 0
+    for raw in (False, True):
+        messages = {f["test_name"]: f["error_message"] for f in failures if ("\x1b" in f["error_message"]) == raw}
+        for left, right in itertools.combinations(sorted(messages), 2):
+            expected = _group(left) == _group(right)
+            for first, second in ((left, right), (right, left)):
+                checked += 1
+                if _same_cluster(messages[first], messages[second]) != expected:
+                    errors += 1
+                    print(f"[ERROR] {first!r} then {second!r} ({'raw' if raw else 'stripped'}): "
+                          f"expected {'one cluster' if expected else 'separate clusters'}")
+
+    if errors:
+        print(f"[ERROR] {errors} of {checked} cluster checks failed")
+        return 1
+    print(f"[OK] {checked} failure pairs clustered as expected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
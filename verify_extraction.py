@@ -0,0 +1,167 @@
+"""
+Verify Extraction Golden Outputs
+Checks that error line, error file path and test URL extraction still produce
+exactly the recorded outputs for a corpus built from playwright-report.json,
+the failure_payload_*.json files and hand-written edge cases.
+
+Usage:
+  python verify_extraction.py            # compare against extraction_golden.json
+  python verify_extraction.py --update   # re-record extraction_golden.json
+"""
+import glob
+import json
+import os
+import re
+import sys
+
+from app.schemas import FailureInput
+from app.services.triage_service import _extract_error_location
+from app.utils.url_utils import extract_test_url_from_logs
+
+GOLDEN_FILE = "extraction_golden.json"
+REPORT_FILE = "playwright-report.json"
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+# Edge cases that the Playwright report does not cover
+SYNTHETIC_CASES = [
+    {"test_name": "py_traceback", "file_path": "tests/test_login.py",
+     "error_message": "AssertionError: assert 1 == 2",
+     "stack_trace": 'Traceback (most recent call last):\n  File "/app/tests/test_login.py", line 42, in test_login\n    assert 1 == 2',
+     "logs": "[2025-12-13 15:30:16] DEBUG: Navigating to https://example.com/login"},
+    {"test_name": "init_only", "file_path": "pkg/__init__.py",
+     "error_message": "ImportError", "stack_trace": "at pkg/__init__.py:3\nat pkg/module.py:17", "logs": ""},
+    {"test_name": "init_findall", "file_path": "",
+     "error_message": "", "stack_trace": "boom in a/__init__.py.js then c/d.ts", "logs": ""},
+    {"test_name": "at_without_parens", "file_path": "x.spec.js",
+     "error_message": "", "stack_trace": "Error: boom\n    at foo.js:12:5", "logs": ""},
+    {"test_name": "parens_frame", "file_path": "",
+     "error_message": "", "stack_trace": "Error\n    at Object.<anonymous> (C:\\repo\\helpers\\page.ts:88:13)", "logs": ""},
+    {"test_name": "tsx_frame", "file_path": "",
+     "error_message": "", "stack_trace": "at render (src/App.tsx:77:1)", "logs": ""},
+    {"test_name": "huge_line_number", "file_path": "a.spec.ts",
+     "error_message": "see line 12", "stack_trace": "at a.spec.ts:123456", "logs": ""},
+    {"test_name": "message_only", "file_path": "",
+     "error_message": "Failure at LINE 7 of checkout_test.py", "stack_trace": "", "logs": ""},
+    {"test_name": "message_paren", "file_path": "",
+     "error_message": "thrown from handler (utils.jsx:19)", "stack_trace": "", "logs": ""},
+    {"test_name": "logs_only", "file_path": "",
+     "error_message": "", "stack_trace": "",
+     "logs": "[2025-12-13 15:30:16] step 3 line 55 failed\nFile \"runner/main.py\" crashed\nOpening http://localhost:3000/dashboard."},
+    {"test_name": "timestamps_in_logs", "file_path": "",
+     "error_message": "", "stack_trace": "",
+     "logs": "[2025-12-13 15:30:16] started 12:00:01\nURL: HTTPS://Example.com/Path;"},
+    {"test_name": "upper_case_test_file", "file_path": "",
+     "error_message": "", "stack_trace": "at TEST_Cart.JS:4:2 and more", "logs": ""},
+    {"test_name": "nothing_at_all", "file_path": "",
+     "error_message": "", "stack_trace": "", "logs": ""},
+    {"test_name": "", "file_path": "",
+     "error_message": "", "stack_trace": "", "logs": ""},
+    {"test_name": "nav_priority", "file_path": "",
+     "error_message": "", "stack_trace": "",
+     "logs": "saw https://cdn.example.com/a.js\nvisiting https://example.com/b]\nNavigate to https://example.com/c,"},
+    {"test_name": "url_in_message", "file_path": "",
+     "error_message": "Expected: \"https://example.com/search?q=laptop\"", "stack_trace": "", "logs": None},
+]
+
+
+def _failures_from_report():
+    """Failures from the Playwright JSON report, both ANSI-stripped and raw."""
+    if not os.path.exists(REPORT_FILE):
+        return []
+
+    with open(REPORT_FILE, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+
+    failures = []
+
+    def process_suite(suite):
+        for spec in suite.get('specs', []):
+            for test in spec.get('tests', []):
+                for result in test.get('results', []):
+                    if result.get('status') not in ['failed', 'timedOut']:
+                        continue
+                    error = result.get('error', {})
+                    for strip in (True, False):
+                        message = error.get('message', 'Test failed')
+                        stack = error.get('stack', '')
+                        if strip:
+                            message = ANSI_ESCAPE.sub('', message)
+                            stack = ANSI_ESCAPE.sub('', stack)
+                        logs = [
+                            f"[2025-12-13 15:30:16] Test: {spec.get('title')}",
+                            f"Status: {result.get('status')}",
+                            f"Duration: {result.get('duration', 0)}ms",
+                            f"Error: {message}",
+                        ]
+                        failures.append({
+                            "test_name": spec.get('title', 'Unknown Test'),
+                            "file_path": os.path.basename(spec.get('file', 'unknown.spec.js')),
+                            "error_message": message,
+                            "stack_trace": stack,
+                            "logs": '\n'.join(logs),
+                        })
+        for nested_suite in suite.get('suites', []):
+            process_suite(nested_suite)
+
+    for suite in report.get('suites', []):
+        process_suite(suite)
+    return failures
+
+
+def _failures_from_payloads():
+    failures = []
+    for path in sorted(glob.glob("failure_payload_*.json")):
+        with open(path, 'r', encoding='utf-8') as f:
+            for item in json.load(f):
+                failures.append({key: item.get(key) for key in
+                                 ("test_name", "file_path", "error_message", "stack_trace", "logs")})
+    return failures
+
+
+def build_corpus():
+    return _failures_from_report() + _failures_from_payloads() + SYNTHETIC_CASES
+
+
+def extract(case):
+    payload = FailureInput(llm_model="", bert_url="", **case)
+    error_line, error_file_path = _extract_error_location(payload)
+    return {
+        "error_line": error_line,
+        "error_file_path": error_file_path,
+        "test_url_from_logs": extract_test_url_from_logs(payload.logs),
+        "test_url_from_error_message": extract_test_url_from_logs(payload.error_message),
+    }
+
+
+def main():
+    corpus = build_corpus()
+
+    if "--update" in sys.argv:
+        golden = [{"input": case, "expected": extract(case)} for case in corpus]
+        with open(GOLDEN_FILE, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, indent=2)
+        print(f"[OK] Recorded {len(golden)} cases to {GOLDEN_FILE}")
+        return 0
+
+    with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    mismatches = 0
+    for i, entry in enumerate(golden):
+        actual = extract(entry["input"])
+        if actual != entry["expected"]:
+            mismatches += 1
+            print(f"[ERROR] Case {i} ({entry['input'].get('test_name')!r})")
+            print(f"  expected: {entry['expected']}")
+            print(f"  actual:   {actual}")
+
+    if mismatches:
+        print(f"[ERROR] {mismatches}/{len(golden)} cases differ from {GOLDEN_FILE}")
+        return 1
+    print(f"[OK] All {len(golden)} cases match {GOLDEN_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
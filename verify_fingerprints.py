@@ -0,0 +1,64 @@
+"""
+Verify Failure Fingerprints
+Checks that fingerprint-based deduplication only merges real repeat failures:
+distinct tests whose error message and stack trace are both empty (as in the
+failure_payload_*.json files) must get distinct fingerprints, while the same
+failure reported again must keep its fingerprint.
+
+Usage:
+  python verify_fingerprints.py
+"""
+import sys
+
+from app.schemas import FailureInput
+from app.services.fingerprint_service import compute_fingerprint
+from verify_extraction import _failures_from_payloads
+
+# (left, right, should_match)
+SYNTHETIC_PAIRS = [
+    ({"test_name": "test_step_1", "file_path": "tests/flow.py", "error_message": "", "stack_trace": ""},
+     {"test_name": "test_step_2", "file_path": "tests/flow.py", "error_message": "", "stack_trace": ""},
+     False),
+    ({"test_name": "test_step_1", "file_path": "/ci/a/tests/flow.py", "error_message": "", "stack_trace": ""},
+     {"test_name": "test_step_1", "file_path": "/ci/b/tests/flow.py", "error_message": "", "stack_trace": ""},
+     True),
+    ({"test_name": "login", "file_path": "login.spec.js", "error_message": "Timeout 5000ms exceeded", "stack_trace": ""},
+     {"test_name": "login retry", "file_path": "login.spec.js", "error_message": "Timeout 3000ms exceeded", "stack_trace": ""},
+     True),
+]
+
+
+def _payload(case):
+    return FailureInput(llm_model="", bert_url="", **case)
+
+
+def main():
+    errors = 0
+
+    # Different tests must not share a fingerprint just because they carry no error text
+    seen = {}
+    for case in _failures_from_payloads():
+        if (case["error_message"] or "").strip() or (case["stack_trace"] or "").strip():
+            continue
+        fingerprint = compute_fingerprint(_payload(case))
+        other = seen.setdefault(fingerprint, case["test_name"])
+        if other != case["test_name"]:
+            errors += 1
+            print(f"[ERROR] {case['test_name']!r} and {other!r} share fingerprint {fingerprint}")
+
+    for i, (left, right, should_match) in enumerate(SYNTHETIC_PAIRS):
+        matches = compute_fingerprint(_payload(left)) == compute_fingerprint(_payload(right))
+        if matches != should_match:
+            errors += 1
+            print(f"[ERROR] Pair {i} ({left['test_name']!r}, {right['test_name']!r}): "
+                  f"expected {'same' if should_match else 'different'} fingerprints")
+
+    if errors:
+        print(f"[ERROR] {errors} fingerprint checks failed")
+        return 1
+    print(f"[OK] {len(seen)} empty-signature tests and {len(SYNTHETIC_PAIRS)} pairs fingerprinted as expected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,8 +6,15 @@ import requests
 import json
 from datetime import datetime
 
+import triage_client
+
 # Configuration
 API_URL = "http://192.168.1.13:8003/api/triage"
+# Fields shown in the compact list of view_all
+LIST_FIELDS = [
+    "id", "created_at", "title", "status", "error_line", "triage_label",
+    "playwright_script", "test_url", "playwright_script_endpoint",
+]
 
 def view_latest():
     """View the latest triage result"""
@@ -17,7 +24,7 @@ def view_latest():
     print()
     
     try:
-        response = requests.get(f"{API_URL}/latest", timeout=10)
+        response = triage_client.get(f"{API_URL}/latest", timeout=10)
         response.raise_for_status()
         result = response.json()
         
@@ -49,12 +56,20 @@ def view_all():
     print()
     
     try:
-        response = requests.get(API_URL, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        # Page through the list with only the fields shown here; descriptions
+        # and stack traces are fetched by ID in view_latest / print_result
+        results = []
+        params = {"limit": 1000, "fields": ",".join(LIST_FIELDS)}
+        while True:
+            response = triage_client.get(API_URL, params=params, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            results.extend(data.get('results', []))
+            if not data.get('next_cursor'):
+                break
+            params["cursor"] = data['next_cursor']
         
-        results = data.get('results', [])
-        total = data.get('total', 0)
+        total = len(results)
         
         print(f"Total Results: {total}")
         print()